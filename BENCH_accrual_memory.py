@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark: accrual breakdown as a DataFrame of Python dates (the
+default output) against the compact AccrualTable of typed NumPy columns.
+
+Runs offline: a book of 10-year daily-reset trades is compounded from a
+synthetic rate series served through a provider.
+"""
+# BENCH_accrual_memory.py
+
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from Interest_leg import calculate_interest_leg
+from providers import MarketDataProvider
+
+
+class SyntheticRates(MarketDataProvider):
+    def __init__(self, seed=0):
+        rng = np.random.default_rng(seed)
+        days = pd.bdate_range("2013-01-01", "2024-12-31")
+        self.series = pd.Series(2.0 + np.cumsum(rng.normal(0, 0.01, len(days))), index=days)
+
+    def get_rates(self, series_id, start_date, end_date):
+        return self.series.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+
+
+def run_book(output, n_trades, provider):
+    """Compound n_trades 10-year trades; return (tables, seconds, peak traced bytes)."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    tables = []
+    for i in range(n_trades):
+        _, table = calculate_interest_leg("Bond", 10_000_000, 99.5, "2014-06-02", "2024-06-01",
+                                          0.001 + i * 1e-5, "SOFR", "1D", "Act", 360,
+                                          look_back_days=2, provider=provider, output=output)
+        tables.append(table)
+    seconds = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tables, seconds, peak
+
+
+def retained_bytes(table):
+    """Bytes held by one accrual table (deep, including Python date objects)."""
+    if isinstance(table, pd.DataFrame):
+        return int(table.memory_usage(deep=True, index=True).sum())
+    return table.nbytes
+
+
+provider = SyntheticRates()
+n_trades = 50
+print(f"{n_trades} trades x 10 years of daily accruals\n")
+print(f"{'Output':<8}{'rows/trade':>11}{'MB/trade':>10}{'book MB':>10}{'peak MB':>10}{'seconds':>9}")
+
+results = {}
+for output in ["frame", "table"]:
+    tables, seconds, peak = run_book(output, n_trades, provider)
+    per_trade = retained_bytes(tables[0])
+    results[output] = per_trade
+    print(f"{output:<8}{len(tables[0]):>11,}{per_trade / 1e6:>10.2f}{per_trade * n_trades / 1e6:>10.1f}"
+          f"{peak / 1e6:>10.1f}{seconds:>9.2f}")
+
+print(f"\nAccrualTable holds {results['frame'] / results['table']:.1f}x less memory per trade.")
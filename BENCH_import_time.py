@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Import-time benchmark and regression guard.
+
+Imports each calculation module in a fresh interpreter, reports the median
+wall-clock import time, and fails if a module drags in a network/UI package
+(fredapi, yfinance, requests, ecbdata, altair, streamlit, scipy) or goes over
+its time budget.
+"""
+# BENCH_import_time.py
+
+import json
+import statistics
+import subprocess
+import sys
+
+# Module -> import budget in seconds (generous: numpy + pandas alone take ~0.3s)
+IMPORT_BUDGETS = {
+    "helper_functions": 1.0,
+    "Interest_leg": 1.0,
+    "return_leg": 0.2,
+    "portfolio": 1.0,
+    "fx_forward": 0.6,
+    "var_engine": 1.0,
+    "providers": 1.0,
+    "table_export": 1.0,
+    "compounding_index": 1.0,
+    "parallel": 1.0,
+    "curves": 1.0,
+    "calendars": 1.0,
+    "stress": 1.0,
+    "price_store": 1.0,
+    "instrumentation": 0.2,
+    "batch_runner": 0.2,
+}
+
+FORBIDDEN = ["fredapi", "yfinance", "requests", "ecbdata", "altair", "streamlit", "scipy"]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed,
+                  "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, repeats=5):
+    """Median import time of module in fresh interpreters, and any forbidden imports."""
+    timings, loaded = [], set()
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, forbidden=FORBIDDEN)],
+                             capture_output=True, text=True, check=True).stdout
+        probe = json.loads(out.strip().splitlines()[-1])
+        timings.append(probe["seconds"])
+        loaded.update(probe["loaded"])
+    return statistics.median(timings), sorted(loaded)
+
+
+failures = []
+print(f"{'Module':<18}{'import (s)':>12}{'budget (s)':>12}  heavy imports")
+for module, budget in IMPORT_BUDGETS.items():
+    seconds, loaded = measure(module)
+    print(f"{module:<18}{seconds:>12.3f}{budget:>12.2f}  {', '.join(loaded) or '-'}")
+    if loaded:
+        failures.append(f"{module} imports {loaded}")
+    if seconds > budget:
+        failures.append(f"{module} took {seconds:.3f}s (budget {budget:.2f}s)")
+
+if failures:
+    print("\nIMPORT REGRESSIONS:\n  " + "\n  ".join(failures))
+    sys.exit(1)
+print("\nAll calculation modules import with only NumPy and pandas.")
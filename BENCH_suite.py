@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the calculation hot paths.
+
+Every case runs offline on synthetic, seeded rate and price series, so results
+are reproducible and comparable between versions. For each case the suite
+reports throughput, latency percentiles (p50/p95/p99 over the repeats) and the
+peak memory allocated during one run (tracemalloc), and saves everything as
+JSON. Pass --compare with an earlier JSON file to flag regressions.
+
+Usage:
+  python BENCH_suite.py                          # full run -> bench_results/<timestamp>.json
+  python BENCH_suite.py --quick -o new.json --compare bench_results/baseline.json
+"""
+# BENCH_suite.py
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from Interest_leg import calculate_interest_leg
+from compounding_index import CompoundingIndex
+from fx_forward import price_fx_forwards
+from helper_functions import build_rate_table, day_count_fraction, day_count_fractions
+from providers import MarketDataProvider
+from stress import StressScenarios, stress_pnl
+from var_engine import annualized_volatility, fx_book_var, fx_forward_var
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+
+# Latency increase (median) above which --compare reports a regression.
+REGRESSION_THRESHOLD = 0.20
+
+
+class SyntheticMarket(MarketDataProvider):
+    """Seeded business-day SOFR/EFFR-like rates (percent) and a EUR/USD-like close series."""
+
+    def __init__(self, seed=20250318):
+        rng = np.random.default_rng(seed)
+        days = pd.bdate_range("2010-01-04", "2025-12-31")
+        rates = 2.0 + np.cumsum(rng.normal(0, 0.01, len(days)))
+        rates[rng.choice(len(days), 100, replace=False)] = np.nan     # FRED '.' observations
+        self.rates = pd.Series(rates, index=days)
+        self.prices = pd.DataFrame({"Close": 1.10 * np.exp(np.cumsum(rng.normal(0, 0.005, len(days))))},
+                                   index=pd.DatetimeIndex(days, name="Date"))
+
+    def get_rates(self, series_id, start_date, end_date):
+        return self.rates.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+
+    def get_prices(self, ticker, start_date, end_date):
+        p = self.prices
+        return p[(p.index >= pd.Timestamp(start_date)) & (p.index < pd.Timestamp(end_date))]
+
+
+def measure(func, repeats, items=1):
+    """
+    Run func once to warm up, then `repeats` timed runs and one traced run.
+
+    Returns a dict with latency percentiles (ms), throughput (items per second
+    at the median latency) and the peak traced memory of a single run (MB).
+    """
+    func()
+    timings = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = np.array(timings)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        "repeats": repeats,
+        "items": items,
+        "p50_ms": p50 * 1e3,
+        "p95_ms": p95 * 1e3,
+        "p99_ms": p99 * 1e3,
+        "throughput_per_s": items / p50 if p50 > 0 else float("inf"),
+        "peak_memory_mb": peak / 1e6,
+    }
+
+
+def benchmark_cases(market, quick=False):
+    """Yield (case name, zero-argument callable, items processed per call)."""
+    end = date(2025, 6, 30)
+
+    # calculate_interest_leg across trade lengths and reset frequencies
+    for years in ([1, 10] if quick else [1, 5, 10]):
+        start = end.replace(year=end.year - years)
+        days = (end - start).days
+        for reset_frequency in ["1D", "1M", "3M", "6M"]:
+            yield (f"interest_leg/{years}y/{reset_frequency}",
+                   lambda s=start, r=reset_frequency: calculate_interest_leg(
+                       "Bond", 10_000_000, 99.5, s, end, 0.002, "SOFR", r, "Act", 360,
+                       look_back_days=2, provider=market),
+                   days)
+        for reset_frequency in ["1D", "3M"]:
+            yield (f"interest_leg_runs/{years}y/{reset_frequency}",
+                   lambda s=start, r=reset_frequency: calculate_interest_leg(
+                       "Bond", 10_000_000, 99.5, s, end, 0.002, "SOFR", r, "Act", 360,
+                       look_back_days=2, provider=market, output="runs"),
+                   days)
+        yield (f"interest_leg_table/{years}y/1D",
+               lambda s=start: calculate_interest_leg(
+                   "Bond", 10_000_000, 99.5, s, end, 0.002, "SOFR", "1D", "Act", 360,
+                   look_back_days=2, provider=market, output="table"),
+               days)
+
+    # The same 10y finance legs read from a precomputed compounding index
+    index = CompoundingIndex.build(market.rates, "SOFR", 360, 2)
+    start_10y = end.replace(year=end.year - 10)
+    yield ("compounding_index/10y/no_spread", lambda: index.period_factor(start_10y, end), 1)
+    yield ("compounding_index/10y/exact", lambda: index.period_factor(start_10y, end, 0.002), 1)
+    yield ("compounding_index/10y/approx", lambda: index.period_factor(start_10y, end, 0.002, exact=False), 1)
+
+    # Stress P&L of a 100-trade book (daily resets, 2y) under 10,000 scenarios
+    rng = np.random.default_rng(2)
+    stress_book = pd.DataFrame({
+        "product_type": "Bond", "notional": 10_000_000.0, "initial_price": 99.5, "final_price": 101.0,
+        "start_date": pd.Timestamp("2023-06-30") + pd.to_timedelta(rng.integers(0, 10, 100) * 7, unit="D"),
+        "end_date": pd.Timestamp("2025-06-30"), "spread": rng.choice([0.0, 0.002], 100),
+        "float_index": "SOFR", "look_back_days": 2,
+    })
+    scenarios = StressScenarios(rng.normal(0, 50, 10_000), rng.normal(0, 25, 10_000), rng.normal(0, 0.1, 10_000))
+    yield ("stress/100x10000",
+           lambda: stress_pnl(stress_book, scenarios, rate_source=market.get_rates),
+           100 * 10_000)
+
+    # fetch_interest_rates post-processing (reset dates, clamping, rate look-up)
+    series = market.rates
+    for reset_frequency in ["1D", "3M"]:
+        yield (f"rate_table/10y/{reset_frequency}",
+               lambda r=reset_frequency: build_rate_table(series, "2015-06-01", "2025-06-01", 2, r),
+               3653)
+    yield ("rate_table/10y/1D/USGS",
+           lambda: build_rate_table(series, "2015-06-01", "2025-06-01", 2, "1D", calendar="USGS", lockout_days=2),
+           3653)
+
+    # day_count_fraction: scalar (reference loop) and vectorized
+    starts = [date(2020, 1, 1) + pd.Timedelta(days=i) for i in range(10_000)]
+    ends = [d + pd.Timedelta(days=1 + i % 90) for i, d in enumerate(starts)]
+    delta_days = np.array([(e - s).days for s, e in zip(starts, ends)])
+    yield ("day_count_fraction/scalar",
+           lambda: [day_count_fraction(s, e, "Act", 360) for s, e in zip(starts, ends)],
+           len(starts))
+    yield ("day_count_fraction/vectorized",
+           lambda: day_count_fractions(delta_days, "Act", 360),
+           len(delta_days))
+
+    # FX forward formula: one forward and a book of forwards
+    rng = np.random.default_rng(1)
+    n_forwards = 100_000
+    book = {
+        "spot_rate": 1.08 + 0.01 * rng.standard_normal(n_forwards),
+        "us_rate": 4.0 + rng.standard_normal(n_forwards),
+        "euribor_rate": 3.0 + rng.standard_normal(n_forwards),
+        "days": rng.integers(7, 720, n_forwards),
+        "notional": rng.uniform(1e5, 1e7, n_forwards),
+        "notional_currency": np.where(rng.random(n_forwards) < 0.5, "USD", "EUR"),
+    }
+    yield ("fx_forward/single", lambda: price_fx_forwards(1.08, 4.3, 2.9, 90, notional=1_000_000), 1)
+    yield ("fx_forward/book", lambda: price_fx_forwards(**book), n_forwards)
+
+    # Monte Carlo VaR of one forward
+    sigma = annualized_volatility(market.prices["Close"].iloc[-260:])
+    n_paths = 100_000 if quick else 1_000_000
+    yield (f"mc_var/{n_paths}",
+           lambda: fx_forward_var(1.08, 1.085, 1_000_000, sigma, 0.25, n_paths=n_paths),
+           n_paths)
+
+    # Monte Carlo VaR of a 300-tenor forward book (peak memory must not grow with paths x tenors)
+    book_paths = 20_000 if quick else 100_000
+    fx_book = pd.DataFrame({"notional": rng.uniform(-5e6, 5e6, 300), "days": np.arange(1, 301) * 3,
+                            "forward_rate": 1.08 + 0.01 * rng.standard_normal(300)})
+    yield (f"mc_var/book/300x{book_paths}",
+           lambda: fx_book_var(fx_book, 1.08, sigma, n_paths=book_paths),
+           book_paths)
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """Print the median latency change of every case against an earlier run; return regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        change = stats["p50_ms"] / baseline[name]["p50_ms"] - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"  {name:<32}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the calculation hot paths offline.")
+    parser.add_argument("-o", "--output", help="JSON result file (default: bench_results/<timestamp>.json).")
+    parser.add_argument("-n", "--repeats", type=int, default=20, help="Timed runs per case.")
+    parser.add_argument("--quick", action="store_true", help="Fewer trade lengths and VaR paths.")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text.")
+    parser.add_argument("--compare", metavar="JSON", help="Earlier result file to compare against.")
+    args = parser.parse_args(argv)
+
+    market = SyntheticMarket()
+    results = {}
+    print(f"{'Case':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'items/s':>14}{'peak MB':>10}")
+    for name, func, items in benchmark_cases(market, quick=args.quick):
+        if args.filter not in name:
+            continue
+        # Monte Carlo runs are long; fewer repeats keep the suite practical
+        repeats = max(3, args.repeats // 4) if name.startswith("mc_var") else args.repeats
+        stats = measure(func, repeats, items)
+        results[name] = stats
+        print(f"{name:<32}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+              f"{stats['throughput_per_s']:>14,.0f}{stats['peak_memory_mb']:>10.2f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.platform(),
+            "quick": args.quick,
+            "results": results,
+        }, f, indent=2)
+    print(f"\nSaved {len(results)} cases to {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than {REGRESSION_THRESHOLD:.0%}: {regressions}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
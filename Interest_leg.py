@@ -1,6 +1,155 @@
+import numpy as np
 import pandas as pd
-from helper_functions import fetch_interest_rates, day_count_fraction
+from dataclasses import asdict, dataclass, replace
+from helper_functions import fetch_interest_rates, day_count_fraction, day_count_fractions, compute_reset_date
 from datetime import timedelta
+from instrumentation import tracer
+
+# Column layout of the accrual breakdown table (shared by every compounding engine).
+ACCRUAL_COLUMNS = [
+    "Accrual Date",
+    "Rate Date",
+    "Accrual Days",
+    "Rate",
+    "NCCR",
+    "Daily Factor",
+    "Cumulative Factor",
+    "Daily Interest",
+    "Running Accrued Interest",
+]
+
+
+class AccrualTable:
+    """
+    Compact columnar accrual breakdown: one typed NumPy array per column of
+    ACCRUAL_COLUMNS (same names and order) instead of a DataFrame holding a
+    Python date object per row.
+
+      - Accrual Date, Rate Date: datetime64[D]
+      - Accrual Days:            int32
+      - every other column:      float64
+
+    table["Rate"] returns a column; to_frame() / to_arrow() convert the whole
+    table (with the typed columns) when a DataFrame or Arrow table is needed.
+    """
+
+    __slots__ = ("accrual_date", "rate_date", "accrual_days", "rate", "nccr", "daily_factor",
+                 "cumulative_factor", "daily_interest", "running_accrued_interest")
+
+    def __init__(self, *columns):
+        for name, column in zip(self.__slots__, columns):
+            setattr(self, name, column)
+
+    def __len__(self):
+        return len(self.accrual_days)
+
+    def __getitem__(self, column):
+        return getattr(self, self.__slots__[ACCRUAL_COLUMNS.index(column)])
+
+    @property
+    def columns(self):
+        return list(ACCRUAL_COLUMNS)
+
+    @property
+    def nbytes(self):
+        """Memory held by the column arrays."""
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    def to_frame(self):
+        """DataFrame with the ACCRUAL_COLUMNS layout and typed (datetime64/int32/float64) columns."""
+        return pd.DataFrame({column: self[column] for column in ACCRUAL_COLUMNS}, columns=ACCRUAL_COLUMNS)
+
+    def to_arrow(self):
+        """pyarrow.Table with the same columns (date32, int32, float64); needs pyarrow."""
+        import pyarrow as pa
+        return pa.table({column: self[column] for column in ACCRUAL_COLUMNS})
+
+
+# Column layout of the run-length encoded accrual breakdown (AccrualRuns).
+RUN_COLUMNS = [
+    "Accrual Date",
+    "Rate Date",
+    "Periods",
+    "Accrual Days",
+    "Rate",
+    "NCCR",
+    "Daily Factor",
+    "Run Factor",
+    "Cumulative Factor",
+    "Running Accrued Interest",
+]
+
+
+class AccrualRuns:
+    """
+    Run-length encoded accrual breakdown, built from the reset periods (one per
+    distinct Reset Date) rather than the calendar days: one row per run of
+    consecutive reset periods with the same rate and the same number of accrual
+    days (e.g. a weekend or holiday under daily resets). Every period of a run
+    has the same Daily Factor, so the run compounds in closed form:
+
+        Run Factor = Daily Factor ** Periods
+
+      - Accrual Date, Rate Date: First period of the run (datetime64[D])
+      - Periods:                 Reset periods in the run
+      - Cumulative Factor, Running Accrued Interest: At the end of the run
+
+    expand() rebuilds the full per-day table (AccrualTable or DataFrame) from
+    the reset periods kept alongside, exactly as output="table" would have
+    returned it; it is the only place the daily table is built.
+    """
+
+    def __init__(self, columns, day_numbers, rate_day_numbers, rates, repeats, funding_leg_notional, spread,
+                 day_count_choice, year_basis, initial_factor):
+        self._columns = columns
+        # One entry per reset period; repeats (days per period) gives the daily rows, None when already daily
+        self._rows = (day_numbers, rate_day_numbers, rates, repeats)
+        self._terms = (funding_leg_notional, spread, day_count_choice, year_basis, initial_factor)
+
+    def __len__(self):
+        return len(self._columns["Periods"])
+
+    def __getitem__(self, column):
+        return self._columns[column]
+
+    @property
+    def columns(self):
+        return list(RUN_COLUMNS)
+
+    @property
+    def periods(self):
+        """Daily accrual periods covered (rows of the expanded table)."""
+        day_numbers, _, _, repeats = self._rows
+        rows = len(day_numbers) if repeats is None else int(repeats.sum())
+        return max(rows - 1, 0)
+
+    @property
+    def nbytes(self):
+        """Memory held by the run columns (not the rates kept for expand())."""
+        return sum(column.nbytes for column in self._columns.values())
+
+    def to_frame(self):
+        """DataFrame with the RUN_COLUMNS layout, one row per run."""
+        return pd.DataFrame(self._columns, columns=RUN_COLUMNS)
+
+    def expand(self, output="frame"):
+        """The full accrual table: "frame" (pd.DataFrame) or "table" (AccrualTable)."""
+        day_numbers, rate_day_numbers, rates, repeats = self._rows
+        if repeats is not None:
+            day_numbers, rate_day_numbers, rates = (np.repeat(a, repeats) for a in (day_numbers, rate_day_numbers,
+                                                                                    rates))
+        funding_leg_notional, spread, day_count_choice, year_basis, initial_factor = self._terms
+        accrual_days = np.diff(day_numbers).astype(np.int32)
+        _, columns = _compound_columns(accrual_days, rates, funding_leg_notional, spread,
+                                       day_count_choice, year_basis, initial_factor)
+        columns["Accrual Date"] = day_numbers[:-1]
+        columns["Rate Date"] = rate_day_numbers[:-1]
+        table = AccrualTable(*(columns[column] for column in ACCRUAL_COLUMNS))
+        if output == "table":
+            return table
+        if output == "frame":
+            return table.to_frame()
+        raise ValueError(f"Unknown accrual output: {output!r}")
 
 def calculate_interest_leg(product_type,
                            notional,
@@ -12,7 +161,12 @@ def calculate_interest_leg(product_type,
                            reset_frequency,
                            day_count_choice,
                            year_basis,
-                           look_back_days=0):
+                           look_back_days=0,
+                           engine="numpy",
+                           provider=None,
+                           output="frame",
+                           calendar=None,
+                           lockout_days=0):
     """
     Calculate the accrued interest (funding leg) for a TRS using the ISDA geometric 
     compounding method (i.e. "Compounding" as defined in the ISDA Definitions), and return:
@@ -42,38 +196,377 @@ def calculate_interest_leg(product_type,
       day_count_choice  : Day count convention ("Act" or "30").
       year_basis        : 360 or 365.
       look_back_days    : Number of look-back days.
+      engine            : "numpy" (vectorized, default) or "loop" (row-by-row reference).
+      provider          : Optional providers.MarketDataProvider to read rates from
+                          (default: the local rate store, topped up from FRED).
+      output            : "frame" (pd.DataFrame, default), "table" (compact
+                          AccrualTable of typed NumPy columns; numpy engine only) or
+                          "runs" (AccrualRuns: the rate table is read with one row
+                          per reset period and constant-rate stretches are compounded
+                          in closed form, O(resets) instead of O(days); expand()
+                          gives the full daily table; numpy engine only).
+      calendar          : Optional business-day calendar ("USGS", "FED", "TARGET" or a
+                          calendars.BusinessCalendar): the look-back then counts
+                          business days (ISDA SOFR look-back).
+      lockout_days      : Rate lockout in business days (calendar days without a
+                          calendar) before end_date.
 
     Returns:
       (total_interest, df_accrual):
         total_interest (float) - Total compounded interest.
-        df_accrual (pd.DataFrame) - Detailed daily accrual table.
+        df_accrual (pd.DataFrame, AccrualTable or AccrualRuns) - Accrual breakdown.
     """
     # 1) Determine the funding leg notional.
-    if product_type == 'Bond':
-        funding_leg_notional = notional * (initial_price / 100.0)
-    else:
-        funding_leg_notional = notional
+    funding_leg_notional = _funding_leg_notional(product_type, notional, initial_price)
 
     # 2) Fetch daily rates from FRED.
     # The returned DataFrame has columns: ["Reset Date", "Rate Date", "Rate"]
+    rates_df = _fetch_accrual_rates(start_date, end_date, float_index, look_back_days,
+                                    reset_frequency, provider, as_dates=(output == "frame"),
+                                    calendar=calendar, lockout_days=lockout_days,
+                                    per_reset=(output == "runs"))
+
+    # 3) Build the daily accrual breakdown table using geometric compounding.
+    return compound_accruals(rates_df, funding_leg_notional, spread,
+                             day_count_choice, year_basis, engine=engine, output=output)
+
+
+def _funding_leg_notional(product_type, notional, initial_price):
+    """Bond TRS finance the dirty price; every other product the notional itself."""
+    if product_type == 'Bond':
+        return notional * (initial_price / 100.0)
+    return notional
+
+
+def _fetch_accrual_rates(start_date, end_date, float_index, look_back_days, reset_frequency,
+                         provider=None, as_dates=True, calendar=None, lockout_days=0, per_reset=False):
+    """
+    fetch_interest_rates table with rows sorted for compounding and, unless
+    as_dates is False, its dates converted to Python date objects (per_reset:
+    one row per reset period, see build_rate_table).
+    """
     rates_df = fetch_interest_rates(
         start_date, end_date, 
         index=float_index, 
         look_back_days=look_back_days, 
-        reset_frequency=reset_frequency
+        reset_frequency=reset_frequency,
+        provider=provider,
+        calendar=calendar,
+        lockout_days=lockout_days,
+        per_reset=per_reset
     )
     
-    # For compounding, we want to use the Reset Date as the accrual boundary.
-    rates_df['Reset Date'] = pd.to_datetime(rates_df['Reset Date']).dt.date
-    rates_df['Rate Date'] = pd.to_datetime(rates_df['Rate Date']).dt.date
+    with tracer.span("transform/accrual_dates"):
+        # For compounding, we want to use the Reset Date as the accrual boundary.
+        if as_dates:
+            rates_df['Reset Date'] = pd.to_datetime(rates_df['Reset Date']).dt.date
+            rates_df['Rate Date'] = pd.to_datetime(rates_df['Rate Date']).dt.date
 
-    # It’s important that our accrual dates are in order.
-    rates_df = rates_df.sort_values('Reset Date').reset_index(drop=True)
-    
-    # 3) Build the daily accrual breakdown table using geometric compounding.
+        # It’s important that our accrual dates are in order.
+        return rates_df.sort_values('Reset Date').reset_index(drop=True)
+
+
+@dataclass
+class AccrualState:
+    """
+    Where a running finance leg stands after its last marking: the trade terms it
+    was compounded with, the last accrued calendar day and the factors reached.
+    to_dict() / from_dict() round-trip it through JSON for storage between runs.
+    """
+    funding_leg_notional: float
+    spread: float
+    float_index: str
+    reset_frequency: str
+    day_count_choice: str
+    year_basis: int
+    look_back_days: int
+    last_date: str                  # 'YYYY-MM-DD': end_date of the last marking
+    cumulative_factor: float = 1.0
+    running_accrued_interest: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def initial_accrual_state(product_type,
+                          notional,
+                          initial_price,
+                          start_date,
+                          spread,
+                          float_index,
+                          reset_frequency,
+                          day_count_choice,
+                          year_basis,
+                          look_back_days=0):
+    """
+    AccrualState of a trade on its effective date (nothing accrued yet). Arguments
+    as in calculate_interest_leg.
+    """
+    return AccrualState(
+        funding_leg_notional=float(_funding_leg_notional(product_type, notional, initial_price)),
+        spread=float(spread),
+        float_index=float_index,
+        reset_frequency=reset_frequency,
+        day_count_choice=str(day_count_choice),
+        year_basis=int(year_basis),
+        look_back_days=int(look_back_days),
+        last_date=pd.Timestamp(start_date).strftime("%Y-%m-%d"),
+    )
+
+
+def extend_interest_leg(state, end_date, engine="numpy", provider=None):
+    """
+    Incremental calculate_interest_leg: extend a saved AccrualState to end_date.
+
+    Only the rates from state.last_date to end_date are fetched and compounded,
+    starting from the saved cumulative factor, so a daily mark costs O(new days)
+    instead of O(trade life). Chaining calls from initial_accrual_state gives the
+    same rows and factors as one calculate_interest_leg over the whole period.
+
+    Args:
+      state    : AccrualState from initial_accrual_state or a previous call.
+      end_date : New accrual end date (e.g. today's marking date).
+      engine   : "numpy" or "loop", as in calculate_interest_leg.
+      provider : Optional providers.MarketDataProvider to read rates from.
+
+    Returns:
+      (new_rows, new_state):
+        new_rows (pd.DataFrame)  - Accrual rows for the newly accrued days only
+                                   (calculate_interest_leg columns).
+        new_state (AccrualState) - State to save for the next marking.
+    """
+    end_date = pd.Timestamp(end_date)
+    last_date = pd.Timestamp(state.last_date)
+    if end_date <= last_date:
+        return pd.DataFrame(columns=ACCRUAL_COLUMNS), state
+
+    # Start the fetch at the reset date of last_date so its rate lies inside the
+    # look-up window, then drop those extra days again (one row per calendar day).
+    fetch_start = min(last_date, compute_reset_date(last_date, state.reset_frequency))
+    rates_df = _fetch_accrual_rates(fetch_start, end_date, state.float_index,
+                                    state.look_back_days, state.reset_frequency, provider)
+    rates_df = rates_df.iloc[(last_date - fetch_start).days:].reset_index(drop=True)
+    running_accrued, new_rows = compound_accruals(
+        rates_df, state.funding_leg_notional, state.spread,
+        state.day_count_choice, state.year_basis,
+        engine=engine, initial_factor=state.cumulative_factor
+    )
+    cumulative_factor = (float(new_rows["Cumulative Factor"].iloc[-1]) if len(new_rows)
+                         else state.cumulative_factor)
+    new_state = replace(state,
+                        last_date=end_date.strftime("%Y-%m-%d"),
+                        cumulative_factor=cumulative_factor,
+                        running_accrued_interest=float(running_accrued))
+    return new_rows, new_state
+
+
+def compound_accruals(rates_df,
+                      funding_leg_notional,
+                      spread,
+                      day_count_choice,
+                      year_basis,
+                      engine="numpy",
+                      initial_factor=1.0,
+                      output="frame"):
+    """
+    Geometrically compound a rate table (as returned by fetch_interest_rates, with
+    'Reset Date' and 'Rate Date' converted to dates and sorted) into the accrual
+    breakdown used by calculate_interest_leg.
+
+    Each row i accrues from Reset Date[i] to Reset Date[i+1] at Rate[i] + spread.
+    output="runs" also takes the per-reset table of fetch_interest_rates(per_reset=True).
+
+    Args:
+      rates_df             : DataFrame with "Reset Date", "Rate Date" and "Rate" columns.
+      funding_leg_notional : Notional the compound factor is applied to.
+      spread               : Spread added to the reference rate (decimal).
+      day_count_choice     : Day count convention ("Act" or "30").
+      year_basis           : 360 or 365.
+      engine               : "numpy" (vectorized) or "loop" (row-by-row reference).
+      initial_factor       : Cumulative factor already reached before the first row
+                             (1.0 for a new trade; see extend_interest_leg).
+      output               : "frame" (pd.DataFrame), "table" (AccrualTable; numpy engine)
+                             or "runs" (AccrualRuns; numpy engine).
+
+    Returns:
+      (total_interest, df_accrual)
+    """
+    tracer.count("compound/rows", len(rates_df))
+    with tracer.span("compound"):
+        return _compound_accruals(rates_df, funding_leg_notional, spread, day_count_choice,
+                                  year_basis, engine, initial_factor, output)
+
+
+def _compound_accruals(rates_df, funding_leg_notional, spread, day_count_choice, year_basis,
+                       engine, initial_factor, output):
+    """Dispatch to the compounding engine / output of compound_accruals."""
+    if output in ("table", "runs"):
+        if engine != "numpy":
+            raise ValueError(f"output={output!r} requires the numpy engine")
+        compound = _compound_accruals_table if output == "table" else _compound_accruals_runs
+        return compound(rates_df, funding_leg_notional, spread, day_count_choice, year_basis, initial_factor)
+    if output != "frame":
+        raise ValueError(f"Unknown accrual output: {output!r}")
+    if engine == "numpy":
+        return _compound_accruals_numpy(rates_df, funding_leg_notional, spread,
+                                        day_count_choice, year_basis, initial_factor)
+    elif engine == "loop":
+        return _compound_accruals_loop(rates_df, funding_leg_notional, spread,
+                                       day_count_choice, year_basis, initial_factor)
+    raise ValueError(f"Unknown compounding engine: {engine!r}")
+
+
+def _compound_accruals_numpy(rates_df, funding_leg_notional, spread,
+                             day_count_choice, year_basis, initial_factor=1.0):
+    """
+    Vectorized compounding: every column of the accrual table is computed as a
+    whole array. np.cumprod multiplies left to right exactly like the reference
+    loop, so factors and interest amounts match it bit for bit.
+    """
+    accrual_dates = rates_df['Reset Date'].to_numpy()
+    rate_dates = rates_df['Rate Date'].to_numpy()
+
+    # Calendar days between consecutive accrual dates
+    day_numbers = pd.to_datetime(rates_df['Reset Date']).to_numpy().astype('datetime64[D]')
+    accrual_days = np.diff(day_numbers).astype(np.int64)
+
+    total_interest, columns = _compound_columns(accrual_days, rates_df['Rate'].to_numpy(dtype=float),
+                                                funding_leg_notional, spread, day_count_choice,
+                                                year_basis, initial_factor)
+    columns["Accrual Date"] = accrual_dates[:-1]
+    columns["Rate Date"] = rate_dates[:-1]
+    with tracer.span("compound/table"):
+        df_accrual = pd.DataFrame(columns, columns=ACCRUAL_COLUMNS)
+    return total_interest, df_accrual
+
+
+def _compound_accruals_table(rates_df, funding_leg_notional, spread,
+                             day_count_choice, year_basis, initial_factor=1.0):
+    """Same numbers as the numpy engine, returned as an AccrualTable of typed columns."""
+    day_numbers = _day_numbers(rates_df['Reset Date'])
+    rate_day_numbers = _day_numbers(rates_df['Rate Date'])
+    accrual_days = np.diff(day_numbers).astype(np.int32)
+
+    total_interest, columns = _compound_columns(accrual_days, rates_df['Rate'].to_numpy(dtype=float),
+                                                funding_leg_notional, spread, day_count_choice,
+                                                year_basis, initial_factor)
+    columns["Accrual Date"] = day_numbers[:-1]
+    columns["Rate Date"] = rate_day_numbers[:-1]
+    return total_interest, AccrualTable(*(columns[column] for column in ACCRUAL_COLUMNS))
+
+
+def _day_numbers(column):
+    """datetime64[D] array of a date column (pd.to_datetime only when not already datetime64)."""
+    values = column.to_numpy()
+    if not np.issubdtype(values.dtype, np.datetime64):
+        values = pd.to_datetime(column).to_numpy()
+    return values.astype('datetime64[D]')
+
+
+def _compound_accruals_runs(rates_df, funding_leg_notional, spread,
+                            day_count_choice, year_basis, initial_factor=1.0):
+    """
+    Run-length compounding over the reset periods: consecutive periods with the
+    same (rate, accrual days) share one daily factor and are compounded as one
+    power, so the products run over the runs only. Equals the numpy engine up to
+    rounding in the last digits.
+    """
+    day_numbers, rate_day_numbers, rates, repeats = _reset_periods(rates_df)
+    accrual_days = np.diff(day_numbers).astype(np.int32)
+    period_rates = rates[:-1]
+
+    # A new run starts wherever the rate or the period length changes
+    with tracer.span("compound/encode"):
+        changes = (period_rates[1:] != period_rates[:-1]) | (accrual_days[1:] != accrual_days[:-1])
+        starts = np.flatnonzero(np.concatenate(([len(accrual_days) > 0], changes)))
+        periods = np.diff(np.append(starts, len(accrual_days)))
+    tracer.count("compound/runs", len(starts))
+
+    run_rate = period_rates[starts]
+    effective_rate = run_rate + spread
+    dc_fraction = day_count_fractions(accrual_days[starts], day_count=day_count_choice, year_basis=year_basis)
+    daily_factor = 1 + effective_rate * dc_fraction
+    run_factor = daily_factor ** periods
+    compound_factor = np.cumprod(np.concatenate(([initial_factor], run_factor)))[1:]
+
+    columns = {
+        "Accrual Date": day_numbers[starts],
+        "Rate Date": rate_day_numbers[starts],
+        "Periods": periods,
+        "Accrual Days": accrual_days[starts],
+        "Rate": run_rate,
+        "NCCR": effective_rate,
+        "Daily Factor": daily_factor,
+        "Run Factor": run_factor,
+        "Cumulative Factor": compound_factor,
+        "Running Accrued Interest": funding_leg_notional * (compound_factor - 1),
+    }
+    final_cf = compound_factor[-1] if len(compound_factor) else initial_factor
+    total_interest = funding_leg_notional * (final_cf - 1)
+    if repeats is None:
+        # Keep the per-day rows as given for expand()
+        day_numbers, rate_day_numbers = _day_numbers(rates_df['Reset Date']), _day_numbers(rates_df['Rate Date'])
+        rates = rates_df['Rate'].to_numpy(dtype=float)
+    return total_interest, AccrualRuns(columns, day_numbers, rate_day_numbers, rates, repeats, funding_leg_notional,
+                                       spread, day_count_choice, year_basis, initial_factor)
+
+
+def _reset_periods(rates_df):
+    """
+    (Reset Dates, Rate Dates, rates, days per period) of a rate table, one entry per
+    distinct Reset Date. A per-reset table (with "Calendar Days") is used as is. In a
+    per-day table the days of a reset period accrue nothing until its last day, which
+    carries the whole period at its rate, so each period is taken from its last row
+    (days per period is then None).
+    """
+    day_numbers = _day_numbers(rates_df['Reset Date'])
+    rate_day_numbers = _day_numbers(rates_df['Rate Date'])
+    rates = rates_df['Rate'].to_numpy(dtype=float)
+    if "Calendar Days" in rates_df.columns:
+        return day_numbers, rate_day_numbers, rates, rates_df["Calendar Days"].to_numpy(dtype=np.int64)
+    last = np.flatnonzero(np.append(day_numbers[1:] != day_numbers[:-1], len(day_numbers) > 0))
+    return day_numbers[last], rate_day_numbers[last], rates[last], None
+
+
+def _compound_columns(accrual_days, rates, funding_leg_notional, spread,
+                      day_count_choice, year_basis, initial_factor):
+    """
+    Numeric accrual columns (keyed by ACCRUAL_COLUMNS name) and the total interest.
+    np.cumprod multiplies left to right exactly like the reference loop.
+    """
+    daily_rate = rates[:-1]
+    effective_rate = daily_rate + spread
+    dc_fraction = day_count_fractions(accrual_days, day_count=day_count_choice, year_basis=year_basis)
+    daily_factor = 1 + effective_rate * dc_fraction
+
+    # Geometric product of the daily factors and the previous period's factor
+    compound_factor = np.cumprod(np.concatenate(([initial_factor], daily_factor)))[1:]
+    previous_cf = np.concatenate(([initial_factor], compound_factor[:-1]))
+
+    columns = {
+        "Accrual Days": accrual_days,
+        "Rate": daily_rate,
+        "NCCR": effective_rate,
+        "Daily Factor": daily_factor,
+        "Cumulative Factor": compound_factor,
+        "Daily Interest": funding_leg_notional * (compound_factor - previous_cf),
+        "Running Accrued Interest": funding_leg_notional * (compound_factor - 1),
+    }
+    final_cf = compound_factor[-1] if len(compound_factor) else initial_factor
+    total_interest = funding_leg_notional * (final_cf - 1)
+    return total_interest, columns
+
+
+def _compound_accruals_loop(rates_df, funding_leg_notional, spread,
+                            day_count_choice, year_basis, initial_factor=1.0):
+    """Row-by-row reference implementation of the compounding."""
     table_rows = []
-    compound_factor = 1.0  # Starting compound factor
-    previous_cf = 1.0      # Store previous compound factor
+    compound_factor = initial_factor  # Starting compound factor
+    previous_cf = initial_factor      # Store previous compound factor
     
     # Use Reset Date as the accrual date
     accrual_dates = rates_df['Reset Date'].tolist()   # These should be consecutive
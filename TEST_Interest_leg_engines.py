@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Parity check between the vectorized and the row-by-row compounding engines,
+and of the run-length compounding (output="runs") against both, including runs
+built straight from the per-reset rate table.
+
+Runs offline on synthetic rates, so no FRED access is needed.
+"""
+# TEST_Interest_leg_engines.py
+
+import numpy as np
+import pandas as pd
+
+from Interest_leg import calculate_interest_leg, compound_accruals
+from helper_functions import compute_reset_date, fetch_interest_rates
+from providers import MarketDataProvider
+
+
+def synthetic_rates_df(start_date, end_date, reset_frequency, look_back_days=2, seed=7):
+    """Build a sorted rate table shaped like the one calculate_interest_leg compounds."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start=start_date, end=end_date, freq='D')
+    reset_dates = days.map(lambda dt: compute_reset_date(dt, reset_frequency))
+    rates_df = pd.DataFrame({
+        "Reset Date": pd.to_datetime(reset_dates).date,
+        "Rate Date": (pd.to_datetime(reset_dates) - pd.Timedelta(days=look_back_days)).date,
+        "Rate": 0.05 + 0.001 * rng.standard_normal(len(days)),
+    })
+    return rates_df.sort_values('Reset Date').reset_index(drop=True)
+
+
+notional = 50_000_000 * (94.500510 / 100.0)
+spread = 0.002
+
+for reset_frequency in ["1D", "1M", "3M", "6M"]:
+    for day_count_choice, year_basis in [("Act", 360), ("Act", 365), ("30", 360)]:
+        rates_df = synthetic_rates_df("2019-10-24", "2024-05-24", reset_frequency)
+
+        total_loop, df_loop = compound_accruals(rates_df, notional, spread,
+                                                day_count_choice, year_basis, engine="loop")
+        total_np, df_np = compound_accruals(rates_df, notional, spread,
+                                            day_count_choice, year_basis, engine="numpy")
+
+        assert total_np == total_loop, (reset_frequency, total_np, total_loop)
+        pd.testing.assert_frame_equal(df_np, df_loop, check_exact=True)
+
+        # Columnar output: same numbers, typed columns, same column order
+        total_table, table = compound_accruals(rates_df, notional, spread,
+                                               day_count_choice, year_basis, output="table")
+        assert total_table == total_np and table.columns == list(df_np.columns)
+        assert table["Accrual Date"].dtype == np.dtype("datetime64[D]")
+        assert table["Accrual Days"].dtype == np.int32
+        expected = df_np.astype({"Accrual Date": "datetime64[ns]", "Rate Date": "datetime64[ns]",
+                                 "Accrual Days": np.int32})
+        pd.testing.assert_frame_equal(table.to_frame().astype({"Accrual Date": "datetime64[ns]",
+                                                               "Rate Date": "datetime64[ns]"}),
+                                      expected, check_exact=True)
+
+        # Run-length output: closed-form runs, expanded back to the same table
+        total_runs, runs = compound_accruals(rates_df, notional, spread,
+                                             day_count_choice, year_basis, output="runs")
+        assert np.isclose(total_runs, total_np, rtol=1e-12, atol=0), (total_runs, total_np)
+        assert runs.periods == len(df_np) and runs["Periods"].min() >= 1
+        if reset_frequency != "1D":
+            # At most one run per reset period
+            assert len(runs) < df_np["Accrual Date"].nunique(), (len(runs), reset_frequency)
+        expanded = runs.expand("table")
+        assert all(np.array_equal(expanded[c], table[c]) for c in table.columns)
+        pd.testing.assert_frame_equal(runs.expand(), table.to_frame(), check_exact=True)
+        print(f"{reset_frequency} {day_count_choice}/{year_basis}: OK  total={total_np:,.6f}")
+
+# A single-row table has no accrual periods
+total_np, df_np = compound_accruals(synthetic_rates_df("2024-01-02", "2024-01-02", "1D"),
+                                    notional, spread, "Act", 360)
+assert total_np == 0.0 and df_np.empty
+total_runs, runs = compound_accruals(synthetic_rates_df("2024-01-02", "2024-01-02", "1D"),
+                                     notional, spread, "Act", 360, output="runs")
+assert total_runs == 0.0 and len(runs) == 0 and runs.expand().empty
+
+# Daily resets with weekend rates forward-filled: each weekend joins Friday's run
+rates_df = synthetic_rates_df("2023-01-02", "2024-12-31", "1D")
+weekend = pd.to_datetime(rates_df["Reset Date"]).dt.dayofweek >= 5
+rates_df["Rate"] = rates_df["Rate"].mask(weekend).ffill()
+total_np, df_np = compound_accruals(rates_df, notional, spread, "Act", 360)
+total_runs, runs = compound_accruals(rates_df, notional, spread, "Act", 360, output="runs")
+assert np.isclose(total_runs, total_np, rtol=1e-12, atol=0)
+assert len(runs) == (~weekend[:-1]).sum() and runs["Periods"].max() == 3
+
+# calculate_interest_leg(output="runs") reads one row per reset period, never the daily table
+class SyntheticRates(MarketDataProvider):
+    def get_rates(self, series_id, start_date, end_date):
+        days = pd.bdate_range("2018-01-02", "2025-06-30")
+        series = pd.Series(4.0 + np.cumsum(np.random.default_rng(3).normal(0, 0.02, len(days))), index=days)
+        return series.loc[start_date:end_date]
+
+
+market = SyntheticRates()
+for reset_frequency, options in [("1D", {}), ("1M", {}), ("3M", {"calendar": "USGS", "lockout_days": 3}),
+                                 ("6M", {"lockout_days": 5})]:
+    start, end = "2020-02-17", "2024-11-08"
+    per_reset = fetch_interest_rates(start, end, look_back_days=2, reset_frequency=reset_frequency,
+                                     provider=market, per_reset=True, **options)
+    daily = fetch_interest_rates(start, end, look_back_days=2, reset_frequency=reset_frequency,
+                                 provider=market, **options)
+    assert len(per_reset) == daily["Reset Date"].nunique() and per_reset["Calendar Days"].sum() == len(daily)
+    total_table, table = calculate_interest_leg("Bond", 10_000_000, 99.5, start, end, 0.002, "SOFR",
+                                                reset_frequency, "Act", 360, 2, provider=market,
+                                                output="table", **options)
+    total_runs, runs = calculate_interest_leg("Bond", 10_000_000, 99.5, start, end, 0.002, "SOFR",
+                                              reset_frequency, "Act", 360, 2, provider=market,
+                                              output="runs", **options)
+    assert np.isclose(total_runs, total_table, rtol=1e-12, atol=0), (reset_frequency, total_runs, total_table)
+    assert len(runs) < len(per_reset) and runs.periods == len(table)
+    expanded = runs.expand("table")
+    assert all(np.array_equal(expanded[c], table[c]) for c in table.columns), reset_frequency
+
+print("\nVectorized and run-length engines match the reference loop.")
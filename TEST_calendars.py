@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Business-day calendars: the holiday rules, O(1) offsets and counts against
+NumPy's busday functions, and business-day look-back / lockout in the rate
+table, the interest leg and the portfolio settlement.
+
+Runs offline on a synthetic series seeded into a temporary rate store.
+"""
+# TEST_calendars.py
+
+import functools
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from Interest_leg import calculate_interest_leg
+from calendars import easter_sundays, get_calendar
+from helper_functions import build_rate_table, fetch_interest_rates
+from portfolio import settle_portfolio
+from providers import MarketDataProvider
+from rate_store import RateStore
+
+usgs = get_calendar("USGS")
+fed = get_calendar("FED")
+target = get_calendar("TARGET")
+assert get_calendar("sifma") is usgs and get_calendar(usgs) is usgs and get_calendar("frbny") is fed
+
+# 1) Holiday rules
+assert [str(d) for d in easter_sundays([2024, 2025, 2038])] == ["2024-03-31", "2025-04-20", "2038-04-25"]
+usgs_2025 = [str(d) for d in usgs.holidays if str(d).startswith("2025")]
+assert usgs_2025 == ["2025-01-01", "2025-01-20", "2025-02-17", "2025-04-18", "2025-05-26", "2025-06-19",
+                     "2025-07-04", "2025-09-01", "2025-10-13", "2025-11-11", "2025-11-27", "2025-12-25"], usgs_2025
+# 2022: New Year's Day on a Saturday is not moved; Christmas on a Sunday moves to Monday
+assert not usgs.is_business_day("2022-12-26")[0] and usgs.is_business_day("2021-12-31")[0]
+# Fed (EFFR): open on Good Friday; Saturday holidays are not moved to Friday
+fed_2025 = [str(d) for d in fed.holidays if str(d).startswith("2025")]
+assert fed_2025 == [d for d in usgs_2025 if d != "2025-04-18"], fed_2025
+assert fed.is_business_day("2026-07-03")[0] and not usgs.is_business_day("2026-07-03")[0]
+assert not fed.is_business_day("2022-06-20")[0] and not fed.is_business_day("2023-01-02")[0]
+target_2024 = [str(d) for d in target.holidays if str(d).startswith("2024")]
+assert target_2024 == ["2024-01-01", "2024-03-29", "2024-04-01", "2024-05-01", "2024-12-25", "2024-12-26"]
+
+# 2) Offsets and counts equal np.busday_offset / np.busday_count with the same holidays
+rng = np.random.default_rng(23)
+dates = np.datetime64("2000-01-01") + rng.integers(0, 9000, 5000)
+ends = dates + rng.integers(0, 400, 5000)
+for calendar in [usgs, fed, target]:
+    holidays = calendar.holidays
+    assert (calendar.business_days_between(dates, ends) == np.busday_count(dates, ends, holidays=holidays)).all()
+    for n in [-5, -1, 0, 1, 10]:
+        for roll, numpy_roll in [("following", "forward"), ("preceding", "backward")]:
+            expected = np.busday_offset(dates, n, roll=numpy_roll, holidays=holidays)
+            assert (calendar.add_business_days(dates, n, roll=roll) == expected).all(), (calendar, n, roll)
+offsets = rng.integers(-3, 4, 5000)
+assert (usgs.add_business_days(dates, offsets) == np.busday_offset(dates, offsets, roll="forward",
+                                                                   holidays=usgs.holidays)).all()
+try:
+    usgs.add_business_days("1980-01-01", 1)
+except LookupError:
+    pass
+else:
+    raise AssertionError("dates outside the calendar must raise LookupError")
+
+# 3) Business-day look-back and lockout in the rate table
+days = pd.bdate_range("2023-06-01", "2025-06-30")
+series = pd.Series(np.arange(len(days), dtype=float) / 100 + 4.0, index=days)
+table = build_rate_table(series, "2024-01-10", "2024-01-31", look_back_days=2, calendar="USGS")
+rate_dates = dict(zip(table["Reset Date"].dt.strftime("%Y-%m-%d"), table["Rate Date"].dt.strftime("%Y-%m-%d")))
+assert rate_dates["2024-01-16"] == "2024-01-11"      # Tuesday after MLK day: Mon is a holiday
+assert rate_dates["2024-01-13"] == "2024-01-10"      # Saturday: Friday's look-back
+assert rate_dates["2024-01-15"] == "2024-01-10"      # the holiday itself, like the weekend before it
+calendar_days = build_rate_table(series, "2024-01-10", "2024-01-31", look_back_days=2)
+assert calendar_days["Rate Date"].iloc[6] == pd.Timestamp("2024-01-14")
+
+locked = build_rate_table(series, "2024-01-10", "2024-01-31", look_back_days=2, calendar="USGS", lockout_days=3)
+# The cut-off is 3 business days before Jan 31 (Fri Jan 26); later days use its rate
+assert (locked["Rate Date"][locked["Reset Date"] > "2024-01-26"] == pd.Timestamp("2024-01-24")).all()
+assert (locked["Rate Date"][locked["Reset Date"] <= "2024-01-26"]
+        == table["Rate Date"][table["Reset Date"] <= "2024-01-26"]).all()
+assert locked["Rate"].iloc[-1] == locked["Rate"][locked["Reset Date"] == "2024-01-26"].iloc[0]
+no_lockout = build_rate_table(series, "2024-01-10", "2024-01-31", look_back_days=2, lockout_days=0)
+pd.testing.assert_frame_equal(no_lockout, calendar_days)
+
+
+# 4) Interest leg and portfolio settlement with business-day schedules
+class StoreRates(MarketDataProvider):
+    def __init__(self, store):
+        self.store = store
+
+    def get_rates(self, series_id, start_date, end_date):
+        return self.store.get_series(series_id, start_date, end_date)
+
+
+store = RateStore(root=tempfile.mkdtemp(), offline=True)
+store.seed("SOFR", pd.Series(4.0 + np.cumsum(rng.normal(0, 0.02, len(days))), index=days))
+provider = StoreRates(store)
+
+book = pd.DataFrame({
+    "product_type": "Equity", "notional": 10_000_000.0, "initial_price": 100.0, "final_price": 101.0,
+    "start_date": pd.Timestamp("2024-03-01"), "end_date": pd.Timestamp("2024-09-03"),
+    "spread": 0.001, "float_index": "SOFR", "look_back_days": 5,
+    "calendar": ["", "USGS", "USGS", "TARGET", None],
+    "lockout_days": [0, 0, 2, 0, 2],
+})
+settled = settle_portfolio(book, rate_fetcher=functools.partial(fetch_interest_rates, store=store))
+for i, row in book.iterrows():
+    interest, _ = calculate_interest_leg("Equity", row.notional, row.initial_price, row.start_date, row.end_date,
+                                         row.spread, "SOFR", "1D", "Act", 360, row.look_back_days,
+                                         provider=provider, calendar=row.calendar or None,
+                                         lockout_days=row.lockout_days)
+    assert np.isclose(settled["Finance Leg"].iloc[i], interest, rtol=1e-12), (i, settled["Finance Leg"].iloc[i], interest)
+assert len(set(settled["Finance Leg"].round(6))) == len(book)
+
+print("Business-day calendars match NumPy and drive look-back and lockout schedules.")
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Compounding index: period factors read from the index match compounding the
+rate table (calculate_interest_leg / settle_portfolio), incremental index
+updates give the same factors as a rebuild, an index is only refreshed when
+its rate series changed, and concurrent writers always swap in a complete pair
+of array files.
+
+Runs offline on a synthetic series seeded into a temporary rate store.
+"""
+# TEST_compounding_index.py
+
+import functools
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from Interest_leg import calculate_interest_leg
+from compounding_index import CompoundingIndex, IndexStore
+from helper_functions import fetch_interest_rates
+from portfolio import settle_portfolio
+from providers import MarketDataProvider
+from rate_store import RateStore
+
+
+class StoreRates(MarketDataProvider):
+    def __init__(self, store):
+        self.store = store
+
+    def get_rates(self, series_id, start_date, end_date):
+        return self.store.get_series(series_id, start_date, end_date)
+
+
+rng = np.random.default_rng(19)
+days = pd.bdate_range("2021-01-04", "2025-06-30")
+rates = pd.Series(4.0 + np.cumsum(rng.normal(0, 0.01, len(days))), index=days)
+rates.iloc[rng.choice(len(days), 20, replace=False)] = np.nan     # FRED '.' observations
+
+root = tempfile.mkdtemp()
+store = RateStore(root=root, offline=True)
+store.seed("SOFR", rates)
+index_store = IndexStore(store)
+provider = StoreRates(store)
+
+# 1) Period factors against the full calculation (inside and past the stored dates)
+periods = [("2022-03-15", "2023-03-15"), ("2024-12-02", "2025-06-30"), ("2025-05-01", "2025-08-15")]
+for day_count_choice, year_basis in [("Act", 360), ("Act", 365), ("30", 365)]:
+    for look_back_days in [0, 2, 5]:
+        index = index_store.get("SOFR", day_count_choice, year_basis, look_back_days)
+        for start, end in periods:
+            for spread in [0.0, 0.002, -0.001]:
+                _, accrual = calculate_interest_leg("Equity", 1.0, 100.0, start, end, spread, "SOFR", "1D",
+                                                    day_count_choice, year_basis, look_back_days,
+                                                    provider=provider)
+                expected = accrual["Cumulative Factor"].iloc[-1]
+                exact = index.period_factor(start, end, spread)
+                approx = index.period_factor(start, end, spread, exact=False)
+                if spread == 0.0 or pd.Timestamp(end) > index.last_date:
+                    assert np.isclose(exact, expected, rtol=1e-13, atol=0), (start, end, spread, exact, expected)
+                else:
+                    assert exact == expected, (start, end, spread, exact, expected)
+                assert np.isclose(approx, expected, rtol=1e-6, atol=0), (approx, expected)
+
+# Vectorized lookups agree with the scalar ones
+starts, ends = zip(*periods)
+vector = index.period_factors(list(starts), list(ends), [0.0, 0.002, 0.001])
+assert all(vector[i] == index.period_factor(s, e, sp)
+           for i, (s, e, sp) in enumerate(zip(starts, ends, [0.0, 0.002, 0.001])))
+
+try:
+    index.period_factor("2020-06-01", "2021-06-01")
+except LookupError:
+    pass
+else:
+    raise AssertionError("periods before the first stored rate must raise LookupError")
+
+# 2) Incremental update (new days plus a revised old observation) == rebuild, bit for bit
+history = rates.loc[:"2024-12-31"]
+partial = IndexStore(RateStore(root=tempfile.mkdtemp(), offline=True))
+partial.store.seed("SOFR", history)
+before = partial.get("SOFR", "Act", 360, 2)
+revised = rates.copy()
+revised.loc["2024-06-03"] += 0.05
+partial.store.seed("SOFR", revised)
+after = partial.get("SOFR", "Act", 360, 2)
+rebuilt = CompoundingIndex.build(revised, "SOFR", 360, 2)
+assert after is not before
+assert np.array_equal(after.factors, rebuilt.factors) and np.array_equal(after.rates, rebuilt.rates)
+overlap = len(before.factors)
+unchanged = int(np.flatnonzero(np.asarray(after.factors)[:overlap] != np.asarray(before.factors))[0])
+assert pd.Timestamp(after.first_date + unchanged - 1) >= pd.Timestamp("2024-06-05")
+
+# Saved indexes are reloaded from disk without recompounding
+reloaded = IndexStore(partial.store).get("SOFR", "Act", 360, 2)
+assert np.array_equal(reloaded.factors, after.factors)
+
+# While the series is unchanged, get() neither re-reads the rates nor recompares them
+reads = []
+get_series = partial.store.get_series
+partial.store.get_series = lambda *args: reads.append(args) or get_series(*args)
+assert partial.get("SOFR", "Act", 360, 2) is after
+assert IndexStore(partial.store).get("SOFR", "Act", 360, 2) is not None and reads == [], reads
+partial.store.seed("SOFR", revised.loc["2025-06-01":] + 0.01)
+assert partial.get("SOFR", "Act", 360, 2) is not after and len(reads) == 1
+
+# Writers with separate locks (as separate processes) and readers never see new rates with old factors
+shared_root = tempfile.mkdtemp()
+RateStore(root=shared_root, offline=True).seed("SOFR", rates.loc[:"2024-06-28"])
+errors = []
+
+
+def write(k):
+    try:
+        writer = IndexStore(RateStore(root=shared_root, offline=True))
+        for i in range(10):
+            # Alternate between a shorter and a longer series, so the array lengths change
+            writer.store.seed("SOFR", rates.loc[:"2025-06-30" if i % 2 else "2024-06-28"] + k / 100)
+            writer.get("SOFR", "Act", 360, 2)
+    except Exception as e:   # noqa: BLE001 - reported below
+        errors.append(e)
+
+
+def read():
+    try:
+        reader = IndexStore(RateStore(root=shared_root, offline=True))
+        for _ in range(300):
+            _, _, index = reader._read(("SOFR", 360, 2))
+            assert index is None or len(index.factors) == len(index.rates) + 1
+    except Exception as e:   # noqa: BLE001 - reported below
+        errors.append(e)
+
+
+threads = [threading.Thread(target=write, args=(k,)) for k in range(4)] + [threading.Thread(target=read)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert not errors, errors
+assert not [name for name in os.listdir(os.path.join(shared_root, "index")) if name.endswith(".tmp")]
+
+# 3) Portfolio settlement through the indexes
+book = pd.DataFrame({
+    "product_type": ["Bond", "Equity", "Bond", "Commodity"],
+    "notional": [10_000_000, 5_000_000, 2_000_000, 1_000_000],
+    "units": [0, 1000, 0, 500],
+    "initial_price": [99.5, 100.0, 101.2, 80.0],
+    "final_price": [100.1, 104.0, 100.9, 82.5],
+    "start_date": ["2022-03-15", "2024-01-02", "2022-03-15", "2024-01-02"],
+    "end_date": ["2023-03-15", "2025-01-02", "2023-03-15", "2025-01-02"],
+    "spread": [0.002, 0.0, 0.0015, 0.001],
+    "float_index": ["SOFR"] * 4,
+    "reset_frequency": ["1D", "1D", "1D", "3M"],
+    "day_count_choice": ["Act", "Act", "30", "Act"],
+    "year_basis": [360, 365, 360, 360],
+    "look_back_days": [2, 2, 0, 2],
+})
+fetcher = functools.partial(fetch_interest_rates, store=store)
+expected = settle_portfolio(book, rate_fetcher=fetcher)
+via_index = settle_portfolio(book, rate_fetcher=fetcher, index_store=index_store)
+assert np.allclose(via_index["Finance Leg"], expected["Finance Leg"], rtol=1e-9, atol=1e-6)
+
+print("Compounding index matches the compounded rate tables and updates incrementally.")
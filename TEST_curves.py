@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Zero curves: the Treasury bootstrap reprices its par bonds, Euribor deposits
+reprice off the EUR curve, the monotone cubic stays monotone between nodes,
+and broken-date forwards and TRS marks use the curves consistently.
+
+Runs offline on hand-made quotes and a synthetic rate series.
+"""
+# TEST_curves.py
+
+import functools
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from curves import ZeroCurve, euribor_fixings_as_of, euribor_zero_curve, treasury_zero_curve
+from fx_forward import price_fx_forwards, price_fx_forwards_on_curves
+from helper_functions import day_count_fraction, fetch_interest_rates
+from portfolio import mark_portfolio, settle_portfolio
+from rate_store import RateStore
+from yield_curve import TENOR_FIELDS
+
+as_of = pd.Timestamp("2025-03-31")
+par = pd.Series([4.30, 4.31, 4.32, 4.30, 4.25, 4.05, 3.90, 3.88, 3.95, 4.05, 4.20, 4.55, 4.58],
+                index=TENOR_FIELDS)
+par["BC_4MONTH"] = np.nan   # not published on every date
+
+for method in ["linear", "monotone_cubic"]:
+    usd = treasury_zero_curve(as_of, par, method=method)
+
+    # Bills: bond-equivalent yields are semi-annual zero rates
+    assert np.isclose(usd.zero_rates(0.25), 2 * np.log1p(0.0432 / 2), rtol=0, atol=1e-14)
+    # 5Y, 10Y and 30Y par bonds (semi-annual coupons) price at par
+    for years, field in [(5, "BC_5YEAR"), (10, "BC_10YEAR"), (30, "BC_30YEAR")]:
+        t = np.arange(0.5, years + 1e-9, 0.5)
+        df = np.exp(-usd.zero_rates(t) * t)
+        assert np.isclose(par[field] / 200 * df.sum() + df[-1], 1.0, rtol=0, atol=1e-12), (method, years)
+
+# Flat par curve -> flat zero curve
+flat = treasury_zero_curve(as_of, pd.Series(4.0, index=TENOR_FIELDS))
+assert np.allclose(flat.nodes, 2 * np.log1p(0.02), rtol=0, atol=1e-12)
+
+# Monotone cubic: through the nodes, no overshoot on monotone data
+curve = ZeroCurve(as_of, [0.25, 0.5, 1, 2, 5, 10], [0.01, 0.012, 0.02, 0.021, 0.03, 0.031], "monotone_cubic")
+grid = np.linspace(0.25, 10, 2000)
+assert np.allclose(curve.zero_rates(curve.times), curve.nodes, rtol=0, atol=1e-15)
+assert np.all(np.diff(curve.zero_rates(grid)) >= -1e-15)
+assert curve.zero_rates(50) == curve.nodes[-1] and curve.zero_rates(0.01) == curve.nodes[0]
+
+# Euribor: latest fixing on or before the as-of date; 1Y deposit reprices exactly
+ecb = {tenor: pd.DataFrame({"TIME_PERIOD": ["2025-01", "2025-02", "2025-03", "2025-04"],
+                            "OBS_VALUE": [base + 0.1, base + 0.05, base, base - 0.5]})
+       for tenor, base in [("1M", 2.6), ("3M", 2.5), ("6M", 2.4), ("1Y", 2.35)]}
+fixings = euribor_fixings_as_of(ecb, as_of)
+assert fixings == {"1M": 2.6, "3M": 2.5, "6M": 2.4, "1Y": 2.35}
+late = dict(ecb, **{"1Y": ecb["1Y"].assign(TIME_PERIOD=["2025-04", "2025-05", "2025-06", "2025-07"])})
+assert euribor_fixings_as_of(late, as_of) == {"1M": 2.6, "3M": 2.5, "6M": 2.4}
+early = euribor_fixings_as_of(ecb, "2024-12-31")
+assert early == {}
+try:
+    euribor_zero_curve(pd.Timestamp("2024-12-31"), early)
+    raise AssertionError("expected LookupError")
+except LookupError:
+    pass
+eur = euribor_zero_curve(as_of, fixings, method="monotone_cubic")
+one_year = as_of + pd.Timedelta(days=365)
+assert np.isclose(eur.forward_rates(as_of, one_year)[0], 2.35, rtol=0, atol=1e-12)
+assert np.isclose(eur.discount_factors(one_year)[0], 1 / (1 + 0.0235 * 365 / 360), rtol=0, atol=1e-15)
+
+# Broken-date forwards: vectorized over dates, same formula as the quoted-tenor pricer
+starts = pd.to_datetime(["2025-03-31", "2025-04-15", "2025-05-02"])
+maturities = pd.to_datetime(["2025-06-13", "2025-11-03", "2026-01-19"])
+priced = price_fx_forwards_on_curves(1.08, starts, maturities, usd, eur, notional=1_000_000,
+                                     notional_currency=np.array(["USD", "EUR", "USD"]))
+direct = price_fx_forwards(1.08, priced["us_rate"], priced["euribor_rate"], priced["days"], notional=1_000_000,
+                           notional_currency=np.array(["USD", "EUR", "USD"]))
+assert all(np.array_equal(priced[key], direct[key]) for key in direct)
+assert np.array_equal(priced["days"], [74, 202, 262])
+assert np.allclose(priced["usd_discount_factor"], usd.discount_factors(maturities), rtol=0, atol=0)
+assert np.all((priced["usd_discount_factor"] < 1) & (priced["eur_discount_factor"] < 1))
+
+# TRS marks: matured trades equal their settlement; unstarted ones are all projection
+rng = np.random.default_rng(21)
+days = pd.bdate_range("2023-01-02", "2025-06-30")
+store = RateStore(root=tempfile.mkdtemp(), offline=True)
+store.seed("SOFR", pd.Series(4.0 + np.cumsum(rng.normal(0, 0.01, len(days))), index=days))
+fetcher = functools.partial(fetch_interest_rates, store=store)
+book = pd.DataFrame({
+    "product_type": ["Bond", "Equity", "Bond"],
+    "notional": [10_000_000, 5_000_000, 2_000_000],
+    "units": [0, 1000, 0],
+    "initial_price": [99.5, 100.0, 101.2],
+    "final_price": [100.1, 104.0, 100.9],
+    "start_date": ["2024-01-02", "2024-06-03", "2025-06-02"],
+    "end_date": ["2025-01-02", "2025-09-30", "2026-06-01"],
+    "spread": [0.002, 0.0, 0.001],
+    "float_index": ["SOFR"] * 3,
+    "day_count_choice": ["Act", "Act", "30"],
+    "year_basis": [360, 365, 360],
+})
+marks = mark_portfolio(book, as_of, usd, rate_fetcher=fetcher)
+settled = settle_portfolio(book.iloc[:1], rate_fetcher=fetcher)
+assert marks["Discount Factor"].iloc[0] == 1.0
+assert np.isclose(marks["Finance Leg"].iloc[0], settled["Finance Leg"].iloc[0], rtol=1e-13, atol=0)
+assert np.isclose(marks["MTM"].iloc[0], settled["Net Settlement"].iloc[0], rtol=1e-13, atol=0)
+
+forward_start = marks.iloc[2]
+assert forward_start["Accrued Finance"] == 0.0
+ratio = usd.discount_factors("2025-06-02")[0] / usd.discount_factors("2026-06-01")[0]
+remaining = day_count_fraction(pd.Timestamp("2025-06-02"), pd.Timestamp("2026-06-01"), "30", 360)
+expected = 2_000_000 * 1.012 * (ratio + 0.001 * remaining - 1)
+assert np.isclose(forward_start["Finance Leg"], expected, rtol=1e-13, atol=0)
+running = marks.iloc[1]
+assert 0 < running["Accrued Finance"] < running["Finance Leg"]
+assert np.isclose(running["MTM"], running["Discount Factor"] * (running["Asset Leg"] - running["Finance Leg"]))
+
+print("Zero curves reprice their quotes and drive broken-date forwards and TRS marks.")
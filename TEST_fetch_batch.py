@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent fetch stage: independent requests overlap, identical concurrent
+requests share one download, and slow sources time out on their own budget,
+counted from when the request starts rather than while it waits for a thread.
+
+Runs offline with sleeping stand-ins for the remote sources.
+"""
+# TEST_fetch_batch.py
+
+import threading
+import time
+
+from market_cache import TTLCache, cached
+from market_data import FetchBatch
+
+cache = TTLCache()
+calls = {"treasury": 0}
+calls_lock = threading.Lock()
+
+
+@cached("fred", cache=cache)
+def slow_rates(series_id):
+    time.sleep(0.3)
+    return f"{series_id} rates"
+
+
+@cached("treasury", cache=cache)
+def slow_curve(year):
+    with calls_lock:
+        calls["treasury"] += 1
+    time.sleep(0.5)
+    return f"{year} curve"
+
+
+@cached("spot", cache=cache)
+def stuck_spot(ticker):
+    time.sleep(2.0)
+    return 1.08
+
+
+# Five requests of 0.3-0.5s each: the batch takes about as long as the slowest one
+t0 = time.perf_counter()
+batch = FetchBatch(timeouts={"spot": 0.2})
+batch.submit("sofr", slow_rates, "SOFR")
+batch.submit("effr", slow_rates, "EFFR")
+batch.submit("dashboard_curve", slow_curve, 2024)
+batch.submit("fx_curve", slow_curve, 2024)   # same request as the dashboard's
+batch.submit("spot", stuck_spot, "EURUSD=X")
+
+assert batch.result("sofr") == "SOFR rates" and batch.result("effr") == "EFFR rates"
+assert batch.result("dashboard_curve") == batch.result("fx_curve") == "2024 curve"
+elapsed = time.perf_counter() - t0
+assert elapsed < 0.9, elapsed
+assert calls["treasury"] == 1, calls
+
+try:
+    batch.result("spot")
+except TimeoutError:
+    pass
+else:
+    raise AssertionError("the spot request should have timed out")
+
+# A request queued behind a full pool gets its whole budget once it starts
+block = threading.Event()
+
+
+@cached("fred", cache=cache)
+def busy(i):
+    block.wait(5)
+    return i
+
+
+@cached("euribor", cache=cache)
+def quick_euribor(key):
+    time.sleep(0.05)
+    return key
+
+
+queued = FetchBatch(timeouts={"fred": 5, "euribor": 0.3})
+for i in range(8):
+    queued.submit(f"busy{i}", busy, i)
+queued.submit("euribor", quick_euribor, "3M")
+time.sleep(0.5)   # longer than the euribor budget, spent waiting for a thread
+block.set()
+assert queued.result("euribor") == "3M"
+assert [queued.result(f"busy{i}") for i in range(8)] == list(range(8))
+
+# Callers waiting on another caller's load give up after wait_timeout
+waiting = TTLCache(wait_timeout=0.1)
+release = threading.Event()
+owner = threading.Thread(target=waiting.get_or_load, args=("spot", "hung", lambda: release.wait(5)))
+owner.start()
+time.sleep(0.05)
+try:
+    waiting.get_or_load("spot", "hung", lambda: "never called")
+except TimeoutError:
+    pass
+else:
+    raise AssertionError("a waiter should time out on a hung load")
+release.set()
+owner.join()
+
+print(f"4 requests finished in {elapsed:.2f}s (1.6s one after another); "
+      f"duplicate curve request downloaded once; stuck spot request timed out.")
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Market data TTL cache: entries expire after their TTL, the least recently used
+entry is evicted first, failures and None are not cached, callers get copies,
+and concurrent requests for one key share a single load.
+"""
+# TEST_market_cache.py
+
+import threading
+import time
+
+import pandas as pd
+
+from market_cache import TTLCache, cached
+
+calls = []
+
+
+def loader(value):
+    def load():
+        calls.append(value)
+        return value
+    return load
+
+
+# 1) Expiry: a hit within the TTL, a new load after it
+cache = TTLCache()
+assert cache.get_or_load("spot", "a", loader(1), ttl=0.2) == 1
+assert cache.get_or_load("spot", "a", loader(2), ttl=0.2) == 1
+time.sleep(0.25)
+assert cache.get_or_load("spot", "a", loader(3), ttl=0.2) == 3
+assert calls == [1, 3], calls
+assert cache.stats()["spot"]["hits"] == 1 and cache.stats()["spot"]["misses"] == 2
+
+# 2) LRU eviction: reading "a" keeps it, so "b" (least recently used) goes first
+cache = TTLCache(max_entries=3)
+for key in ["a", "b", "c"]:
+    cache.get_or_load("fred", key, loader(key))
+cache.get_or_load("fred", "a", loader("a again"))
+cache.get_or_load("treasury", "d", loader("d"))
+del calls[:]
+assert cache.get_or_load("fred", "a", loader("reloaded a")) == "a"
+assert cache.get_or_load("fred", "b", loader("reloaded b")) == "reloaded b"
+assert calls == ["reloaded b"], calls
+stats = cache.stats()
+assert stats["fred"]["evictions"] == 2 and stats["fred"]["entries"] + stats["treasury"]["entries"] == 3, stats
+
+# 3) None and exceptions are not cached
+cache = TTLCache()
+cache.get_or_load("fred", "kept", loader("kept"))
+del calls[:]
+cache.get_or_load("spot", "none", loader(None))
+assert cache.get_or_load("spot", "none", loader("found")) == "found" and calls == [None, "found"]
+
+
+def failing():
+    raise ConnectionError("source down")
+
+
+try:
+    cache.get_or_load("spot", "down", failing)
+except ConnectionError:
+    pass
+else:
+    raise AssertionError("loader errors must propagate")
+assert cache.get_or_load("spot", "down", loader("back")) == "back"
+
+# 4) Callers get copies of DataFrames; clear() drops one source
+frame = cache.get_or_load("spot", "frame", lambda: pd.DataFrame({"Close": [1.0, 2.0]}))
+frame.loc[0, "Close"] = -1.0
+assert cache.get_or_load("spot", "frame", failing)["Close"].tolist() == [1.0, 2.0]
+cache.clear("spot")
+assert cache.stats()["spot"]["entries"] == 0 and cache.stats()["fred"]["entries"] > 0
+
+# 5) Concurrent callers of a missing key share one load
+del calls[:]
+release = threading.Event()
+
+
+def slow_load():
+    calls.append("slow")
+    release.wait(5)
+    return "shared"
+
+
+results = []
+threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("curve", "k", slow_load)))
+           for _ in range(5)]
+for thread in threads:
+    thread.start()
+time.sleep(0.1)
+release.set()
+for thread in threads:
+    thread.join()
+assert results == ["shared"] * 5 and calls == ["slow"], (results, calls)
+
+# 6) The decorator keys on the arguments and names its source
+shared = TTLCache()
+
+
+@cached("euribor", cache=shared)
+def series(key, start):
+    calls.append((key, start))
+    return f"{key}@{start}"
+
+
+del calls[:]
+assert series("3M", "2025-01") == series("3M", "2025-01") == "3M@2025-01"
+assert series("6M", "2025-01") == "6M@2025-01"
+assert calls == [("3M", "2025-01"), ("6M", "2025-01")] and series.source == "euribor"
+
+print("TTL cache expires, evicts least recently used entries and shares concurrent loads.")
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Portfolio settlement: every trade of a book settled by settle_portfolio equals
+calculate_interest_leg / calculate_total_return run on that trade alone, and
+each rate group is fetched once.
+
+Runs offline on a synthetic series seeded into a temporary rate store.
+"""
+# TEST_portfolio.py
+
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from Interest_leg import calculate_interest_leg
+from helper_functions import fetch_interest_rates
+from portfolio import settle_portfolio
+from providers import MarketDataProvider
+from rate_store import RateStore
+from return_leg import calculate_total_return
+
+
+class StoreRates(MarketDataProvider):
+    def __init__(self, store):
+        self.store = store
+
+    def get_rates(self, series_id, start_date, end_date):
+        return self.store.get_series(series_id, start_date, end_date)
+
+
+rng = np.random.default_rng(2)
+days = pd.bdate_range("2022-01-03", "2025-06-30")
+store = RateStore(root=tempfile.mkdtemp(), offline=True)
+for series_id, level in [("SOFR", 4.0), ("EFFR", 4.1)]:
+    store.seed(series_id, pd.Series(level + np.cumsum(rng.normal(0, 0.01, len(days))), index=days))
+provider = StoreRates(store)
+
+# 80 trades over a handful of shared rate groups, in shuffled order
+n = 80
+starts = pd.Timestamp("2023-01-03") + pd.to_timedelta(rng.integers(0, 4, n) * 90, unit="D")
+book = pd.DataFrame({
+    "product_type": rng.choice(["Bond", "Equity", "Commodity", "Other"], n),
+    "notional": rng.uniform(1e6, 5e7, n).round(2),
+    "units": rng.integers(100, 10_000, n).astype(float),
+    "initial_price": rng.uniform(90, 110, n),
+    "final_price": rng.uniform(90, 110, n),
+    "start_date": starts,
+    "end_date": starts + pd.to_timedelta(rng.choice([91, 365], n), unit="D"),
+    "spread": rng.choice([0.0, 0.001, 0.0025], n),
+    "float_index": rng.choice(["SOFR", "EFFR"], n),
+    "reset_frequency": rng.choice(["1D", "1M", "3M"], n),
+    "day_count_choice": rng.choice(["Act", "30"], n),
+    "year_basis": rng.choice([360, 365], n),
+    "look_back_days": rng.choice([0, 2, 5], n),
+}, index=rng.permutation(n) + 1000)
+
+fetches = []
+
+
+def counting_fetcher(*args, **kwargs):
+    fetches.append(args)
+    return fetch_interest_rates(*args, store=store, **kwargs)
+
+
+settled = settle_portfolio(book, rate_fetcher=counting_fetcher)
+groups = book.groupby(["float_index", "start_date", "end_date", "reset_frequency", "look_back_days"]).ngroups
+assert len(fetches) == groups < n, (len(fetches), groups)
+assert (settled.index == book.index).all()
+assert settled.columns[-3:].tolist() == ["Asset Leg", "Finance Leg", "Net Settlement"]
+
+for i, trade in enumerate(book.itertuples(index=False)):
+    interest, _ = calculate_interest_leg(trade.product_type, trade.notional, trade.initial_price, trade.start_date,
+                                         trade.end_date, trade.spread, trade.float_index, trade.reset_frequency,
+                                         trade.day_count_choice, trade.year_basis, trade.look_back_days,
+                                         provider=provider)
+    asset = calculate_total_return(trade.product_type, trade.notional, trade.units, trade.initial_price,
+                                   trade.final_price)
+    row = settled.iloc[i]
+    assert np.isclose(row["Finance Leg"], interest, rtol=1e-12, atol=1e-6), (i, row["Finance Leg"], interest)
+    assert row["Asset Leg"] == asset, (i, row["Asset Leg"], asset)
+    assert row["Net Settlement"] == row["Asset Leg"] - row["Finance Leg"]
+
+# Missing required columns are reported, optional ones default
+try:
+    settle_portfolio(book.drop(columns="float_index"), rate_fetcher=counting_fetcher)
+except ValueError:
+    pass
+else:
+    raise AssertionError("a book without float_index must raise ValueError")
+defaults = settle_portfolio(book.drop(columns=["units", "spread"]).iloc[:5], rate_fetcher=counting_fetcher)
+assert (defaults["units"] == 0).all() and (defaults["spread"] == 0).all()
+
+print("Portfolio settlement matches the single-trade interest and return legs.")
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Price store: a book's tickers are downloaded in batched requests grouped by
+their missing windows, later windows are served from disk, the first / last
+prices of each trade match the first and last row of a per-trade download,
+tickers that fail inside a batch are not recorded as covered (gaps without
+trading days are), and writers
+always swap in a complete pair of column files.
+
+Runs offline with a fake yf.download (multi-ticker (Price, Ticker) columns).
+"""
+# TEST_price_store.py
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from price_store import MERGE_SLACK_DAYS, PriceStore, fill_trade_prices
+from providers import YahooProvider
+
+rng = np.random.default_rng(25)
+days = pd.bdate_range("2022-01-03", "2024-06-28")
+history = {ticker: 50 + np.cumsum(rng.normal(0, 1, len(days))) for ticker in ["AAPL", "MSFT", "GLD", "CL=F"]}
+downloads = []
+
+
+def fake_download(tickers, start, end):
+    """yf.download: rows in [start, end), (Price, Ticker) columns for a list of tickers."""
+    downloads.append((tuple(tickers) if isinstance(tickers, list) else tickers, start, end))
+    window = (days >= pd.Timestamp(start)) & (days < pd.Timestamp(end))
+    names = tickers if isinstance(tickers, list) else [tickers]
+    frames = {}
+    for ticker in names:
+        # Unknown tickers come back as all-NaN columns, as yf.download does for failed ones
+        close = history[ticker][window] if ticker in history else np.full(window.sum(), np.nan)
+        frames[("Close", ticker)] = close
+        frames[("Adj Close", ticker)] = close * 0.99
+    prices = pd.DataFrame(frames, index=pd.DatetimeIndex(days[window], name="Date"))
+    prices.columns = pd.MultiIndex.from_tuples(prices.columns, names=["Price", "Ticker"])
+    return prices
+
+
+def per_trade_prices(ticker, start, end):
+    """What the app read before: first and last Adj Close of a single-ticker download."""
+    prices = fake_download(ticker, start, end)["Adj Close"][ticker]
+    return prices.iloc[0], prices.iloc[-1]
+
+
+store = PriceStore(root=tempfile.mkdtemp(), provider=YahooProvider(downloader=fake_download), offline=False)
+
+# 1) Each ticker downloaded once, batched with tickers missing about the same window
+n = 200
+tickers = rng.choice(["AAPL", "MSFT", "GLD", "CL=F"], n)
+starts = pd.Timestamp("2022-03-01") + pd.to_timedelta(rng.integers(0, 400, n), unit="D")
+ends = starts + pd.to_timedelta(rng.integers(1, 300, n), unit="D")
+first, last = store.first_last_prices(tickers, starts, ends)
+assert sorted(t for batch, _, _ in downloads for t in batch) == ["AAPL", "CL=F", "GLD", "MSFT"], downloads
+assert len(downloads) < 4, downloads
+for batch, start, end in downloads:
+    for ticker in batch:
+        own = (end_ - start_ for start_, end_ in [(starts[tickers == ticker].min(), ends[tickers == ticker].max())])
+        extra = pd.Timestamp(end) - pd.Timestamp(start) - next(own)
+        assert extra <= pd.Timedelta(days=MERGE_SLACK_DAYS), (ticker, start, end)
+for i in range(n):
+    window = (days >= starts[i]) & (days < ends[i])
+    if not window.any():
+        assert np.isnan(first[i]) and np.isnan(last[i])
+        continue
+    expected = per_trade_prices(tickers[i], starts[i], ends[i])
+    assert (first[i], last[i]) == expected, (i, first[i], last[i], expected)
+del downloads[:]
+
+# 2) Windows already covered are read from disk; a new store on the same files reuses them
+again = PriceStore(root=store.root, provider=YahooProvider(downloader=fake_download), offline=False)
+first_again, last_again = again.first_last_prices(tickers[:50], starts[:50], ends[:50])
+assert downloads == [] and np.array_equal(first_again, first[:50], equal_nan=True)
+assert np.array_equal(last_again, last[:50], equal_nan=True)
+
+# 3) Only the missing head is downloaded, once, for the tickers that need it
+assert store.ensure([("AAPL", "2022-01-03", "2022-06-01"), ("MSFT", "2022-06-01", "2022-09-01")]) == 1
+aapl_from = starts[tickers == "AAPL"].min().strftime("%Y-%m-%d")
+assert downloads == [(("AAPL",), "2022-01-03", aapl_from)], downloads
+series = store.get_prices("AAPL", "2022-01-03", "2022-06-01")
+expected = fake_download("AAPL", "2022-01-03", "2022-06-01")["Adj Close"]["AAPL"]
+assert np.array_equal(series.to_numpy(), expected.to_numpy()) and (series.index == expected.index).all()
+
+# 4) Offline stores never download; unknown tickers give NaN
+offline = PriceStore(root=store.root, provider=YahooProvider(downloader=fake_download), offline=True)
+del downloads[:]
+first_offline, _ = offline.first_last_prices(["AAPL", "XOM"], ["2022-01-03", "2022-01-03"], ["2022-02-01"] * 2)
+assert downloads == [] and np.isfinite(first_offline[0]) and np.isnan(first_offline[1])
+
+# 5) Book prices: missing initial / final prices filled, given prices kept, end_date's close included
+book = pd.DataFrame({
+    "product_type": ["Equity", "Equity", "Commodity", "Bond"],
+    "ticker": ["AAPL", "MSFT", "GLD", None],
+    "initial_price": [np.nan, 123.0, np.nan, 99.0],
+    "final_price": [np.nan, np.nan, np.nan, 101.0],
+    "start_date": pd.to_datetime(["2022-03-01", "2022-04-01", "2022-05-02", "2022-03-01"]),
+    "end_date": pd.to_datetime(["2022-09-30", "2022-10-31", "2022-11-30", "2022-09-30"]),
+})
+filled = fill_trade_prices(book, store=store)
+for i in range(3):
+    expected = per_trade_prices(book["ticker"][i], book["start_date"][i], book["end_date"][i] + pd.Timedelta(days=1))
+    assert filled["final_price"][i] == expected[1]
+    assert filled["initial_price"][i] == (expected[0] if i != 1 else 123.0)
+assert filled["final_price"][0] == history["AAPL"][days.get_loc("2022-09-30")] * 0.99
+assert (filled.loc[3, ["initial_price", "final_price"]] == [99.0, 101.0]).all()
+
+# 6) Far-apart windows are separate downloads; a ticker failing inside a batch stays uncovered
+del downloads[:]
+fresh = PriceStore(root=tempfile.mkdtemp(), provider=YahooProvider(downloader=fake_download), offline=False)
+windows = [("AAPL", "2022-01-03", "2022-03-01"), ("BAD", "2022-01-03", "2022-03-01"),
+           ("MSFT", "2023-06-01", "2023-09-01")]
+assert fresh.ensure(windows) == 2
+assert downloads == [(("AAPL", "BAD"), "2022-01-03", "2022-03-01"), (("MSFT",), "2023-06-01", "2023-09-01")]
+assert fresh._read_meta("BAD") == {} and fresh._read_meta("AAPL")["covered_from"] == "2022-01-03"
+assert fresh.ensure(windows) == 1 and downloads[-1] == (("BAD",), "2022-01-03", "2022-03-01"), downloads
+
+# 6b) A gap without trading days is downloaded once and then covered, not retried on every call
+weekend = PriceStore(root=tempfile.mkdtemp(), provider=YahooProvider(downloader=fake_download), offline=False)
+weekend.first_last_prices(["AAPL"], ["2024-01-02"], ["2024-03-30"])
+del downloads[:]
+for _ in range(3):
+    first_weekend, last_weekend = weekend.first_last_prices(["AAPL"], ["2024-01-02"], ["2024-04-01"])
+assert downloads == [(("AAPL",), "2024-03-30", "2024-04-01")], downloads
+assert weekend._read_meta("AAPL")["covered_to"] == "2024-04-01"
+assert last_weekend[0] == history["AAPL"][days.get_loc("2024-03-29")] * 0.99
+
+# 7) Concurrent writers (separate stores, as separate processes) never leave a mixed or missing pair
+errors = []
+
+
+def write(k):
+    try:
+        writer = PriceStore(root=fresh.root, offline=True)
+        for i in range(20):
+            writer.seed("MSFT", pd.Series(history["MSFT"][-50:] + k + i, index=days[-50:]))
+    except Exception as e:   # noqa: BLE001 - reported below
+        errors.append(e)
+
+
+def read():
+    try:
+        reader = PriceStore(root=fresh.root, offline=True)
+        for _ in range(200):
+            dates, prices = reader._load("MSFT")
+            assert dates is not None and len(dates) == len(prices)
+    except Exception as e:   # noqa: BLE001 - reported below
+        errors.append(e)
+
+
+threads = [threading.Thread(target=write, args=(k,)) for k in range(4)] + [threading.Thread(target=read)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert not errors, errors
+stored = PriceStore(root=fresh.root, offline=True).get_prices("MSFT", days[0], days[-1] + pd.Timedelta(days=1))
+assert len(stored) == ((days >= "2023-06-01") & (days < "2023-09-01")).sum() + 50, len(stored)
+
+# 8) Replayed recordings never write into the data directory's price store
+replay = subprocess.run([sys.executable, "-c", "import os, price_store, rate_store; "
+                         "print(os.path.commonpath([price_store.PriceStore().root, rate_store.DEFAULT_DATA_DIR]) "
+                         "== rate_store.DEFAULT_DATA_DIR)"],
+                        env=dict(os.environ, DERIVATIVES_CALC_RECORDINGS=tempfile.mkdtemp()),
+                        capture_output=True, text=True, check=True)
+assert replay.stdout.strip() == "False", replay
+
+print("Price store downloads each book in a few window groups and serves first and last prices from disk.")
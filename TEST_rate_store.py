@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Rate store: top-ups fetch only the missing head and tail, revised observations
+replace stored ones, every write swaps in a complete new pair of column files,
+concurrent writers on the same directory never mix or lose a pair, and failed
+FRED requests never mark a window as covered.
+
+Runs offline against a fake fetcher.
+"""
+# TEST_rate_store.py
+
+import functools
+import os
+import tempfile
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from helper_functions import fetch_fred_series
+from rate_store import RateStore
+
+today = pd.Timestamp(date.today())
+days = pd.bdate_range(today - pd.Timedelta(days=3 * 365), today)
+history = pd.Series(4.0 + np.arange(len(days)) / 1000, index=days)
+fetches = []
+
+
+def fetcher(series_id, start, end):
+    fetches.append((pd.Timestamp(start), pd.Timestamp(end)))
+    return history.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+
+root = tempfile.mkdtemp()
+store = RateStore(root=root, fetcher=fetcher, offline=False)
+
+
+def column_files():
+    return sorted(name for name in os.listdir(root) if name.endswith(".npy"))
+
+
+# 1) First read fetches from the requested start to today; the same day reads from disk
+start = today - pd.Timedelta(days=200)
+first = store.get_series("SOFR", start)
+assert fetches == [(start, today)], fetches
+pd.testing.assert_series_equal(first, history.loc[start:].rename("SOFR"), check_freq=False)
+store.get_series("SOFR", start + pd.Timedelta(days=10))
+assert len(fetches) == 1
+
+# 2) An earlier start fetches only the missing head
+earlier = today - pd.Timedelta(days=500)
+longer = store.get_series("SOFR", earlier)
+assert fetches[1] == (earlier, start - pd.Timedelta(days=1)), fetches
+pd.testing.assert_series_equal(longer, history.loc[earlier:].rename("SOFR"), check_freq=False)
+assert len(column_files()) == 2, column_files()
+
+# 3) Seeded revisions win over stored values; an older reader picks up the new pair
+reader = RateStore(root=root, offline=True)
+before = reader.get_series("SOFR")
+revised = history.iloc[-5:] + 1.0
+store.seed("SOFR", revised)
+after = reader.get_series("SOFR")
+assert len(after) == len(before) and (after.iloc[-5:].to_numpy() == revised.to_numpy()).all()
+assert (after.iloc[:-5].to_numpy() == before.iloc[:-5].to_numpy()).all()
+assert len(column_files()) == 2 and not [n for n in os.listdir(root) if n.endswith(".tmp")]
+
+# 4) Stores written before meta.json named the column pair are read and migrated
+legacy_root = tempfile.mkdtemp()
+np.save(os.path.join(legacy_root, "EFFR.dates.npy"), days.to_numpy().astype("datetime64[D]"))
+np.save(os.path.join(legacy_root, "EFFR.values.npy"), history.to_numpy())
+with open(os.path.join(legacy_root, "EFFR.meta.json"), "w") as f:
+    f.write('{"covered_from": "%s", "checked": "%s"}' % (days[0].date(), today.date()))
+legacy = RateStore(root=legacy_root, offline=True)
+assert legacy.last_date("EFFR") == days[-1]
+legacy.seed("EFFR", history.iloc[:3] - 1.0)
+assert not os.path.exists(os.path.join(legacy_root, "EFFR.dates.npy"))
+assert (legacy.get_series("EFFR").iloc[:3].to_numpy() == history.iloc[:3].to_numpy() - 1.0).all()
+
+# 5) Writers with separate locks (as separate processes) and lock-free readers never see a mixed pair
+shared_root = tempfile.mkdtemp()
+RateStore(root=shared_root, offline=True).seed("SOFR", history)
+errors = []
+
+
+def write(k):
+    try:
+        writer = RateStore(root=shared_root, offline=True)
+        for i in range(20):
+            writer.seed("SOFR", history.iloc[-50:] + k + i / 100)
+    except Exception as e:   # noqa: BLE001 - reported below
+        errors.append(e)
+
+
+def read():
+    try:
+        watcher = RateStore(root=shared_root, offline=True)
+        for _ in range(200):
+            dates, values = watcher._load("SOFR")
+            assert len(dates) == len(values) == len(history)
+    except Exception as e:   # noqa: BLE001 - reported below
+        errors.append(e)
+
+
+threads = [threading.Thread(target=write, args=(k,)) for k in range(4)] + [threading.Thread(target=read)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert not errors, errors
+final = RateStore(root=shared_root, offline=True).get_series("SOFR")
+assert (final.index == history.index).all()
+
+# 6) FRED errors other than "no data" propagate and leave the covered range untouched
+class FakeFred:
+    def __init__(self, message):
+        self.message = message
+
+    def get_series(self, series_id, observation_start=None, observation_end=None):
+        raise ValueError(self.message)
+
+
+assert fetch_fred_series("SOFR", start, today, client=FakeFred("No data exists for series id: SOFR")).empty
+error_root = tempfile.mkdtemp()
+stale = RateStore(root=error_root, offline=True)
+stale.seed("SOFR", history.loc[start:today - pd.Timedelta(days=10)])
+stale._write_meta("SOFR", dict(stale._read_meta("SOFR"), checked=(today - pd.Timedelta(days=10)).strftime("%Y-%m-%d")))
+meta_path = os.path.join(error_root, "SOFR.meta.json")
+with open(meta_path) as f:
+    meta_before = f.read()
+failing = RateStore(root=error_root, offline=False, fetcher=functools.partial(
+    fetch_fred_series, client=FakeFred("Too Many Requests.  Exceeded Rate Limit")))
+for head in [None, earlier]:
+    try:
+        failing.top_up("SOFR", head)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a FRED rate limit error must not be read as an empty window")
+    with open(meta_path) as f:
+        assert f.read() == meta_before
+
+print("Rate store tops up only what is missing and swaps its column files atomically.")
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Accrual table export: CSV, Parquet and Arrow IPC round trips keep the
+values (and, for Parquet/Arrow, the column types), and a book streamed
+trade by trade reads back as the concatenation of its tables.
+
+Runs offline on synthetic rate tables.
+"""
+# TEST_table_export.py
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from Interest_leg import compound_accruals
+from helper_functions import build_rate_table
+from table_export import export_bytes, read_table, write_accrual_book, write_table
+
+
+def synthetic_accruals(spread, output="frame", seed=5):
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("2022-01-03", "2024-06-28")
+    series = pd.Series(3.0 + np.cumsum(rng.normal(0, 0.01, len(days))), index=days)
+    rates_df = build_rate_table(series, "2022-07-01", "2024-06-28", look_back_days=2)
+    if output == "frame":
+        rates_df["Reset Date"] = rates_df["Reset Date"].dt.date
+        rates_df["Rate Date"] = rates_df["Rate Date"].dt.date
+    return compound_accruals(rates_df, 10_000_000, spread, "Act", 360, output=output)[1]
+
+
+df = synthetic_accruals(0.002)
+with tempfile.TemporaryDirectory() as root:
+    for name in ["accruals.parquet", "accruals.arrow"]:
+        path = os.path.join(root, name)
+        write_table(df, path)
+        back = read_table(path)
+        # Dates come back as dates (not strings) and numbers bit for bit
+        assert back["Accrual Date"].map(type).eq(type(df["Accrual Date"].iloc[0])).all()
+        pd.testing.assert_frame_equal(back, df, check_exact=True)
+        print(f"{name}: {os.path.getsize(path):,} bytes")
+
+    csv_path = os.path.join(root, "accruals.csv")
+    write_table(df, csv_path)
+    print(f"accruals.csv: {os.path.getsize(csv_path):,} bytes")
+
+    # In-memory export (download button) equals the file written to disk
+    with open(os.path.join(root, "accruals.parquet"), "rb") as f:
+        assert export_bytes(df, fmt="parquet") == f.read()
+
+    # A book streamed trade by trade, from compact AccrualTables
+    spreads = [0.001, 0.002, 0.003]
+    book_path = os.path.join(root, "book.parquet")
+    rows = write_accrual_book(((i, synthetic_accruals(s, output="table")) for i, s in enumerate(spreads)),
+                              book_path)
+    book = read_table(book_path)
+    assert rows == len(book) == len(df) * len(spreads)
+    assert list(book.columns) == ["Trade ID"] + list(df.columns)
+    expected = pd.concat([synthetic_accruals(s, output="table").to_frame().assign(**{"Trade ID": i})
+                          for i, s in enumerate(spreads)], ignore_index=True)[book.columns]
+    book = book.astype({"Accrual Date": "datetime64[ns]", "Rate Date": "datetime64[ns]"})
+    expected = expected.astype({"Accrual Date": "datetime64[ns]", "Rate Date": "datetime64[ns]"})
+    pd.testing.assert_frame_equal(book, expected, check_exact=True, check_dtype=False)
+
+print("\nAccrual tables round-trip through CSV, Parquet and Arrow.")
@@ -8,20 +8,25 @@ Created on Tue Mar 18 18:46:09 2025
 import streamlit as st
 from datetime import date, datetime
 import pandas as pd
-from fredapi import Fred
-import requests
-import xml.etree.ElementTree as ET
-import altair as alt
 from dateutil.relativedelta import relativedelta
-from ecbdata import ecbdata
 
 # Import your calculation modules
 from Interest_leg import calculate_interest_leg
 from return_leg import calculate_total_return
-from helper_functions import fetch_yfinance_prices
-
-# Initialize Fred (ensure you have your API key set correctly)
-fred = Fred(api_key='983188cadf286e4e553982bf2b9b4a1c')
+from market_data import (get_first_last_prices, get_yahoo_prices, get_fx_spot, get_fred_series,
+                         get_treasury_history, get_euribor_series, get_treasury_curve, get_euribor_curve,
+                         rates_provider, FetchBatch)
+from curves import ECB_EURIBOR_SERIES, INTERPOLATION_METHODS
+from yield_curve import TREASURY_TENORS
+from market_cache import market_cache
+from var_engine import annualized_volatility, fx_forward_var
+from fx_forward import price_fx_forwards
+from table_export import EXPORT_FORMATS, export_bytes
+from instrumentation import tracer
+
+# TRS look-back calendar choices -> calculate_interest_leg(calendar=...)
+LOOK_BACK_CALENDARS = {"Calendar days": None, "US Government Securities": "USGS", "Federal Reserve": "FED",
+                       "TARGET": "TARGET"}
 
 # Add a header title and a link to your LinkedIn profile at the very top.
 st.title("Gil De La Cruz Vazquez Derivatives Portofolio")
@@ -32,6 +37,39 @@ st.markdown("Sources: US Federal Reserve, European Central Bank & Yahoo Finance"
 # Create tabs for TRS Calculator, Economic Dashboard, and FX Forward Valuation
 tabs = st.tabs(["FX Derivatives", "Economic Dashboard", "Total Return Swaps Calculator"])
 
+# Shared market data cache statistics (all sessions use the same cache)
+with st.sidebar.expander("Market data cache"):
+    cache_stats = market_cache.stats()
+    if cache_stats:
+        st.dataframe(pd.DataFrame(cache_stats).T)
+    else:
+        st.write("No market data requested yet.")
+
+# Stage timings of the hot paths (shared by all sessions, like the cache above)
+with st.sidebar.expander("Timing (debug)"):
+    if st.checkbox("Record stage timings", value=tracer.enabled):
+        tracer.enable()
+    else:
+        tracer.disable()
+    timings = tracer.snapshot()
+    if timings["spans"]:
+        st.dataframe(pd.DataFrame(timings["spans"]).T.round(3))
+    if timings["counters"]:
+        st.dataframe(pd.Series(timings["counters"], name="count"))
+    if st.button("Reset timings"):
+        tracer.reset()
+    profile_calculations = st.checkbox("Profile calculations (cProfile)")
+
+# Every independent download of this rerun is started at once; tabs collect the
+# results below, so the page waits about as long as its slowest request.
+page_fetches = FetchBatch()
+today_str = date.today().strftime("%Y-%m-%d")
+eurusd_hist_start = (date.today() - relativedelta(years=1)).strftime("%Y-%m-%d")
+page_fetches.submit("sofr", get_fred_series, "SOFR", "1982-01-01", today_str)
+page_fetches.submit("effr", get_fred_series, "EFFR", "1982-01-01", today_str)
+page_fetches.submit("curve_this_year", get_treasury_history, date.today().year, date.today().year)
+page_fetches.submit("eurusd_history", get_yahoo_prices, "EURUSD=X", eurusd_hist_start, today_str)
+
 ##################################
 # TRS Calculator Tab
 ##################################
@@ -55,18 +93,38 @@ with tabs[2]:
         year_basis       = st.selectbox("Year Convention", [360, 365])
         reset_frequency  = st.selectbox("Reset Frequency", ["1D", "1M", "3M", "6M"])
         look_back_days   = st.number_input("Look Back Days", value=2, step=1)
+        calendar_label   = st.selectbox("Look Back Calendar", list(LOOK_BACK_CALENDARS),
+                                        help="Count the look-back (and lockout) in business days of a holiday calendar.")
+        look_back_calendar = LOOK_BACK_CALENDARS[calendar_label]
+        lockout_days     = st.number_input("Lockout Days", value=0, step=1, min_value=0)
     st.markdown("---")
 
+    # Chosen before calculating, so changing it doesn't clear the results
+    export_format = st.selectbox("Accrual Table Download Format", ["CSV", "Parquet", "Arrow"],
+                                 help="Parquet and Arrow keep column types and are zstd-compressed.")
+
     def display_and_download_table(df):
-        """Utility to display a DataFrame and provide a CSV download button."""
-        st.dataframe(df)
-        csv = df.to_csv(index=False).encode("utf-8")
-        st.download_button(
-            label="Download Accrual Table as CSV",
-            data=csv,
-            file_name="accrual_table.csv",
-            mime="text/csv"
-        )
+        """Utility to display a DataFrame and provide a download button in the chosen format."""
+        with tracer.span("render/accrual_table"):
+            st.dataframe(df)
+            fmt = export_format.lower()
+            extension, mime = EXPORT_FORMATS[fmt]
+            st.download_button(
+                label=f"Download Accrual Table as {export_format}",
+                data=export_bytes(df, fmt=fmt),
+                file_name=f"accrual_table{extension}",
+                mime=mime
+            )
+
+    def run_interest_leg(**kwargs):
+        """calculate_interest_leg, under cProfile when enabled in the sidebar's Timing panel."""
+        if not profile_calculations:
+            return calculate_interest_leg(**kwargs)
+        with tracer.profile() as profile:
+            result = calculate_interest_leg(**kwargs)
+        with st.expander("Profile of the interest leg calculation"):
+            st.text(profile["stats"])
+        return result
 
     # Conditional UI based on product type
     if product_type == "Bond":
@@ -81,7 +139,7 @@ with tabs[2]:
                 initial_price=initial_price,
                 final_price=final_price
             )
-            interest_accrued, accrual_df = calculate_interest_leg(
+            interest_accrued, accrual_df = run_interest_leg(
                 product_type="Bond",
                 notional=notional,
                 initial_price=initial_price,
@@ -92,7 +150,10 @@ with tabs[2]:
                 reset_frequency=reset_frequency,
                 day_count_choice=day_count_choice,
                 year_basis=year_basis,
-                look_back_days=look_back_days
+                look_back_days=look_back_days,
+                provider=rates_provider,
+                calendar=look_back_calendar,
+                lockout_days=lockout_days
             )
             net_value = asset_return - interest_accrued
             st.subheader("Results")
@@ -108,17 +169,9 @@ with tabs[2]:
         initial_date = st.date_input("Initial Valuation Date", value=date.today())
         final_date = st.date_input("Final Valuation Date", value=date.today())
         if st.button("Calculate Equity TRS"):
-            df_prices = fetch_yfinance_prices(ticker, initial_date, final_date)
-            if df_prices is not None and not df_prices.empty:
-                if "Adj Close" in df_prices.columns:
-                    start_price = float(df_prices["Adj Close"].iloc[0])
-                    final_price = float(df_prices["Adj Close"].iloc[-1])
-                elif "Close" in df_prices.columns:
-                    start_price = float(df_prices["Close"].iloc[0])
-                    final_price = float(df_prices["Close"].iloc[-1])
-                else:
-                    st.error("Price data does not contain 'Adj Close' or 'Close' columns.")
-                    st.stop()
+            prices = get_first_last_prices(ticker, initial_date.strftime("%Y-%m-%d"), final_date.strftime("%Y-%m-%d"))
+            if prices is not None:
+                start_price, final_price = prices
                 st.write(f"**Start Price:** {start_price:,.2f}")
                 st.write(f"**Final Price:** {final_price:,.2f}")
                 equity_notional = units * start_price
@@ -129,7 +182,7 @@ with tabs[2]:
                     initial_price=start_price,
                     final_price=final_price
                 )
-                interest_accrued, accrual_df = calculate_interest_leg(
+                interest_accrued, accrual_df = run_interest_leg(
                     product_type="Bond",  # or "Equity" if you handle it differently
                     notional=equity_notional,
                     initial_price=start_price,
@@ -140,7 +193,10 @@ with tabs[2]:
                     reset_frequency=reset_frequency,
                     day_count_choice=day_count_choice,
                     year_basis=year_basis,
-                    look_back_days=look_back_days
+                    look_back_days=look_back_days,
+                    provider=rates_provider,
+                    calendar=look_back_calendar,
+                    lockout_days=lockout_days
                 )
                 net_value = asset_return - interest_accrued
                 st.subheader("Results")
@@ -159,10 +215,10 @@ with tabs[2]:
         final_date = st.date_input("Final Valuation Date", value=date.today())
         notional = st.number_input("Notional (if needed)", value=100_000.0, step=10_000.0, format="%.2f")
         if st.button("Calculate Commodity TRS"):
-            df_prices = fetch_yfinance_prices(commodity_name, initial_date, final_date)
-            if df_prices is not None and not df_prices.empty:
-                start_price = df_prices["Adj Close"].iloc[0]
-                final_price = df_prices["Adj Close"].iloc[-1]
+            prices = get_first_last_prices(commodity_name, initial_date.strftime("%Y-%m-%d"),
+                                           final_date.strftime("%Y-%m-%d"))
+            if prices is not None:
+                start_price, final_price = prices
                 st.write(f"**Start Price:** {start_price:,.2f}")
                 st.write(f"**Final Price:** {final_price:,.2f}")
                 asset_return = calculate_total_return(
@@ -172,7 +228,7 @@ with tabs[2]:
                     initial_price=start_price,
                     final_price=final_price
                 )
-                interest_accrued, accrual_df = calculate_interest_leg(
+                interest_accrued, accrual_df = run_interest_leg(
                     product_type="Bond",  # or "Commodity" if your logic differs
                     notional=notional,
                     initial_price=start_price,
@@ -183,7 +239,10 @@ with tabs[2]:
                     reset_frequency=reset_frequency,
                     day_count_choice=day_count_choice,
                     year_basis=year_basis,
-                    look_back_days=look_back_days
+                    look_back_days=look_back_days,
+                    provider=rates_provider,
+                    calendar=look_back_calendar,
+                    lockout_days=lockout_days
                 )
                 net_value = asset_return - interest_accrued
                 st.subheader("Results")
@@ -197,175 +256,6 @@ with tabs[2]:
 
 
 
-##################################
-# Economic Dashboard Tab
-##################################
-with tabs[1]:
-    st.title("Economic Dashboard")
-    st.markdown("### Benchmark Interest Rates")
-    st.write("Below are some key interest rate metrics and trends:")
-
-    try:
-        # Define a date range from January 1, 1982 to today
-        start_dt = "1982-01-01"
-        end_dt = datetime.today().strftime("%Y-%m-%d")
-
-        # Fetch the series from FRED
-        sofr_series = fred.get_series("SOFR", observation_start=start_dt, observation_end=end_dt)
-        effr_series = fred.get_series("EFFR", observation_start=start_dt, observation_end=end_dt)
-
-        # Show current rates with their as-of dates
-        current_sofr = sofr_series.iloc[-1]
-        current_effr = effr_series.iloc[-1]
-        sofr_date = sofr_series.index[-1].strftime("%Y-%m-%d")
-        effr_date = effr_series.index[-1].strftime("%Y-%m-%d")
-
-        st.metric(label=f"Current SOFR (as of {sofr_date})", value=f"{current_sofr:.4f}")
-        st.metric(label=f"Current Fed Funds (FFR) (as of {effr_date})", value=f"{current_effr:.4f}")
-
-        # --- Historical Trends ---
-        st.markdown("#### Historical Trends")
-        # Convert the series to DataFrames and rename EFFR to FFR
-        sofr_df = sofr_series.reset_index()
-        sofr_df.columns = ["Date", "SOFR"]
-        effr_df = effr_series.reset_index()
-        effr_df.columns = ["Date", "FFR"]
-
-        # Merge the two DataFrames on Date using an outer join and forward-fill missing values
-        merged_df = pd.merge(sofr_df, effr_df, on="Date", how="outer")
-        merged_df.sort_values("Date", inplace=True)
-        merged_df.ffill(inplace=True)
-        merged_df["Date"] = pd.to_datetime(merged_df["Date"])
-
-        # Let the user select which rates to plot
-        selected_rates = st.multiselect(
-            "Select Rates to Plot",
-            options=["SOFR", "FFR"],
-            default=["SOFR", "FFR"]
-        )
-
-        # Filter merged_df to only include the selected columns
-        if not selected_rates:
-            st.warning("Please select at least one rate to plot.")
-        else:
-            # Melt the DataFrame for Altair plotting using only the selected rates
-            filtered_df = merged_df.melt(
-                id_vars=["Date"],
-                value_vars=selected_rates,
-                var_name="Rate_Type",
-                value_name="Rate"
-            )
-
-            import altair as alt
-            chart = alt.Chart(filtered_df).mark_line().encode(
-                x=alt.X('Date:T', title='Date'),
-                y=alt.Y('Rate:Q', title='Rate'),
-                color=alt.Color('Rate_Type:N',
-                                scale=alt.Scale(domain=["SOFR", "FFR"], range=["red", "blue"])),
-                tooltip=['Date:T', 'Rate:Q', 'Rate_Type:N']
-            ).properties(
-                title='Historical Trends: SOFR and FFR'
-            ).interactive()  # Enable panning and zooming
-
-            st.altair_chart(chart, use_container_width=True)
-            
-            # Add comment about data source
-            st.caption("Source: Federal Reserve Bank of U.S.")
-
-    except Exception as e:
-        st.error(f"Error fetching benchmark rate data: {e}")
-with tabs[1]:
-    st.markdown("### U.S. Treasury Yield Curve Snapshot")
-    st.write("Below is the latest snapshot of the U.S. Treasury yield curve:")
-
-    try:
-        # Fetch the yield curve XML from the Treasury website
-        url = "https://home.treasury.gov/resource-center/data-chart-center/interest-rates/pages/xmlview?data=daily_treasury_yield_curve&field_tdr_date_value=2025"
-        response = requests.get(url)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-        ns_atom = '{http://www.w3.org/2005/Atom}'
-        ns_m = '{http://schemas.microsoft.com/ado/2007/08/dataservices/metadata}'
-        ns_d = '{http://schemas.microsoft.com/ado/2007/08/dataservices}'
-
-        yield_data = []
-        for entry in root.findall(f'{ns_atom}entry'):
-            content = entry.find(f'{ns_atom}content')
-            if content is None:
-                continue
-            props = content.find(f'{ns_m}properties')
-            if props is None:
-                continue
-            date_elem = props.find(f'{ns_d}NEW_DATE')
-            if date_elem is None or not date_elem.text:
-                continue
-            row = {"NEW_DATE": date_elem.text,
-                   "BC_1MONTH": None, "BC_2MONTH": None, "BC_3MONTH": None,
-                   "BC_4MONTH": None, "BC_6MONTH": None, "BC_1YEAR": None,
-                   "BC_2YEAR": None, "BC_3YEAR": None, "BC_5YEAR": None,
-                   "BC_7YEAR": None, "BC_10YEAR": None, "BC_20YEAR": None,
-                   "BC_30YEAR": None}
-            for k in list(row.keys()):
-                if k == "NEW_DATE":
-                    continue
-                elem = props.find(f'{ns_d}{k}')
-                if elem is not None and elem.text is not None:
-                    row[k] = float(elem.text)
-            yield_data.append(row)
-
-        df_yield = pd.DataFrame(yield_data)
-        df_yield["NEW_DATE"] = pd.to_datetime(df_yield["NEW_DATE"])
-        if df_yield.empty:
-            st.warning("No yield curve data found.")
-        else:
-            latest_date = df_yield["NEW_DATE"].max()
-            latest_row = df_yield.loc[df_yield["NEW_DATE"] == latest_date].squeeze()
-
-            maturity_map = {
-                "BC_1MONTH":  (1/12,  "1M"),
-                "BC_2MONTH":  (2/12,  "2M"),
-                "BC_3MONTH":  (3/12,  "3M"),
-                "BC_4MONTH":  (4/12,  "4M"),
-                "BC_6MONTH":  (6/12,  "6M"),
-                "BC_1YEAR":   (1,     "1Y"),
-                "BC_2YEAR":   (2,     "2Y"),
-                "BC_3YEAR":   (3,     "3Y"),
-                "BC_5YEAR":   (5,     "5Y"),
-                "BC_7YEAR":   (7,     "7Y"),
-                "BC_10YEAR":  (10,    "10Y"),
-                "BC_20YEAR":  (20,    "20Y"),
-                "BC_30YEAR":  (30,    "30Y")
-            }
-
-            curve_rows = []
-            for col, (years, label) in maturity_map.items():
-                yield_val = latest_row.get(col)
-                if pd.notnull(yield_val):
-                    curve_rows.append({
-                        "MaturityYears": years,
-                        "MaturityLabel": label,
-                        "Yield": yield_val
-                    })
-            curve_df = pd.DataFrame(curve_rows)
-            st.write(f"Yield Curve Snapshot for {latest_date.date()}")
-            # Plot the yield curve
-            chart = (
-                alt.Chart(curve_df)
-                .mark_line(point=True)
-                .encode(
-                    x=alt.X("MaturityYears:Q", title="Maturity (Years)"),
-                    y=alt.Y("Yield:Q", title="Yield (%)"),
-                    tooltip=["MaturityLabel:N", "Yield:Q"]
-                )
-                .properties(title="U.S. Treasury Yield Curve")
-                .interactive()
-            )
-            st.altair_chart(chart, use_container_width=True)
-            st.caption("Source: U.S. Treasury.")
-    except Exception as e:
-        st.error(f"Could not fetch or parse yield curve data: {e}")
-
-
 ##################################
 # FX Derivatives Tab
 ##################################
@@ -390,12 +280,19 @@ with tabs[0]:
             "1M": {"years": 0, "months": 1},
             "3M": {"years": 0, "months": 3},
             "6M": {"years": 0, "months": 6},
-            "1Y": {"years": 1, "months": 0}
+            "1Y": {"years": 1, "months": 0},
+            "Broken Date": None,
         }
         selected_tenor = st.selectbox("Select Tenor", list(tenor_options.keys()), index=1, key="forward_tenor")
-        delta_params = tenor_options[selected_tenor]
-        maturity_date = forward_start_date + relativedelta(years=delta_params["years"],
-                                                           months=delta_params["months"])
+        broken_date = selected_tenor == "Broken Date"
+        if broken_date:
+            # Any maturity: rates are read off the Treasury and Euribor zero curves
+            maturity_date = st.date_input("Maturity Date", value=forward_start_date + relativedelta(months=2, days=10),
+                                          min_value=forward_start_date + relativedelta(days=1), key="fwd_maturity")
+        else:
+            delta_params = tenor_options[selected_tenor]
+            maturity_date = forward_start_date + relativedelta(years=delta_params["years"],
+                                                               months=delta_params["months"])
         st.write(f"**Maturity Date:** {maturity_date.strftime('%Y-%m-%d')}")
         days_contract = (maturity_date - forward_start_date).days
         T = days_contract / 360.0
@@ -403,20 +300,27 @@ with tabs[0]:
         basis_spread = st.number_input("Basis Spread (in decimal)", value=0.0, format="%.4f", key="fwd_basis")
         notional_value = st.number_input("Notional Value", value=1_000_000.0, format="%.2f", key="fwd_notional")
         notional_currency = st.selectbox("Notional Currency", options=["USD", "EUR"], key="fwd_currency")
+        curve_method = st.selectbox("Zero Curve Interpolation", list(INTERPOLATION_METHODS),
+                                    help="Used for broken dates and for discounting.", key="fwd_curve_method")
+
+        treasury_field_map = {"1M": "BC_1MONTH", "3M": "BC_3MONTH", "6M": "BC_6MONTH", "1Y": "BC_1YEAR"}
+        ecb_series_map = {tenor: series_key for tenor, (series_key, _) in ECB_EURIBOR_SERIES.items()}
+        # Spot, Treasury curve, Euribor and the zero curves are independent: request them together
+        forward_start_str = forward_start_date.strftime("%Y-%m-%d")
+        page_fetches.submit("fx_spot", get_fx_spot, "EURUSD=X", forward_start_str)
+        page_fetches.submit("usd_zero_curve", get_treasury_curve, forward_start_str, curve_method)
+        page_fetches.submit("eur_zero_curve", get_euribor_curve, forward_start_str, curve_method)
+        if not broken_date:
+            page_fetches.submit("fx_curve", get_treasury_history,
+                                min(forward_start_date.year, date.today().year), date.today().year)
+            page_fetches.submit("fx_euribor", get_euribor_series, ecb_series_map[selected_tenor],
+                                forward_start_date.strftime("%Y-%m"))
     
         st.markdown("### Fetching Data")
-        # Fetch spot rate from Yahoo Finance
-        spot_data = fetch_yfinance_prices("EURUSD=X",
-                                          (forward_start_date - pd.Timedelta(days=5)).strftime("%Y-%m-%d"),
-                                          forward_start_date.strftime("%Y-%m-%d"))
-        if spot_data is not None and not spot_data.empty:
-            if "Adj Close" in spot_data.columns:
-                fetched_spot = float(spot_data["Adj Close"].iloc[-1])
-            elif "Close" in spot_data.columns:
-                fetched_spot = float(spot_data["Close"].iloc[-1])
-            else:
-                fetched_spot = None
-        else:
+        # Spot rate (last close on or before the start date) from the market data provider
+        try:
+            fetched_spot = page_fetches.result("fx_spot")
+        except Exception:
             fetched_spot = None
     
         if fetched_spot is None:
@@ -425,71 +329,54 @@ with tabs[0]:
             spot_rate = st.number_input("Spot Rate (EUR/USD)", value=fetched_spot, format="%.4f", key="fwd_spot")
             st.metric("Spot Rate (EUR/USD)", f"{spot_rate:.4f}")
     
-        # Fetch US Treasury par rate for the selected tenor
-        treasury_field_map = {"1M": "BC_1MONTH", "3M": "BC_3MONTH", "6M": "BC_6MONTH", "1Y": "BC_1YEAR"}
-        treasury_url = ("https://home.treasury.gov/resource-center/data-chart-center/interest-rates/pages/"
-                        "xmlview?data=daily_treasury_yield_curve&field_tdr_date_value=2025")
+        # Zero curves as of the start date: broken-date rates and discounting
         try:
-            response = requests.get(treasury_url)
-            response.raise_for_status()
-            root = ET.fromstring(response.content)
-            ns_atom = '{http://www.w3.org/2005/Atom}'
-            ns_m = '{http://schemas.microsoft.com/ado/2007/08/dataservices/metadata}'
-            ns_d = '{http://schemas.microsoft.com/ado/2007/08/dataservices}'
-            yield_data = []
-            for entry in root.findall(f'{ns_atom}entry'):
-                content = entry.find(f'{ns_atom}content')
-                if content is None:
-                    continue
-                props = content.find(f'{ns_m}properties')
-                if props is None:
-                    continue
-                date_elem = props.find(f'{ns_d}NEW_DATE')
-                if date_elem is None or not date_elem.text:
-                    continue
-                row = {"NEW_DATE": date_elem.text}
-                field = treasury_field_map.get(selected_tenor)
-                elem = props.find(f'{ns_d}{field}')
-                if elem is not None and elem.text is not None:
-                    row[field] = float(elem.text)
-                yield_data.append(row)
-            treasury_df = pd.DataFrame(yield_data)
-            treasury_df["NEW_DATE"] = pd.to_datetime(treasury_df["NEW_DATE"])
-            if treasury_df.empty:
-                us_rate = None
-            else:
-                latest_us_row = treasury_df.sort_values("NEW_DATE").iloc[-1]
-                us_rate = latest_us_row[treasury_field_map[selected_tenor]]
+            usd_zero_curve = page_fetches.result("usd_zero_curve")
+            eur_zero_curve = page_fetches.result("eur_zero_curve")
         except Exception as e:
-            st.error(f"Failed to fetch US Treasury par rate: {e}")
-            us_rate = None
-    
+            st.warning(f"Zero curves not available: {e}")
+            usd_zero_curve = eur_zero_curve = None
+
+        if broken_date:
+            # Simple Act/360 rates for exactly the contract period, read off the zero curves
+            if usd_zero_curve is None or eur_zero_curve is None:
+                us_rate = euribor_rate = None
+            else:
+                us_rate = float(usd_zero_curve.forward_rates(forward_start_date, maturity_date)[0])
+                euribor_rate = float(eur_zero_curve.forward_rates(forward_start_date, maturity_date)[0])
+        else:
+            # US Treasury par rate for the selected tenor
+            try:
+                # Curve as of the forward start date, from the same parsed history as the dashboard
+                curve_history = page_fetches.result("fx_curve")
+                if curve_history.empty:
+                    us_rate = None
+                else:
+                    _, us_curve = curve_history.as_of(forward_start_date)
+                    us_rate = us_curve[treasury_field_map[selected_tenor]]
+                    if pd.isnull(us_rate):
+                        us_rate = None
+            except Exception as e:
+                st.error(f"Failed to fetch US Treasury par rate: {e}")
+                us_rate = None
+
+            try:
+                df_ecb = page_fetches.result("fx_euribor")
+                df_ecb["TIME_PERIOD"] = pd.to_datetime(df_ecb["TIME_PERIOD"])
+                if df_ecb.empty:
+                    euribor_rate = None
+                else:
+                    df_ecb = df_ecb.sort_values("TIME_PERIOD")
+                    euribor_rate = df_ecb.iloc[-1]["OBS_VALUE"]
+            except Exception as e:
+                st.error(f"Failed to fetch Euribor rate from the ECB Data Portal: {e}")
+                euribor_rate = None
+
         if us_rate is None:
             st.error("US Treasury par rate not available.")
         else:
             st.metric(f"US Treasury {selected_tenor} Rate", f"{us_rate:.4f}")
     
-        from ecbdata import ecbdata
-        ecb_series_map = {
-            "1M": "FM.M.U2.EUR.RT.MM.EURIBOR1MD_.HSTA",
-            "3M": "FM.M.U2.EUR.RT.MM.EURIBOR3MD_.HSTA",
-            "6M": "FM.M.U2.EUR.RT.MM.EURIBOR6MD_.HSTA",
-            "1Y": "FM.M.U2.EUR.RT.MM.EURIBOR1YD_.HSTA"
-        }
-        try:
-            df_ecb = ecbdata.get_series(ecb_series_map[selected_tenor],
-                                        start=forward_start_date.strftime("%Y-%m"),
-                                        detail="dataonly")
-            df_ecb["TIME_PERIOD"] = pd.to_datetime(df_ecb["TIME_PERIOD"])
-            if df_ecb.empty:
-                euribor_rate = None
-            else:
-                df_ecb = df_ecb.sort_values("TIME_PERIOD")
-                euribor_rate = df_ecb.iloc[-1]["OBS_VALUE"]
-        except Exception as e:
-            st.error(f"Failed to fetch Euribor rate from ECB using ecbdata: {e}")
-            euribor_rate = None
-    
         if euribor_rate is None:
             st.error("Euribor rate not available.")
         else:
@@ -498,8 +385,12 @@ with tabs[0]:
         if spot_rate is not None and us_rate is not None and euribor_rate is not None:
             # Calculate the forward rate using the Premium/Discount method
             interest_diff = (euribor_rate - us_rate) / 100  
-            premium = spot_rate * (interest_diff * (days_contract / 360))
-            calculated_forward = spot_rate + premium + basis_spread
+            forward_pricing = price_fx_forwards(spot_rate, us_rate, euribor_rate, days_contract,
+                                                notional=notional_value,
+                                                notional_currency=notional_currency,
+                                                basis_spread=basis_spread)
+            premium = forward_pricing["premium"]
+            calculated_forward = forward_pricing["forward_rate"]
             st.markdown("### FX Forward Contract Valuation")
             st.write(f"**Forward Start Date:** {forward_start_date.strftime('%Y-%m-%d')}")
             st.write(f"**Maturity Date:** {maturity_date.strftime('%Y-%m-%d')}")
@@ -513,24 +404,32 @@ with tabs[0]:
             st.write(f"**Calculated Forward Rate (EUR/USD):** {calculated_forward:.4f}")
              
             if notional_currency == "USD":
-                spot_eur = notional_value / spot_rate
-                forward_eur = notional_value / calculated_forward
+                spot_eur = forward_pricing["spot_eur"]
+                forward_eur = forward_pricing["forward_eur"]
                 st.write(f"**USD Notional:** ${notional_value:,.2f}")
                 st.write(f"**Spot Equivalent in EUR:** €{spot_eur:,.2f}")
                 st.write(f"**Forward Equivalent in EUR:** €{forward_eur:,.2f}")
                 st.write(f"**Difference (Forward vs Spot):** €{(forward_eur - spot_eur):,.2f}")
+                if eur_zero_curve is not None:
+                    eur_df = float(eur_zero_curve.discount_factors(maturity_date)[0])
+                    st.write(f"**EUR Discount Factor to Maturity:** {eur_df:.6f}")
+                    st.write(f"**Present Value of the Difference:** €{eur_df * (forward_eur - spot_eur):,.2f}")
             else:
-                spot_usd = notional_value * spot_rate
-                forward_usd = notional_value * calculated_forward
+                spot_usd = forward_pricing["spot_usd"]
+                forward_usd = forward_pricing["forward_usd"]
                 st.write(f"**EUR Notional:** €{notional_value:,.2f}")
                 st.write(f"**Spot Equivalent in USD:** ${spot_usd:,.2f}")
                 st.write(f"**Forward Equivalent in USD:** ${forward_usd:,.2f}")
                 st.write(f"**Difference (Forward vs Spot):** ${forward_usd - spot_usd:,.2f}")
+                if usd_zero_curve is not None:
+                    usd_df = float(usd_zero_curve.discount_factors(maturity_date)[0])
+                    st.write(f"**USD Discount Factor to Maturity:** {usd_df:.6f}")
+                    st.write(f"**Present Value of the Difference:** ${usd_df * (forward_usd - spot_usd):,.2f}")
              
             # Add a button to trigger the Monte Carlo VaR calculation
             if st.button("Calculate Monte Carlo VaR for FX Forward"):
                 # Fetch historical EUR/USD data for the past year for volatility estimation
-                var_hist_data = fetch_yfinance_prices(
+                var_hist_data = get_yahoo_prices(
                     "EURUSD=X",
                     (forward_start_date - pd.Timedelta(days=365)).strftime("%Y-%m-%d"),
                     forward_start_date.strftime("%Y-%m-%d")
@@ -549,34 +448,25 @@ with tabs[0]:
                         prices = None
     
                     if prices is not None:
-                        # Calculate daily log returns and daily volatility
-                        returns = np.log(prices / prices.shift(1)).dropna()
-                        daily_vol = returns.std()
-                        sigma_annual = float(daily_vol * np.sqrt(252))  # Convert to float
-                        T_val = float(T)  # Ensure T is a float
-                        
-                        # Convert spot_rate and calculated_forward to floats
-                        spot_rate_val = float(spot_rate)
-                        calculated_forward_val = float(calculated_forward)
-                        
-                        # Perform Monte Carlo simulation
-                        N = 10000  # Number of simulations
-                        simulated_Z = np.random.normal(0, 1, N)
-                        simulated_final_spot = spot_rate_val * np.exp(-0.5 * sigma_annual**2 * T_val + sigma_annual * np.sqrt(T_val) * simulated_Z)
-                        
-                        # Calculate profit/loss for each simulation
-                        pl = notional_value * (simulated_final_spot - calculated_forward_val)
-                                    
-                        # Allow the user to select a confidence level for VaR
-                        var_confidence = st.selectbox("Select VaR Confidence Level for Monte Carlo", options=[0.90, 0.95, 0.99], index=1)
-                        percentile = (1 - var_confidence) * 100  # e.g., 5 for 95% confidence
-            
-                        # VaR is defined as the (negative) value at the chosen percentile
-                        var_value = -np.percentile(pl, percentile)
-            
+                        # Annualized volatility of daily log returns
+                        sigma_annual = annualized_volatility(prices)
+
+                        # Seeded, antithetic Monte Carlo: VaR and ES at every confidence level in one pass
+                        var_result = fx_forward_var(
+                            spot_rate=float(spot_rate),
+                            forward_rate=float(calculated_forward),
+                            notional=notional_value,
+                            sigma_annual=sigma_annual,
+                            horizon_years=float(T),
+                            n_paths=100_000,
+                            confidence_levels=(0.90, 0.95, 0.99),
+                        )
+
                         st.markdown("### Monte Carlo VaR for FX Forward")
                         st.write(f"**Estimated Annualized Volatility:** {sigma_annual:.4f}")
-                        st.write(f"**Monte Carlo VaR at {int(var_confidence*100)}% confidence over {days_contract} days:** {var_value:,.2f} {notional_currency}")
+                        st.write(f"**Monte Carlo VaR and Expected Shortfall over {days_contract} days "
+                                 f"({var_result.n_paths:,} paths, {notional_currency}):**")
+                        st.dataframe(var_result.to_frame().style.format("{:,.2f}"))
     
     elif derivative_type == "FX Currency Swap":
         st.markdown("#### FX Currency Swap Valuation")
@@ -634,12 +524,11 @@ with tabs[0]:
     
     # Plot Historical EUR/USD Exchange Rate
     st.markdown("### Historical EUR/USD Exchange Rate")
-    hist_start_date = date.today() - relativedelta(years=1)
-    hist_end_date = date.today()
-    st.write(f"Plotting data from {hist_start_date.strftime('%Y-%m-%d')} to {hist_end_date.strftime('%Y-%m-%d')}")
-    hist_data = fetch_yfinance_prices("EURUSD=X",
-                                      hist_start_date.strftime("%Y-%m-%d"),
-                                      hist_end_date.strftime("%Y-%m-%d"))
+    st.write(f"Plotting data from {eurusd_hist_start} to {today_str}")
+    try:
+        hist_data = page_fetches.result("eurusd_history")
+    except Exception:
+        hist_data = None
     if hist_data is not None and not hist_data.empty:
         if "Close" in hist_data.columns:
             st.line_chart(hist_data["Close"])
@@ -649,3 +538,119 @@ with tabs[0]:
             st.error("Historical data does not contain 'Close' or 'Adj Close' column.")
     else:
         st.error("Failed to fetch historical EUR/USD data from Yahoo Finance.")
+
+
+##################################
+# Economic Dashboard Tab
+##################################
+with tabs[1]:
+    st.title("Economic Dashboard")
+    st.markdown("### Benchmark Interest Rates")
+    st.write("Below are some key interest rate metrics and trends:")
+
+    try:
+        # SOFR and EFFR from January 1, 1982 to today, requested at the top of the page
+        # (read from the local rate store; only new days are fetched from FRED)
+        sofr_series = page_fetches.result("sofr").dropna()
+        effr_series = page_fetches.result("effr").dropna()
+
+        # Show current rates with their as-of dates
+        current_sofr = sofr_series.iloc[-1]
+        current_effr = effr_series.iloc[-1]
+        sofr_date = sofr_series.index[-1].strftime("%Y-%m-%d")
+        effr_date = effr_series.index[-1].strftime("%Y-%m-%d")
+
+        st.metric(label=f"Current SOFR (as of {sofr_date})", value=f"{current_sofr:.4f}")
+        st.metric(label=f"Current Fed Funds (FFR) (as of {effr_date})", value=f"{current_effr:.4f}")
+
+        # --- Historical Trends ---
+        st.markdown("#### Historical Trends")
+        # Convert the series to DataFrames and rename EFFR to FFR
+        sofr_df = sofr_series.reset_index()
+        sofr_df.columns = ["Date", "SOFR"]
+        effr_df = effr_series.reset_index()
+        effr_df.columns = ["Date", "FFR"]
+
+        # Merge the two DataFrames on Date using an outer join and forward-fill missing values
+        merged_df = pd.merge(sofr_df, effr_df, on="Date", how="outer")
+        merged_df.sort_values("Date", inplace=True)
+        merged_df.ffill(inplace=True)
+        merged_df["Date"] = pd.to_datetime(merged_df["Date"])
+
+        # Let the user select which rates to plot
+        selected_rates = st.multiselect(
+            "Select Rates to Plot",
+            options=["SOFR", "FFR"],
+            default=["SOFR", "FFR"]
+        )
+
+        # Filter merged_df to only include the selected columns
+        if not selected_rates:
+            st.warning("Please select at least one rate to plot.")
+        else:
+            # Melt the DataFrame for Altair plotting using only the selected rates
+            filtered_df = merged_df.melt(
+                id_vars=["Date"],
+                value_vars=selected_rates,
+                var_name="Rate_Type",
+                value_name="Rate"
+            )
+
+            import altair as alt
+            chart = alt.Chart(filtered_df).mark_line().encode(
+                x=alt.X('Date:T', title='Date'),
+                y=alt.Y('Rate:Q', title='Rate'),
+                color=alt.Color('Rate_Type:N',
+                                scale=alt.Scale(domain=["SOFR", "FFR"], range=["red", "blue"])),
+                tooltip=['Date:T', 'Rate:Q', 'Rate_Type:N']
+            ).properties(
+                title='Historical Trends: SOFR and FFR'
+            ).interactive()  # Enable panning and zooming
+
+            st.altair_chart(chart, use_container_width=True)
+            
+            # Add comment about data source
+            st.caption("Source: Federal Reserve Bank of U.S.")
+
+    except Exception as e:
+        st.error(f"Error fetching benchmark rate data: {e}")
+with tabs[1]:
+    st.markdown("### U.S. Treasury Yield Curve Snapshot")
+    st.write("Below is the latest snapshot of the U.S. Treasury yield curve:")
+
+    try:
+        # Parsed Treasury curves for the current year (shared with the FX tab)
+        curve_history = page_fetches.result("curve_this_year")
+        if curve_history.empty:
+            st.warning("No yield curve data found.")
+        else:
+            latest_date, latest_row = curve_history.latest()
+
+            curve_rows = []
+            for col, (years, label) in TREASURY_TENORS.items():
+                yield_val = latest_row.get(col)
+                if pd.notnull(yield_val):
+                    curve_rows.append({
+                        "MaturityYears": years,
+                        "MaturityLabel": label,
+                        "Yield": yield_val
+                    })
+            curve_df = pd.DataFrame(curve_rows)
+            st.write(f"Yield Curve Snapshot for {latest_date.date()}")
+            import altair as alt
+            # Plot the yield curve
+            chart = (
+                alt.Chart(curve_df)
+                .mark_line(point=True)
+                .encode(
+                    x=alt.X("MaturityYears:Q", title="Maturity (Years)"),
+                    y=alt.Y("Yield:Q", title="Yield (%)"),
+                    tooltip=["MaturityLabel:N", "Yield:Q"]
+                )
+                .properties(title="U.S. Treasury Yield Curve")
+                .interactive()
+            )
+            st.altair_chart(chart, use_container_width=True)
+            st.caption("Source: U.S. Treasury.")
+    except Exception as e:
+        st.error(f"Could not fetch or parse yield curve data: {e}")
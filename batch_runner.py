@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Headless batch runner for TRS settlement and FX forward pricing.
+
+Reads a trade file (CSV, Parquet or Arrow IPC), runs the calculations without Streamlit
+and writes all results in one bulk write. Heavy modules are only imported
+once the job is known, so the runner starts quickly enough for cron.
+
+Usage:
+  python batch_runner.py trs trades.csv -o settlements.parquet --workers 4
+  python batch_runner.py fx forwards.parquet -o forwards.csv
+
+TRS files use the columns of portfolio.TRADE_COLUMNS, plus an optional ticker
+column: equity and commodity trades with a ticker may leave initial_price /
+final_price empty, and get them from the local price store in one batched
+download (price_store.fill_trade_prices). FX files use the
+arguments of fx_forward.price_fx_forwards (spot_rate, us_rate, euribor_rate,
+days, notional, notional_currency, basis_spread).
+"""
+# batch_runner.py
+
+import argparse
+import os
+import sys
+import time
+
+
+def read_table(path):
+    """Read a CSV, Parquet or Arrow IPC file into a DataFrame."""
+    from table_export import read_table as read_exported
+    return read_exported(path)
+
+
+def write_table(df, path, compression="zstd"):
+    """Write a DataFrame as CSV, Parquet or Arrow IPC, chosen by the file extension."""
+    from table_export import write_table as export_table
+    export_table(df, path, compression=compression)
+
+
+def _settle_partition(trades, use_index=False):
+    """Worker entry point: settle one partition of the book."""
+    from portfolio import settle_portfolio
+    from providers import RECORDINGS_DIR, LocalFileProvider
+    if RECORDINGS_DIR:
+        import functools
+        from helper_functions import fetch_interest_rates
+        rate_fetcher = functools.partial(fetch_interest_rates, provider=LocalFileProvider(RECORDINGS_DIR))
+        return settle_portfolio(trades, rate_fetcher=rate_fetcher)
+    if use_index:
+        from compounding_index import IndexStore
+        return settle_portfolio(trades, index_store=IndexStore())
+    return settle_portfolio(trades)
+
+
+def run_trs(trades, workers=1, use_index=False):
+    """
+    Settle a TRS book, optionally across worker processes (parallel.settle_parallel);
+    rows keep the input order. use_index reads daily-reset finance legs from the
+    precomputed compounding indexes. Missing prices of trades with a ticker
+    are filled from the price store first.
+    """
+    if "ticker" in trades.columns:
+        from price_store import fill_trade_prices
+        trades = fill_trade_prices(trades)
+    if workers <= 1:
+        return _settle_partition(trades, use_index)
+
+    from parallel import settle_parallel
+    from providers import RECORDINGS_DIR, LocalFileProvider
+    if RECORDINGS_DIR:
+        return settle_parallel(trades, workers=workers, source=LocalFileProvider(RECORDINGS_DIR).get_rates)
+    return settle_parallel(trades, workers=workers, use_index=use_index)
+
+
+# Smaller FX files are priced in-process: one vectorized call beats starting a pool
+FX_PARALLEL_MIN_ROWS = 2_000_000
+
+
+def run_fx(forwards, workers=1):
+    """Price a file of FX forwards in one vectorized call (or in chunks across workers)."""
+    import pandas as pd
+    from fx_forward import price_fx_forwards
+    pricer = price_fx_forwards
+    if workers > 1 and len(forwards) >= FX_PARALLEL_MIN_ROWS:
+        import functools
+        from parallel import price_fx_forwards_parallel
+        pricer = functools.partial(price_fx_forwards_parallel, workers=workers)
+
+    columns = {"notional": 1.0, "notional_currency": "USD", "basis_spread": 0.0}
+    args = {c: forwards[c].to_numpy() if c in forwards.columns else default for c, default in columns.items()}
+    priced = pricer(forwards["spot_rate"].to_numpy(dtype=float),
+                    forwards["us_rate"].to_numpy(dtype=float),
+                    forwards["euribor_rate"].to_numpy(dtype=float),
+                    forwards["days"].to_numpy(dtype=float),
+                    **args)
+    return pd.concat([forwards, pd.DataFrame(priced, index=forwards.index)], axis=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch TRS settlement and FX forward pricing.")
+    parser.add_argument("job", choices=["trs", "fx"], help="Calculation to run.")
+    parser.add_argument("input", help="Trade file (.csv, .parquet or .arrow).")
+    parser.add_argument("-o", "--output", required=True, help="Result file (.csv, .parquet or .arrow).")
+    parser.add_argument("--compression", default="zstd",
+                        help="Parquet/Arrow codec: zstd (default), lz4, snappy or none.")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count; FX files only from %d rows)." % FX_PARALLEL_MIN_ROWS)
+    parser.add_argument("--offline", action="store_true",
+                        help="Only use locally stored market data (no network).")
+    parser.add_argument("--recordings", metavar="DIR",
+                        help="Replay market data recorded by providers.RecordingProvider from DIR.")
+    parser.add_argument("--compounding-index", action="store_true",
+                        help="Read daily-reset finance legs from the precomputed compounding indexes "
+                             "(not with --recordings).")
+    parser.add_argument("--metrics", metavar="JSON",
+                        help="Time the fetch/transform/compound stages and write the stats to JSON.")
+    parser.add_argument("--profile", metavar="PROF",
+                        help="cProfile the run (this process only) and save the stats to PROF.")
+    args = parser.parse_args(argv)
+
+    if args.offline:
+        # Must be set before the rate store module is imported
+        os.environ["DERIVATIVES_CALC_OFFLINE"] = "1"
+    if args.recordings:
+        # Likewise read by providers at import time (and inherited by workers)
+        os.environ["DERIVATIVES_CALC_RECORDINGS"] = args.recordings
+    if args.metrics:
+        # Read by instrumentation at import time (and inherited by workers)
+        os.environ["DERIVATIVES_CALC_TRACE"] = "1"
+
+    import contextlib
+    from instrumentation import tracer
+    profiling = tracer.profile(args.profile) if args.profile else contextlib.nullcontext()
+
+    t0 = time.perf_counter()
+    with profiling:
+        with tracer.span("batch/read"):
+            trades = read_table(args.input)
+        with tracer.span(f"batch/{args.job}"):
+            if args.job == "trs":
+                results = run_trs(trades, workers=args.workers, use_index=args.compounding_index)
+            else:
+                results = run_fx(trades, workers=args.workers)
+        with tracer.span("batch/write"):
+            write_table(results, args.output,
+                        compression=None if args.compression.lower() == "none" else args.compression)
+    print(f"{args.job}: {len(results)} rows -> {args.output} in {time.perf_counter() - t0:.2f}s",
+          file=sys.stderr)
+    if args.metrics:
+        tracer.write_metrics(args.metrics)
+        print(f"stage timings -> {args.metrics}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Business-day calendars for rate look-back and lockout schedules.
+
+A BusinessCalendar holds, for every day of CALENDAR_FIRST_YEAR..CALENDAR_LAST_YEAR,
+a business-day flag and the cumulative count of business days before it. Every
+query is then an array lookup, vectorized over whole date arrays and O(1) per
+date however far apart the dates are:
+
+    business days in [start, end)  = cumulative[end] - cumulative[start]
+    n business days after a date   = business_dates[rank of the date + n]
+
+Calendars:
+  USGS   : US Government Securities (SIFMA recommended full closes), the
+           calendar of SOFR publication.
+  FED    : Federal Reserve (FRBNY) holidays, the calendar of EFFR publication.
+           Unlike USGS it is open on Good Friday, and holidays falling on a
+           Saturday are not observed on the Friday before.
+  TARGET : TARGET2 (Euro area), the calendar of EUR money-market rates.
+"""
+# calendars.py
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+CALENDAR_FIRST_YEAR = 1990
+CALENDAR_LAST_YEAR = 2099
+
+ROLL_CONVENTIONS = ("following", "preceding")
+
+# Unscheduled SIFMA full closes of the US bond market
+USGS_SPECIAL_CLOSES = ["2001-09-11", "2001-09-12", "2012-10-30", "2018-12-05"]
+
+
+class BusinessCalendar:
+    """
+    Precomputed business days of one holiday calendar.
+
+    Args:
+      name       : Calendar name (e.g. "USGS").
+      holidays   : Holiday dates (weekends are always non-business days).
+      first_year : First year covered.
+      last_year  : Last year covered.
+    """
+
+    def __init__(self, name, holidays, first_year=CALENDAR_FIRST_YEAR, last_year=CALENDAR_LAST_YEAR):
+        self.name = name
+        self.first_date = np.datetime64(f"{first_year}-01-01", "D")
+        self.end_date = np.datetime64(f"{last_year + 1}-01-01", "D")
+        days = np.arange(self.first_date, self.end_date)
+        holidays = np.asarray(holidays, dtype="datetime64[D]")
+        # One flag per calendar day, and the running count of business days before each day
+        self.business_day = np.is_busday(days, holidays=holidays)
+        self.cumulative = np.concatenate(([0], np.cumsum(self.business_day))).astype(np.int64)
+        self.business_dates = np.flatnonzero(self.business_day)
+
+    def __repr__(self):
+        return f"BusinessCalendar({self.name!r}, {self.first_date}..{self.end_date - 1})"
+
+    def _positions(self, dates):
+        days = pd.to_datetime(np.atleast_1d(dates)).to_numpy().astype("datetime64[D]")
+        positions = (days - self.first_date).astype(np.int64)
+        outside = (positions < 0) | (positions >= len(self.business_day))
+        if outside.any():
+            raise LookupError(f"{self.name} calendar covers {self.first_date} to {self.end_date - 1}; "
+                              f"got {days[outside].min()}")
+        return positions
+
+    def _dates(self, positions):
+        return self.first_date + positions
+
+    @property
+    def holidays(self):
+        """Weekday holidays of the calendar (datetime64[D])."""
+        weekday = np.is_busday(np.arange(self.first_date, self.end_date))
+        return self._dates(np.flatnonzero(weekday & ~self.business_day))
+
+    def is_business_day(self, dates):
+        """Boolean array: is each date a business day."""
+        return self.business_day[self._positions(dates)]
+
+    def business_days_between(self, start_dates, end_dates):
+        """Number of business days in [start, end) (minus those in [end, start) when end is earlier)."""
+        return self.cumulative[self._positions(end_dates)] - self.cumulative[self._positions(start_dates)]
+
+    def _ranks(self, positions, roll):
+        """Index into business_dates of each date after rolling it to a business day."""
+        if roll == "following":
+            return self.cumulative[positions]
+        if roll == "preceding":
+            return self.cumulative[positions + 1] - 1
+        raise ValueError(f"Unknown roll convention {roll!r} (use one of {ROLL_CONVENTIONS})")
+
+    def roll(self, dates, roll="following"):
+        """Each date, or the next ("following") / previous ("preceding") business day."""
+        return self.add_business_days(dates, 0, roll)
+
+    def add_business_days(self, dates, n, roll="following"):
+        """
+        Move dates by n business days (negative: backwards), as np.busday_offset:
+        a non-business date is first rolled to a business day, then moved.
+
+        Args:
+          dates : Dates (array-like).
+          n     : Business days to move, scalar or one per date.
+          roll  : "following" or "preceding", for non-business dates.
+
+        Returns:
+          np.ndarray of datetime64[D].
+        """
+        ranks = self._ranks(self._positions(dates), roll) + np.asarray(n, dtype=np.int64)
+        if (ranks < 0).any() or (ranks >= len(self.business_dates)).any():
+            raise LookupError(f"Business day offset runs outside the {self.name} calendar")
+        return self._dates(self.business_dates[ranks])
+
+
+def easter_sundays(years):
+    """Gregorian Easter Sunday of each year (anonymous Gregorian algorithm)."""
+    y = np.asarray(years, dtype=np.int64)
+    a, b, c = y % 19, y // 100, y % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    day = (h + l - 7 * m + 33 * month + 19) % 32
+    return np.array([np.datetime64(f"{yy:04d}-{mm:02d}-{dd:02d}", "D") for yy, mm, dd in zip(y, month, day)])
+
+
+def _fixed(years, month, day):
+    return np.array([np.datetime64(f"{y:04d}-{month:02d}-{day:02d}", "D") for y in years])
+
+
+def _nth_weekday(years, month, weekday, n):
+    """n-th given weekday ("Mon".."Sun") of a month; n = -1 for the last one."""
+    months = np.array([np.datetime64(f"{y:04d}-{month:02d}", "M") for y in years])
+    if n > 0:
+        return np.busday_offset(months.astype("datetime64[D]"), n - 1, roll="forward", weekmask=weekday)
+    return np.busday_offset((months + 1).astype("datetime64[D]"), n, roll="forward", weekmask=weekday)
+
+
+def _observed(dates, saturday=True):
+    """Weekend holidays move to Monday (Sunday) and, if saturday, to Friday (Saturday)."""
+    weekday = (dates.astype(np.int64) - 4) % 7          # 0 = Monday (1970-01-01 was a Thursday)
+    shift = np.where(weekday == 6, 1, 0)
+    if saturday:
+        shift = np.where(weekday == 5, -1, shift)
+    return dates + shift
+
+
+def usgs_holidays(first_year=CALENDAR_FIRST_YEAR, last_year=CALENDAR_LAST_YEAR):
+    """US Government Securities holidays (SIFMA full-close recommendations)."""
+    years = np.arange(first_year, last_year + 1)
+    juneteenth_years = years[years >= 2022]
+    easter = easter_sundays(years)
+    return np.sort(np.concatenate([
+        _observed(_fixed(years, 1, 1), saturday=False),     # New Year's Day (not moved to Dec 31)
+        _nth_weekday(years, 1, "Mon", 3),                  # Martin Luther King Jr. Day
+        _nth_weekday(years, 2, "Mon", 3),                  # Washington's Birthday
+        easter - 2,                                        # Good Friday
+        _nth_weekday(years, 5, "Mon", -1),                 # Memorial Day
+        _observed(_fixed(juneteenth_years, 6, 19)),        # Juneteenth
+        _observed(_fixed(years, 7, 4)),                    # Independence Day
+        _nth_weekday(years, 9, "Mon", 1),                  # Labor Day
+        _nth_weekday(years, 10, "Mon", 2),                 # Columbus Day
+        _observed(_fixed(years, 11, 11), saturday=False),  # Veterans Day
+        _nth_weekday(years, 11, "Thu", 4),                 # Thanksgiving
+        _observed(_fixed(years, 12, 25)),                  # Christmas
+        np.array(USGS_SPECIAL_CLOSES, dtype="datetime64[D]"),
+    ]))
+
+
+def fed_holidays(first_year=CALENDAR_FIRST_YEAR, last_year=CALENDAR_LAST_YEAR):
+    """Federal Reserve (FRBNY) holidays: Sunday holidays move to Monday, Saturday ones are not moved."""
+    years = np.arange(first_year, last_year + 1)
+    juneteenth_years = years[years >= 2022]
+    return np.sort(np.concatenate([
+        _observed(_fixed(years, 1, 1), saturday=False),     # New Year's Day
+        _nth_weekday(years, 1, "Mon", 3),                  # Martin Luther King Jr. Day
+        _nth_weekday(years, 2, "Mon", 3),                  # Washington's Birthday
+        _nth_weekday(years, 5, "Mon", -1),                 # Memorial Day
+        _observed(_fixed(juneteenth_years, 6, 19), saturday=False),  # Juneteenth
+        _observed(_fixed(years, 7, 4), saturday=False),    # Independence Day
+        _nth_weekday(years, 9, "Mon", 1),                  # Labor Day
+        _nth_weekday(years, 10, "Mon", 2),                 # Columbus Day
+        _observed(_fixed(years, 11, 11), saturday=False),  # Veterans Day
+        _nth_weekday(years, 11, "Thu", 4),                 # Thanksgiving
+        _observed(_fixed(years, 12, 25), saturday=False),  # Christmas
+    ]))
+
+
+def target_holidays(first_year=CALENDAR_FIRST_YEAR, last_year=CALENDAR_LAST_YEAR):
+    """TARGET2 closing days (the current rules, applied to every year, plus 31 December 1999-2001)."""
+    years = np.arange(first_year, last_year + 1)
+    easter = easter_sundays(years)
+    return np.sort(np.concatenate([
+        _fixed(years, 1, 1),
+        easter - 2,                                        # Good Friday
+        easter + 1,                                        # Easter Monday
+        _fixed(years, 5, 1),                               # Labour Day
+        _fixed(years, 12, 25),
+        _fixed(years, 12, 26),
+        np.array(["1999-12-31", "2000-12-31", "2001-12-31"], dtype="datetime64[D]"),
+    ]))
+
+
+CALENDAR_RULES = {
+    "USGS": usgs_holidays,
+    "FED": fed_holidays,
+    "TARGET": target_holidays,
+}
+
+CALENDAR_ALIASES = {
+    "US": "USGS",
+    "SIFMA": "USGS",
+    "US GOVERNMENT SECURITIES": "USGS",
+    "FRBNY": "FED",
+    "FEDERAL RESERVE": "FED",
+    "EUR": "TARGET",
+    "TARGET2": "TARGET",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _build_calendar(name):
+    return BusinessCalendar(name, CALENDAR_RULES[name]())
+
+
+def get_calendar(calendar):
+    """
+    BusinessCalendar for a name ("USGS", "FED", "TARGET" or an alias), built once per
+    process on first use. A BusinessCalendar is returned as is.
+    """
+    if isinstance(calendar, BusinessCalendar):
+        return calendar
+    name = str(calendar).upper()
+    name = CALENDAR_ALIASES.get(name, name)
+    if name not in CALENDAR_RULES:
+        raise ValueError(f"Unknown calendar {calendar!r} (use one of {sorted(CALENDAR_RULES)})")
+    return _build_calendar(name)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Zero curves and discount factors built from the Treasury and Euribor quotes.
+
+treasury_zero_curve bootstraps the parsed BC_* par yields of one curve date
+(bills as zero-coupon, longer tenors as semi-annual par bonds), and
+euribor_zero_curve turns the ECB Euribor fixings (simple Act/360 money-market
+rates) into zero rates. A ZeroCurve interpolates continuously compounded zero
+rates linearly or with a monotone cubic (Fritsch-Carlson, no overshoot between
+nodes), and every query takes whole arrays of dates: discount factors, and
+simple forward rates for broken-date periods that plug straight into
+fx_forward.price_fx_forwards.
+
+Building a curve is done once per as-of date: market_data.get_treasury_curve /
+get_euribor_curve cache them in the shared market data cache.
+"""
+# curves.py
+
+import numpy as np
+import pandas as pd
+
+from yield_curve import TREASURY_TENORS
+
+INTERPOLATION_METHODS = ("linear", "monotone_cubic")
+
+# Curve time is measured in Act/365 years from the as-of date.
+CURVE_YEAR_DAYS = 365.0
+
+# Euribor tenor -> (ECB data portal series, maturity in years)
+ECB_EURIBOR_SERIES = {
+    "1M": ("FM.M.U2.EUR.RT.MM.EURIBOR1MD_.HSTA", 1/12),
+    "3M": ("FM.M.U2.EUR.RT.MM.EURIBOR3MD_.HSTA", 3/12),
+    "6M": ("FM.M.U2.EUR.RT.MM.EURIBOR6MD_.HSTA", 6/12),
+    "1Y": ("FM.M.U2.EUR.RT.MM.EURIBOR1YD_.HSTA", 1.0),
+}
+
+
+class ZeroCurve:
+    """
+    Continuously compounded zero rates at node times, interpolated in between
+    and held flat beyond the first and last node.
+
+    Args:
+      as_of      : Curve date (time 0).
+      times      : Node times in years (Act/365), increasing.
+      zero_rates : Zero rates at the nodes (decimal, continuous compounding).
+      method     : "linear" or "monotone_cubic".
+      name       : Label for display (e.g. "UST").
+    """
+
+    def __init__(self, as_of, times, zero_rates, method="linear", name=""):
+        if method not in INTERPOLATION_METHODS:
+            raise ValueError(f"Unknown interpolation {method!r} (use one of {INTERPOLATION_METHODS})")
+        self.as_of = pd.Timestamp(as_of).normalize()
+        self.times = np.asarray(times, dtype=float)
+        self.nodes = np.asarray(zero_rates, dtype=float)
+        if len(self.times) == 0:
+            raise ValueError("A zero curve needs at least one node")
+        if np.any(np.diff(self.times) <= 0):
+            raise ValueError("Curve node times must be strictly increasing")
+        self.method = method
+        self.name = name
+        self._slopes = _monotone_slopes(self.times, self.nodes) if method == "monotone_cubic" else None
+
+    def __repr__(self):
+        return f"ZeroCurve({self.name!r}, as_of={self.as_of.date()}, nodes={len(self.times)}, method={self.method!r})"
+
+    def zero_rates(self, times):
+        """Interpolated zero rates (decimal, continuous) at times in years."""
+        t = np.clip(np.asarray(times, dtype=float), self.times[0], self.times[-1])
+        if self._slopes is None or len(self.times) < 2:
+            return np.interp(t, self.times, self.nodes)
+
+        # Cubic Hermite segment holding each t
+        i = np.clip(np.searchsorted(self.times, t, side="right") - 1, 0, len(self.times) - 2)
+        h = self.times[i + 1] - self.times[i]
+        s = (t - self.times[i]) / h
+        h00 = (1 + 2 * s) * (1 - s) ** 2
+        h10 = s * (1 - s) ** 2
+        h01 = s ** 2 * (3 - 2 * s)
+        h11 = s ** 2 * (s - 1)
+        return (h00 * self.nodes[i] + h10 * h * self._slopes[i]
+                + h01 * self.nodes[i + 1] + h11 * h * self._slopes[i + 1])
+
+    def year_fractions(self, dates):
+        """Act/365 years from the curve date to each date."""
+        days = (pd.to_datetime(np.atleast_1d(dates)).to_numpy().astype("datetime64[D]")
+                - np.datetime64(self.as_of.date(), "D")).astype(float)
+        return days / CURVE_YEAR_DAYS
+
+    def discount_factors(self, dates):
+        """Discount factors from each date back to the curve date (vectorized)."""
+        t = self.year_fractions(dates)
+        return np.exp(-self.zero_rates(t) * t)
+
+    def forward_rates(self, start_dates, end_dates, day_basis=360):
+        """
+        Simple (money-market) forward rates in percent over [start, end), as quoted
+        for a deposit of that period: (DF(start) / DF(end) - 1) * day_basis / days.
+        A start on the curve date gives the spot rate of a broken-date tenor.
+        """
+        start_df = self.discount_factors(start_dates)
+        end_df = self.discount_factors(end_dates)
+        days = (pd.to_datetime(np.atleast_1d(end_dates)).to_numpy().astype("datetime64[D]")
+                - pd.to_datetime(np.atleast_1d(start_dates)).to_numpy().astype("datetime64[D]")).astype(float)
+        if np.any(days <= 0):
+            raise ValueError("Forward periods must end after they start")
+        return (start_df / end_df - 1) * day_basis / days * 100
+
+    def to_frame(self, tenors_years=None):
+        """Zero rates (percent) and discount factors at the nodes (or at given times)."""
+        t = self.times if tenors_years is None else np.asarray(tenors_years, dtype=float)
+        z = self.zero_rates(t)
+        return pd.DataFrame({"Years": t, "Zero Rate (%)": z * 100, "Discount Factor": np.exp(-z * t)})
+
+
+def _monotone_slopes(x, y):
+    """Fritsch-Carlson node slopes: the cubic stays monotone wherever the data is."""
+    n = len(x)
+    if n < 2:
+        return np.zeros(n)
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    slopes = np.zeros(n)
+    slopes[0], slopes[-1] = delta[0], delta[-1]
+    if n > 2:
+        # Weighted harmonic mean of neighbouring secants; 0 at local extrema
+        w1 = 2 * h[1:] + h[:-1]
+        w2 = h[1:] + 2 * h[:-1]
+        same_sign = delta[:-1] * delta[1:] > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+        slopes[1:-1] = np.where(same_sign, harmonic, 0.0)
+    return slopes
+
+
+def treasury_zero_curve(as_of, par_yields, method="linear"):
+    """
+    Bootstrap a Treasury zero curve from one day's BC_* par yields.
+
+    Tenors up to 1Y are bills: their yields are bond-equivalent (semi-annual)
+    zero rates. Longer tenors are par bonds paying semi-annual coupons: par
+    yields are interpolated linearly to every half year and the discount
+    factors solved one coupon date at a time.
+
+    Args:
+      as_of      : Curve date.
+      par_yields : pd.Series of par yields in percent indexed by BC_* field
+                   (as YieldCurveHistory.as_of returns); NaN tenors are skipped.
+      method     : Interpolation of the resulting zero curve.
+    """
+    quotes = pd.Series(par_yields, dtype=float).reindex(list(TREASURY_TENORS)).dropna()
+    if quotes.empty:
+        raise LookupError(f"No Treasury par yields to build a curve as of {as_of}")
+    years = np.array([TREASURY_TENORS[field][0] for field in quotes.index])
+    yields = quotes.to_numpy() / 100
+
+    bills = years <= 1
+    times = list(years[bills])
+    zeros = list(2 * np.log1p(yields[bills] / 2))
+
+    if (~bills).any():
+        coupon_times = np.arange(0.5, years.max() + 1e-9, 0.5)
+        coupons = np.interp(coupon_times, years, yields)
+        discount = np.empty(len(coupon_times))
+        for i, (t, c) in enumerate(zip(coupon_times, coupons)):
+            if t <= 1:
+                discount[i] = (1 + c / 2) ** (-2 * t)
+            else:
+                discount[i] = (1 - c / 2 * discount[:i].sum()) / (1 + c / 2)
+        longer = coupon_times > max(times, default=0.0)
+        times.extend(coupon_times[longer])
+        zeros.extend(-np.log(discount[longer]) / coupon_times[longer])
+
+    return ZeroCurve(as_of, times, zeros, method=method, name="UST")
+
+
+def euribor_fixings_as_of(series_by_tenor, as_of):
+    """
+    Latest Euribor fixing (percent) of each tenor on or before as_of; tenors with no
+    fixing by then are left out.
+
+    Args:
+      series_by_tenor : dict tenor -> ECB data-only DataFrame (TIME_PERIOD, OBS_VALUE).
+    """
+    as_of = pd.Timestamp(as_of)
+    fixings = {}
+    for tenor, df in series_by_tenor.items():
+        if df is None or df.empty:
+            continue
+        periods = pd.to_datetime(df["TIME_PERIOD"])
+        known = df[periods <= as_of]
+        if known.empty:
+            # Not fixed yet on as_of: a later fixing would be a look-ahead
+            continue
+        row = known.sort_values("TIME_PERIOD").iloc[-1]
+        fixings[tenor] = float(row["OBS_VALUE"])
+    return fixings
+
+
+def euribor_zero_curve(as_of, fixings, method="linear"):
+    """
+    Zero curve from Euribor fixings: each tenor is a simple Act/360 deposit, so
+    DF = 1 / (1 + rate * days / 360).
+
+    Args:
+      as_of    : Curve date.
+      fixings  : dict tenor ("1M", "3M", "6M", "1Y") -> rate in percent.
+      method   : Interpolation of the zero curve.
+    """
+    tenors = [tenor for tenor in ECB_EURIBOR_SERIES if tenor in fixings and pd.notnull(fixings[tenor])]
+    if not tenors:
+        raise LookupError(f"No Euribor fixings to build a curve as of {as_of}")
+    years = np.array([ECB_EURIBOR_SERIES[tenor][1] for tenor in tenors])
+    rates = np.array([fixings[tenor] for tenor in tenors]) / 100
+    discount = 1 / (1 + rates * years * CURVE_YEAR_DAYS / 360)
+    return ZeroCurve(as_of, years, -np.log(discount) / years, method=method, name="EURIBOR")
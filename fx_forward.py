@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+FX forward pricing (EUR/USD premium/discount method used by the FX tab).
+"""
+# fx_forward.py
+
+import numpy as np
+
+
+def premium_discount_forward(spot_rate, us_rate, euribor_rate, days, basis_spread=0.0, day_basis=360):
+    """
+    Forward rate by the premium/discount method:
+
+        forward = spot + spot * (euribor - us_rate) / 100 * days / day_basis + basis_spread
+
+    Rates are in percent (as published by the Treasury and the ECB). Every
+    argument may be a scalar or a NumPy array; arrays are broadcast together.
+    """
+    spot_rate = np.asarray(spot_rate, dtype=float)
+    return spot_rate + forward_premium(spot_rate, us_rate, euribor_rate, days, day_basis) + basis_spread
+
+
+def forward_premium(spot_rate, us_rate, euribor_rate, days, day_basis=360):
+    """Premium (discount if negative) of the forward over spot, before any basis spread."""
+    interest_diff = (np.asarray(euribor_rate, dtype=float) - np.asarray(us_rate, dtype=float)) / 100
+    return np.asarray(spot_rate, dtype=float) * (interest_diff * (np.asarray(days, dtype=float) / day_basis))
+
+
+def price_fx_forwards(spot_rate, us_rate, euribor_rate, days, notional=1.0, notional_currency="USD",
+                      basis_spread=0.0, day_basis=360):
+    """
+    Price EUR/USD forwards and their notional equivalents in one vectorized call.
+
+    Every argument may be a scalar or a NumPy array (arrays are broadcast together),
+    so a whole forward curve or a book of client forwards is priced at once.
+
+    Args:
+      spot_rate         : EUR/USD spot.
+      us_rate           : USD rate for the tenor, in percent (e.g. Treasury par rate).
+      euribor_rate      : EUR rate for the tenor, in percent (Euribor).
+      days              : Days to maturity.
+      notional          : Notional amount(s).
+      notional_currency : "USD" or "EUR" (scalar or array) - the currency of notional.
+      basis_spread      : Added to the forward (in rate points).
+      day_basis         : Days per year (360).
+
+    Returns:
+      dict of floats (all-scalar inputs) or arrays:
+        - forward_rate:  Premium/discount forward.
+        - premium:       spot * (euribor - us_rate) / 100 * days / day_basis.
+        - spot_usd, forward_usd: USD amounts of the notional at spot and forward.
+        - spot_eur, forward_eur: EUR amounts of the notional at spot and forward.
+    """
+    spot_rate = np.asarray(spot_rate, dtype=float)
+    premium = forward_premium(spot_rate, us_rate, euribor_rate, days, day_basis)
+    forward_rate = spot_rate + premium + basis_spread
+
+    notional = np.asarray(notional, dtype=float)
+    is_usd = np.asarray(notional_currency) == "USD"
+    result = {
+        "forward_rate": forward_rate,
+        "premium": premium,
+        "spot_usd": np.where(is_usd, notional, notional * spot_rate),
+        "forward_usd": np.where(is_usd, notional, notional * forward_rate),
+        "spot_eur": np.where(is_usd, notional / spot_rate, notional),
+        "forward_eur": np.where(is_usd, notional / forward_rate, notional),
+    }
+    shape = np.broadcast_shapes(*(np.shape(v) for v in result.values()))
+    if shape == ():
+        return {key: float(value) for key, value in result.items()}
+    return {key: np.broadcast_to(value, shape) for key, value in result.items()}
+
+
+def price_fx_forwards_on_curves(spot_rate, start_dates, maturity_dates, usd_curve, eur_curve,
+                                notional=1.0, notional_currency="USD", basis_spread=0.0, day_basis=360):
+    """
+    Price broken-date EUR/USD forwards off zero curves (curves.ZeroCurve).
+
+    The USD and EUR rates of every [start, maturity) period are the curves'
+    simple forward rates over exactly that period, so any dates can be priced,
+    not only the quoted tenors. Pricing is then price_fx_forwards; the result
+    also holds the rates used and the discounted value of the forward.
+
+    Args:
+      spot_rate      : EUR/USD spot.
+      start_dates    : Forward start dates (scalar or array of dates).
+      maturity_dates : Maturity dates, after the start dates.
+      usd_curve      : USD curve (e.g. market_data.get_treasury_curve).
+      eur_curve      : EUR curve (e.g. market_data.get_euribor_curve).
+      (notional, notional_currency, basis_spread, day_basis as price_fx_forwards)
+
+    Returns:
+      dict of arrays: the keys of price_fx_forwards plus
+        - days, us_rate, euribor_rate: Period length and rates (percent) used.
+        - usd_discount_factor, eur_discount_factor: Discount factors to maturity.
+        - pv_usd, pv_eur: (forward - spot) amounts in USD / EUR, discounted to the curve date.
+    """
+    start_dates = np.atleast_1d(np.asarray(start_dates, dtype="datetime64[D]"))
+    maturity_dates = np.atleast_1d(np.asarray(maturity_dates, dtype="datetime64[D]"))
+    days = (maturity_dates - start_dates).astype(float)
+    us_rate = usd_curve.forward_rates(start_dates, maturity_dates, day_basis)
+    euribor_rate = eur_curve.forward_rates(start_dates, maturity_dates, day_basis)
+
+    result = price_fx_forwards(spot_rate, us_rate, euribor_rate, days, notional=notional,
+                               notional_currency=notional_currency, basis_spread=basis_spread,
+                               day_basis=day_basis)
+    usd_discount_factor = usd_curve.discount_factors(maturity_dates)
+    eur_discount_factor = eur_curve.discount_factors(maturity_dates)
+    result.update(
+        days=days,
+        us_rate=us_rate,
+        euribor_rate=euribor_rate,
+        usd_discount_factor=usd_discount_factor,
+        eur_discount_factor=eur_discount_factor,
+        pv_usd=usd_discount_factor * (result["forward_usd"] - result["spot_usd"]),
+        pv_eur=eur_discount_factor * (result["forward_eur"] - result["spot_eur"]),
+    )
+    return result
@@ -10,14 +10,70 @@ Created on Fri Mar 14 15:56:56 2025
 
 # helper_functions.py
 
+import functools
+import os
+
+import numpy as np
 import pandas as pd
 from datetime import timedelta, datetime
-from fredapi import Fred
-import yfinance as yf
 
+from calendars import get_calendar
+from instrumentation import tracer
+from providers import REQUEST_TIMEOUT
+from rate_store import RateStore
+
+# Your personal FRED API key (override with the FRED_API_KEY environment variable)
+FRED_API_KEY = os.environ.get("FRED_API_KEY", '983188cadf286e4e553982bf2b9b4a1c')
+
+
+@functools.lru_cache(maxsize=None)
+def get_fred_client(api_key=FRED_API_KEY, timeout=REQUEST_TIMEOUT):
+    """
+    The Fred client, created on first use. fredapi is only imported here, so pure
+    calculation modules never pay for it. Its requests give up after timeout
+    seconds (fredapi sets none) instead of blocking a fetch thread forever.
+    """
+    import xml.etree.ElementTree as ET
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+
+    from fredapi import Fred
+
+    class TimeoutFred(Fred):
+        def _Fred__fetch_data(self, url):
+            # fredapi's own request, plus the timeout it does not expose
+            try:
+                with urlopen(url + "&api_key=" + self.api_key, timeout=timeout) as response:
+                    return ET.fromstring(response.read())
+            except HTTPError as exc:
+                raise ValueError(ET.fromstring(exc.read()).get("message"))
+
+    return TimeoutFred(api_key=api_key)
+
+
+def fetch_fred_series(series_id, start_date, end_date, client=None):
+    """
+    Download one FRED series between start_date and end_date (rates in percent).
+    Returns an empty Series when FRED has no observations in the window; any
+    other FRED error (bad API key, rate limit, ...) is raised, so the rate store
+    never records a failed window as covered.
+
+    Pass client= to use a specific Fred client instead of get_fred_client().
+    """
+    client = client if client is not None else get_fred_client()
+    tracer.count("requests/fred")
+    try:
+        with tracer.span("fetch/fred"):
+            return client.get_series(series_id, observation_start=start_date, observation_end=end_date)
+    except ValueError as exc:
+        # fredapi raises ValueError both for an empty window and for HTTP errors
+        if str(exc).startswith("No data exists"):
+            return pd.Series(dtype=float)
+        raise
 
-# Initialize Fred with your personal API key
-fred = Fred(api_key='983188cadf286e4e553982bf2b9b4a1c')
+
+# Local store every reader goes through; FRED is only hit (and its client built) to top it up.
+rate_store = RateStore(fetcher=fetch_fred_series)
 
 def compute_reset_date(dt, reset_frequency="1D"):
     """
@@ -53,15 +109,57 @@ def compute_reset_date(dt, reset_frequency="1D"):
         # Default fallback: return the date itself
         return dt
 
-def fetch_interest_rates(start_date, end_date, index="SOFR", look_back_days=0, reset_frequency="1D"):
+
+# Months per reset period for compute_reset_dates (month starts are aligned to January)
+RESET_PERIOD_MONTHS = {"1M": 1, "3M": 3, "6M": 6}
+
+def compute_reset_dates(dates, reset_frequency="1D"):
+    """
+    Vectorized compute_reset_date over a DatetimeIndex (or array of dates).
+
+    Month, quarter and half-year starts are found with integer arithmetic on
+    months since 1970-01 (a January), so no Python-level loop is involved.
+    """
+    dates = pd.DatetimeIndex(dates)
+    step = RESET_PERIOD_MONTHS.get(reset_frequency)
+    if step is None:
+        # "1D" and unknown frequencies: the date itself
+        return dates
+
+    months = dates.to_numpy().astype('datetime64[M]').astype(np.int64)
+    period_start = (months - months % step).astype('datetime64[M]')
+    return pd.DatetimeIndex(period_start.astype('datetime64[ns]'))
+
+def reset_period_starts(start_date, end_date, reset_frequency="1D"):
+    """
+    The distinct compute_reset_dates of the calendar days start_date..end_date, in
+    order, generated directly: one date per reset period instead of one per day.
     """
-    Fetch daily interest rates from FRED for either SOFR or Effective Fed Funds (EFFR)
-    and return a DataFrame with the following columns:
+    start_date = pd.to_datetime(start_date)
+    end_date = pd.to_datetime(end_date)
+    step = RESET_PERIOD_MONTHS.get(reset_frequency)
+    if step is None or start_date > end_date:
+        return pd.date_range(start=start_date, end=end_date, freq='D')
+    first = compute_reset_dates([start_date], reset_frequency)[0]
+    return pd.date_range(start=first, end=end_date, freq=f"{step}MS")
+
+def fetch_interest_rates(start_date, end_date, index="SOFR", look_back_days=0, reset_frequency="1D",
+                         store=None, provider=None, calendar=None, lockout_days=0, per_reset=False):
+    """
+    Fetch daily interest rates for either SOFR or Effective Fed Funds (EFFR) from the
+    local rate store (topped up from FRED when needed) and return a DataFrame with the following columns:
       - Reset Date: The reset date computed from the reset frequency.
       - Rate Date: (Reset Date - look_back_days) which is the date from which the rate is applied.
       - Rate: The interest rate in decimal form. If no rate is available on the computed Rate Date,
               the most recent posted rate is used or clamped to the earliest data point.
+
+    Pass store= to read from a specific RateStore (e.g. an offline one seeded from file),
+    or provider= to read the series straight from a providers.MarketDataProvider
+    (e.g. a LocalFileProvider replaying recorded files) instead of the store.
+    calendar= and lockout_days= give business-day look-back and lockout (see build_rate_table).
+    per_reset=True returns one row per reset period instead of one per calendar day.
     """
+    store = store if store is not None else rate_store
 
     if index.upper() == "SOFR":
         series_id = "SOFR"
@@ -73,67 +171,143 @@ def fetch_interest_rates(start_date, end_date, index="SOFR", look_back_days=0, r
     end_date = pd.to_datetime(end_date)
     start_date_adjusted = start_date - pd.Timedelta(days=180)
 
-    # 1) Pull data from FRED
-    data_series = fred.get_series(
-        series_id,
-        observation_start=start_date_adjusted,
-        observation_end=end_date
-    )
+    # 1) Read the data from the provider, or from the local store (FRED is only called for missing days)
+    with tracer.span("fetch"):
+        if provider is not None:
+            data_series = provider.get_rates(series_id, start_date_adjusted, end_date)
+        else:
+            data_series = store.get_series(series_id, start_date_adjusted, end_date)
     # data_series is a Pandas Series indexed by date, with the rate in PERCENT form
 
+    with tracer.span("transform"):
+        return build_rate_table(data_series, start_date, end_date,
+                                look_back_days=look_back_days,
+                                reset_frequency=reset_frequency,
+                                history_start=start_date_adjusted,
+                                calendar=calendar,
+                                lockout_days=lockout_days,
+                                per_reset=per_reset)
+
+
+def build_rate_table(data_series, start_date, end_date, look_back_days=0, reset_frequency="1D",
+                     history_start=None, calendar=None, lockout_days=0, per_reset=False):
+    """
+    Turn a raw rate series (percent, indexed by observation date) into the
+    Reset Date / Rate Date / Clamped Rate Date / Rate table of fetch_interest_rates.
+
+    Every step is vectorized: reset dates come from month arithmetic on
+    datetime64 arrays (compute_reset_dates) and all rates are looked up with a
+    single searchsorted, which gives the same result as Series.asof per row.
+
+    Args:
+      data_series     : pd.Series of rates in percent, indexed by date.
+      start_date      : First calendar day of the table.
+      end_date        : Last calendar day of the table.
+      look_back_days  : Rate Date = Reset Date - look_back_days (calendar days, or
+                        business days of `calendar`).
+      reset_frequency : "1D", "1M", "3M" or "6M".
+      history_start   : First day of the daily grid the series is forward-filled on
+                        (and the earliest date Rate Dates are clamped to).
+                        Defaults to start_date - 180 days, as in fetch_interest_rates.
+      calendar        : Optional calendars.BusinessCalendar or name ("USGS", "FED", "TARGET").
+                        The look-back then counts business days, from the Reset Date or,
+                        on a non-business day, from the business day before it (whose
+                        rate applies over the weekend or holiday, as in the ISDA SOFR
+                        conventions).
+      lockout_days    : Rate lockout: the last lockout_days business days (calendar days
+                        without a calendar) before end_date reuse the Rate Date of the
+                        first locked-out day.
+      per_reset       : If True, one row per reset period (reset_period_starts) instead
+                        of one per calendar day, plus a "Calendar Days" column with the
+                        number of days of start_date..end_date in each period. Every
+                        day of a period has the same Reset Date, Rate Date and Rate, so
+                        repeating each row "Calendar Days" times gives the daily table.
+    """
+    start_date = pd.to_datetime(start_date)
+    end_date = pd.to_datetime(end_date)
+    if history_start is None:
+        history_start = start_date - pd.Timedelta(days=180)
+
     # 2) Reindex to daily frequency and forward-fill missing days
-    all_days = pd.date_range(start=start_date_adjusted, end=end_date, freq='D')
+    all_days = pd.date_range(start=history_start, end=end_date, freq='D')
     data_series = data_series.reindex(all_days, method='ffill')
 
     # 3) Convert from percent to decimal
     data_series = data_series / 100.0
 
-    # 4) Build DataFrame for reset dates from original start_date..end_date
-    reset_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-    df = pd.DataFrame({"Temp Reset Date": reset_dates})
-    
-    # 4a) Compute the actual Reset Date using your reset_frequency logic
-    df["Reset Date"] = df["Temp Reset Date"].apply(lambda dt: compute_reset_date(dt, reset_frequency))
-    
-    # 5) Compute Rate Date as (Reset Date - look_back_days)
-    df["Rate Date"] = df["Reset Date"] - pd.Timedelta(days=look_back_days)
+    # 4) Compute the Reset Date of every calendar day from start_date..end_date (or of every reset period)
+    if per_reset:
+        reset_dates = reset_period_starts(start_date, end_date, reset_frequency)
+    else:
+        reset_dates = compute_reset_dates(pd.date_range(start=start_date, end=end_date, freq='D'),
+                                          reset_frequency)
+
+    # 5) Compute Rate Date as (Reset Date - look_back_days), in business days with a calendar
+    if calendar is None:
+        rate_dates = reset_dates - pd.Timedelta(days=look_back_days)
+        if lockout_days:
+            cutoff = end_date - pd.Timedelta(days=lockout_days)
+            rate_dates = rate_dates.where(reset_dates <= cutoff, cutoff - pd.Timedelta(days=look_back_days))
+    else:
+        calendar = get_calendar(calendar)
+        rate_dates = pd.DatetimeIndex(
+            calendar.add_business_days(reset_dates, -look_back_days, roll="preceding").astype("datetime64[ns]"))
+        if lockout_days:
+            cutoff = pd.Timestamp(calendar.add_business_days(end_date, -lockout_days, roll="preceding")[0])
+            locked_rate_date = pd.Timestamp(calendar.add_business_days(cutoff, -look_back_days)[0])
+            rate_dates = rate_dates.where(reset_dates <= cutoff, locked_rate_date)
 
     # 6) Clamp any Rate Date that is earlier than the earliest date in data_series
     earliest_date_in_series = data_series.index.min()
-    
-    def clamp_date(rd):
-        # If the Rate Date is before the earliest data date, clamp it
-        if rd < earliest_date_in_series:
-            return earliest_date_in_series
-        return rd
-    
-    df["Clamped Rate Date"] = df["Rate Date"].apply(clamp_date)
+    clamped_rate_dates = rate_dates.where(rate_dates >= earliest_date_in_series, earliest_date_in_series)
 
-    # 7) For each Clamped Rate Date, use asof to get the most recent valid observation
-    df["Rate"] = df["Clamped Rate Date"].apply(lambda rd: data_series.asof(rd))
+    # 7) Most recent valid observation at or before each Clamped Rate Date (as Series.asof)
+    valid = data_series.dropna()
+    positions = np.searchsorted(valid.index.to_numpy(), clamped_rate_dates.to_numpy(), side='right') - 1
+    found = positions >= 0
+    rates = np.full(len(positions), np.nan)
+    rates[found] = valid.to_numpy()[positions[found]]
 
-    # Rearrange columns
-    df = df[["Reset Date", "Rate Date", "Clamped Rate Date", "Rate"]]
-    return df
+    table = pd.DataFrame({
+        "Reset Date": reset_dates,
+        "Rate Date": rate_dates,
+        "Clamped Rate Date": clamped_rate_dates,
+        "Rate": rates,
+    })
+    if per_reset:
+        # Days of start_date..end_date in each period (the first period starts on or before start_date)
+        period_days = reset_dates.to_numpy().astype('datetime64[D]')
+        bounds = np.append(np.maximum(period_days, np.datetime64(start_date.date(), 'D')),
+                           np.datetime64(end_date.date(), 'D') + 1)
+        table["Calendar Days"] = np.diff(bounds).astype(np.int64) if len(period_days) else np.zeros(0, np.int64)
+    return table
 
 
-def fetch_yfinance_prices(ticker, start_date, end_date):
+def fetch_yfinance_prices(ticker, start_date, end_date, downloader=None, timeout=REQUEST_TIMEOUT):
     """
     Fetch historical price data for a given ticker (single-name equity or commodity index)
     using the yfinance API.
     
     Args:
-      ticker (str): The ticker symbol (e.g. "AAPL" for equities or "GLD" for a commodity index).
+      ticker (str or list): The ticker symbol (e.g. "AAPL" for equities or "GLD" for a commodity index),
+                            or a list of tickers for one batched download ((Price, Ticker) columns).
       start_date (str or datetime): Start date for historical data (YYYY-MM-DD).
       end_date (str or datetime): End date for historical data (YYYY-MM-DD).
-      interval (str): Data interval (default is "1d"). Other options: "1wk", "1mo", etc.
+      downloader (callable): Optional replacement for yfinance.download (same signature).
+      timeout (float): Request timeout in seconds of the default yfinance.download.
       
     Returns:
       pd.DataFrame: DataFrame containing historical price data with columns such as
                     Open, High, Low, Close, Adj Close, and Volume.
     """
+    if downloader is None:
+        # yfinance is only imported when prices are actually requested
+        import yfinance as yf
+        downloader = functools.partial(yf.download, timeout=timeout)
+    tracer.count("requests/yahoo")
     try:
-        df = yf.download(ticker, start=start_date, end=end_date)
+        with tracer.span("fetch/yahoo"):
+            df = downloader(ticker, start=start_date, end=end_date)
         return df
     except Exception as e:
         print(f"Error fetching data for ticker {ticker}: {e}")
@@ -158,6 +332,21 @@ def day_count_fraction(start_d, end_d, day_count='Act', year_basis=360):
     # Default fallback
     return delta_days / float(year_basis)
 
+
+def day_count_fractions(delta_days, day_count='Act', year_basis=360):
+    """
+    Vectorized day_count_fraction: same conventions, but takes the day counts
+    directly as an integer NumPy array and returns an array of year fractions.
+    """
+    delta_days = np.asarray(delta_days)
+
+    if day_count == '30':
+        # Simplified 30/360 approach
+        return delta_days / 360.0
+
+    # Actual/360, Actual/365 and the default fallback
+    return delta_days / float(year_basis)
+
 # -------------------------------
 # Code to test the function
 # -----""
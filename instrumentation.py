@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight timing instrumentation for the calculation hot paths.
+
+Code marks its stages with `with tracer.span("fetch"):` (fetch, transform,
+compound, table, render). When tracing is disabled, which is the default, span()
+returns a shared no-op context manager, so the only cost is one function call.
+When enabled, every span adds to per-stage call counts and total/min/max
+wall-clock times. Plain counters work the same way. The collected stats can be
+logged, saved as a JSON metrics file or shown in the app's debug panel.
+tracer.profile() optionally captures a cProfile of any block.
+
+Enable with DERIVATIVES_CALC_TRACE=1 or tracer.enable().
+"""
+# instrumentation.py
+
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+
+logger = logging.getLogger("derivatives_calc.timing")
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """
+    Process-wide span timings and counters.
+
+    Args:
+      enabled : Record spans and counters (False: every call is a no-op).
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._spans = {}        # name -> [calls, total_s, min_s, max_s]
+        self._counters = {}     # name -> count
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name):
+        """Context manager timing one execution of the named stage."""
+        if not self.enabled:
+            return _NO_SPAN
+        return self._timed_span(name)
+
+    @contextlib.contextmanager
+    def _timed_span(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name, seconds):
+        """Add one timing to a stage (what span() does on exit)."""
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                self._spans[name] = [1, seconds, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = min(stats[2], seconds)
+                stats[3] = max(stats[3], seconds)
+
+    def count(self, name, n=1):
+        """Increment a call counter (e.g. upstream requests, rows compounded)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def timed(self, name=None):
+        """Decorator: run the whole function inside span(name or its qualified name)."""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextlib.contextmanager
+    def profile(self, path=None, top=25):
+        """
+        cProfile the enclosed block (regardless of enabled). The yielded dict gets a
+        "stats" entry with the top functions by cumulative time as text; with path,
+        the raw profile is also saved for snakeviz / pstats.
+        """
+        result = {}
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            if path:
+                profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+            result["stats"] = out.getvalue()
+
+    def snapshot(self):
+        """{"spans": {name: {calls, total_ms, mean_ms, min_ms, max_ms}}, "counters": {...}}."""
+        with self._lock:
+            spans = {
+                name: {
+                    "calls": calls,
+                    "total_ms": total * 1e3,
+                    "mean_ms": total / calls * 1e3,
+                    "min_ms": lo * 1e3,
+                    "max_ms": hi * 1e3,
+                }
+                for name, (calls, total, lo, hi) in sorted(self._spans.items())
+            }
+            return {"spans": spans, "counters": dict(sorted(self._counters.items()))}
+
+    def merge(self, snapshot):
+        """Add the stats of another tracer's snapshot (e.g. from a worker process)."""
+        with self._lock:
+            for name, s in snapshot["spans"].items():
+                stats = self._spans.setdefault(name, [0, 0.0, float("inf"), 0.0])
+                stats[0] += s["calls"]
+                stats[1] += s["total_ms"] / 1e3
+                stats[2] = min(stats[2], s["min_ms"] / 1e3)
+                stats[3] = max(stats[3], s["max_ms"] / 1e3)
+            for name, value in snapshot["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def log_summary(self, level=logging.INFO):
+        """Write one log line per stage and counter."""
+        snap = self.snapshot()
+        for name, s in snap["spans"].items():
+            logger.log(level, "%-28s calls=%-6d total=%10.3fms mean=%9.3fms max=%9.3fms",
+                       name, s["calls"], s["total_ms"], s["mean_ms"], s["max_ms"])
+        for name, value in snap["counters"].items():
+            logger.log(level, "%-28s count=%d", name, value)
+
+    def write_metrics(self, path):
+        """Save the snapshot as JSON (e.g. for a batch run's metrics file)."""
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+# Shared by every module (and every Streamlit session) in this process.
+tracer = Tracer(enabled=os.environ.get("DERIVATIVES_CALC_TRACE", "0") == "1")
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide TTL cache for remote market data.
+
+Streamlit reruns app.py on every widget change and serves every session from
+the same Python process, so one module-level cache is shared by all users.
+Each source has its own time-to-live, the cache holds at most max_entries
+values (least recently used are evicted first) and keeps hit/miss counters.
+"""
+# market_cache.py
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as LoadTimeout
+
+# Time-to-live per data source, in seconds.
+SOURCE_TTL = {
+    "spot": 15 * 60,                # Yahoo Finance prices: intraday
+    "fred": 24 * 60 * 60,           # FRED benchmark rates: daily
+    "treasury": 24 * 60 * 60,       # Treasury yield curve: daily
+    "euribor": 30 * 24 * 60 * 60,   # ECB Euribor (monthly series)
+    "curve": 24 * 60 * 60,          # Zero curves built from Treasury / Euribor quotes
+}
+
+DEFAULT_MAX_ENTRIES = 256
+
+# Seconds a caller waits for another caller's load of the same key.
+DEFAULT_WAIT_TIMEOUT = 60
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a per-source TTL.
+
+    Args:
+      max_entries  : Maximum number of cached values across all sources.
+      wait_timeout : Seconds a caller waits for a load already running for the
+                     same key before raising TimeoutError.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, wait_timeout=DEFAULT_WAIT_TIMEOUT):
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()   # (source, key) -> (expires_at, value)
+        self._stats = {}                # source -> {"hits", "misses", "evictions"}
+        self._loading = {}              # (source, key) -> Future of a load in progress
+        self._lock = threading.Lock()
+
+    def get_or_load(self, source, key, loader, ttl=None):
+        """
+        Return the cached value for (source, key), or call loader() and cache its
+        result for ttl seconds (default SOURCE_TTL[source]). None results and
+        exceptions are not cached, so failed downloads are retried next time.
+
+        Concurrent callers asking for the same missing key share one load: the
+        first one calls loader(), the others wait for its result (at most
+        wait_timeout seconds, so a hung download cannot pin their threads).
+        """
+        ttl = SOURCE_TTL.get(source, 60 * 60) if ttl is None else ttl
+        cache_key = (source, key)
+        now = time.monotonic()
+
+        with self._lock:
+            stats = self._stats.setdefault(source, {"hits": 0, "misses": 0, "evictions": 0})
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                stats["hits"] += 1
+                return _copy(entry[1])
+            pending = self._loading.get(cache_key)
+            if pending is None:
+                stats["misses"] += 1
+                pending = self._loading[cache_key] = Future()
+                owner = True
+            else:
+                stats["hits"] += 1
+                owner = False
+
+        if not owner:
+            try:
+                return _copy(pending.result(timeout=self.wait_timeout))
+            except LoadTimeout:
+                raise TimeoutError(f"{source} load of {key!r} still running after {self.wait_timeout}s") from None
+
+        # Load outside the lock so slow downloads don't block other sources
+        try:
+            value = loader()
+        except BaseException as exc:
+            with self._lock:
+                del self._loading[cache_key]
+            pending.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._loading[cache_key]
+            if value is not None:
+                self._entries[cache_key] = (time.monotonic() + ttl, value)
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    (evicted_source, _), _ = self._entries.popitem(last=False)
+                    self._stats[evicted_source]["evictions"] += 1
+        pending.set_result(value)
+        return _copy(value)
+
+    def stats(self):
+        """Hit/miss/eviction counters and current entry count per source."""
+        with self._lock:
+            sizes = {}
+            for source, _ in self._entries:
+                sizes[source] = sizes.get(source, 0) + 1
+            return {
+                source: dict(counts, entries=sizes.get(source, 0), ttl_seconds=SOURCE_TTL.get(source))
+                for source, counts in self._stats.items()
+            }
+
+    def clear(self, source=None):
+        """Drop every entry (or only those of one source)."""
+        with self._lock:
+            if source is None:
+                self._entries.clear()
+            else:
+                for cache_key in [k for k in self._entries if k[0] == source]:
+                    del self._entries[cache_key]
+
+
+def _copy(value):
+    """Hand out copies of DataFrames/Series so callers can't mutate the cached value."""
+    return value.copy() if hasattr(value, "copy") else value
+
+
+# Shared by every caller (and every Streamlit session) in this process.
+market_cache = TTLCache()
+
+
+def cached(source, ttl=None, cache=None):
+    """
+    Decorator caching a fetch function in the shared TTL cache under `source`.
+    Arguments must be hashable (pass dates as strings). The wrapper's `source`
+    attribute names the data source (used for per-source fetch timeouts).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+            return (cache or market_cache).get_or_load(
+                source, key, lambda: func(*args, **kwargs), ttl=ttl
+            )
+        wrapper.source = source
+        return wrapper
+    return decorator
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Cached access to every remote market data source used by the app.
+
+All functions go through the shared TTL cache in market_cache, so widget
+changes and concurrent sessions reuse recent downloads instead of hitting
+FRED, the U.S. Treasury, the ECB and Yahoo Finance again. The sources
+themselves come from providers.default_provider(): live by default, or
+recorded files when DERIVATIVES_CALC_RECORDINGS is set.
+
+get_first_last_prices reads trade prices from the local price store
+(price_store.PriceStore), which downloads each ticker's history once.
+
+FetchBatch issues a page's independent requests at once on a shared thread
+pool, so the page waits about as long as its slowest request. The live sources
+themselves give up after providers.REQUEST_TIMEOUT, so a hung download never
+holds a pool thread for longer than that.
+"""
+# market_data.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FetchTimeout
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from curves import ECB_EURIBOR_SERIES, euribor_fixings_as_of, euribor_zero_curve, treasury_zero_curve
+from helper_functions import rate_store
+from market_cache import cached
+from price_store import PriceStore
+from providers import RECORDINGS_DIR, default_provider
+from yield_curve import load_treasury_history
+
+# Market data provider shared by every cached function below.
+provider = default_provider()
+
+# Where rates are read from: recordings directly, or None for the live rate store.
+rates_provider = provider if RECORDINGS_DIR else None
+
+# Local price history of every ticker priced so far, topped up through the same provider
+# (in a temporary directory when replaying recordings, see PriceStore).
+price_store = PriceStore(provider=provider)
+
+# Seconds FetchBatch.result waits for each source, counted from when the request starts.
+SOURCE_TIMEOUT = {
+    "spot": 20,
+    "fred": 30,
+    "treasury": 30,
+    "euribor": 30,
+    "curve": 60,        # one Treasury history and four Euribor series
+}
+
+# Seconds a request may wait for a free fetch_pool thread.
+QUEUE_TIMEOUT = 60
+
+# Download threads shared by every FetchBatch (and every Streamlit session) in this process.
+fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="market-data")
+
+
+@cached("spot")
+def get_yahoo_prices(ticker, start_date, end_date):
+    """Yahoo Finance price history (see fetch_yfinance_prices). Dates as 'YYYY-MM-DD'."""
+    return provider.get_prices(ticker, start_date, end_date)
+
+
+def get_first_last_prices(ticker, start_date, end_date):
+    """
+    First and last price (Adj Close, else Close) of ticker in [start_date, end_date)
+    from the price store, or None when it has no price in the window.
+    """
+    first, last = price_store.first_last_prices([ticker], [start_date], [end_date])
+    if np.isnan(first[0]):
+        return None
+    return float(first[0]), float(last[0])
+
+
+@cached("spot")
+def get_fx_spot(ticker, as_of):
+    """Latest close of an FX pair (e.g. "EURUSD=X") on or before as_of ('YYYY-MM-DD'), or None."""
+    return provider.get_fx_spot(ticker, as_of)
+
+
+@cached("fred")
+def get_fred_series(series_id, start_date, end_date):
+    """FRED series (percent) between two 'YYYY-MM-DD' dates, read through the rate store."""
+    if rates_provider is not None:
+        return rates_provider.get_rates(series_id, start_date, end_date)
+    return rate_store.get_series(series_id, start_date, end_date)
+
+
+@cached("treasury")
+def get_treasury_xml(year):
+    """Raw daily Treasury par yield curve XML feed for one calendar year."""
+    return provider.get_treasury_xml(year)
+
+
+@cached("treasury")
+def get_treasury_history(first_year, last_year):
+    """
+    Parsed Treasury curves (YieldCurveHistory) for first_year..last_year. Completed
+    years come from disk after their first download; the current year from the feed.
+    """
+    return load_treasury_history(range(first_year, last_year + 1), fetch_xml=get_treasury_xml)
+
+
+@cached("euribor")
+def get_euribor_series(series_key, start_period):
+    """ECB data-only series (e.g. a Euribor tenor) from start_period ('YYYY-MM') onwards."""
+    return provider.get_euribor(series_key, start_period)
+
+
+@cached("curve")
+def get_treasury_curve(as_of, method="linear"):
+    """
+    USD zero curve (curves.ZeroCurve) bootstrapped from the last Treasury par curve
+    published on or before as_of ('YYYY-MM-DD'). Built once per as-of date and method.
+    """
+    year = min(pd.Timestamp(as_of).year, date.today().year)
+    curve_date, par_yields = get_treasury_history(year - 1, year).as_of(as_of)
+    return treasury_zero_curve(curve_date, par_yields, method=method)
+
+
+@cached("curve")
+def get_euribor_curve(as_of, method="linear"):
+    """
+    EUR zero curve (curves.ZeroCurve) from the latest 1M/3M/6M/1Y Euribor fixings on
+    or before as_of ('YYYY-MM-DD'). Built once per as-of date and method.
+    """
+    start_period = (pd.Timestamp(as_of) - pd.DateOffset(months=3)).strftime("%Y-%m")
+    series = {tenor: get_euribor_series(series_key, start_period)
+              for tenor, (series_key, _) in ECB_EURIBOR_SERIES.items()}
+    return euribor_zero_curve(as_of, euribor_fixings_as_of(series, as_of), method=method)
+
+
+class FetchBatch:
+    """
+    Independent market data requests running concurrently on fetch_pool.
+
+    submit() queues a request on the pool straight away; result() waits for it,
+    but no longer than its source's timeout (SOURCE_TIMEOUT) counted from when a
+    pool thread picks it up, so time spent queued behind other downloads does not
+    count (up to queue_timeout). Submit everything a page needs before asking for
+    the first result.
+
+    Args:
+      timeouts      : Optional {source: seconds} overriding SOURCE_TIMEOUT.
+      queue_timeout : Seconds a request may wait for a free pool thread.
+    """
+
+    def __init__(self, timeouts=None, queue_timeout=QUEUE_TIMEOUT):
+        self.timeouts = dict(SOURCE_TIMEOUT, **(timeouts or {}))
+        self.queue_timeout = queue_timeout
+        self._jobs = {}     # name -> _FetchJob
+
+    def submit(self, name, func, *args):
+        """Queue func(*args) (one of the cached getters above) under name."""
+        self._jobs[name] = _FetchJob(getattr(func, "source", None), func, args)
+        return self
+
+    def result(self, name):
+        """Value of a submitted request; re-raises its error, or TimeoutError when too slow."""
+        job = self._jobs[name]
+        label = f"{job.source or 'market data'} request {name!r}"
+        queue_left = job.submitted + self.queue_timeout - time.monotonic()
+        if not job.started.wait(timeout=max(0.0, queue_left)):
+            job.future.cancel()
+            raise TimeoutError(f"{label} waited {self.queue_timeout}s for a fetch thread")
+        deadline = job.start_time + self.timeouts.get(job.source, 30)
+        try:
+            return job.future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FetchTimeout:
+            raise TimeoutError(f"{label} timed out") from None
+
+
+class _FetchJob:
+    """A request on fetch_pool and the time a pool thread started it."""
+
+    def __init__(self, source, func, args):
+        self.source = source
+        self.submitted = time.monotonic()
+        self.started = threading.Event()
+        self.start_time = None
+        self.future = fetch_pool.submit(self._run, func, args)
+
+    def _run(self, func, args):
+        self.start_time = time.monotonic()
+        self.started.set()
+        return func(*args)
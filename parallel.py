@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-core execution of the trade-level calculations.
+
+A TRS book (finance legs as calculate_interest_leg, asset legs as
+calculate_total_return) or a book of FX forwards is split into partitions that
+are priced in a process pool. Market data is not pickled per task: the parent
+copies the rate series (the compounding indexes when use_index is set, and the
+FX input columns) once into named shared memory blocks and every worker maps
+them when it starts, so workers never touch the network or the on-disk stores. Each trade is priced exactly
+as in a serial run and the partitions are put back in input order, so results
+are identical to settle_portfolio / price_fx_forwards.
+"""
+# parallel.py
+
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import tracer
+from providers import MarketDataProvider
+
+# Shared arrays mapped by this (worker) process: name -> read-only view
+_worker_arrays = {}
+# SharedMemory handles behind the views (closing them would invalidate the views)
+_worker_blocks = []
+
+
+class SharedArrays:
+    """
+    NumPy arrays copied once into shared memory blocks owned by this process.
+
+    Pass `descriptors` (name -> (block name, dtype, shape)) to worker processes;
+    attach_arrays() maps them without copying. Arrays named "out/..." are output
+    buffers the workers write their results into. close() (or leaving the with
+    block) frees the memory, so copy outputs out before.
+
+    Args:
+      arrays : dict of name -> array (object columns must be converted first,
+               e.g. strings to a fixed-width "<U" dtype).
+    """
+
+    def __init__(self, arrays):
+        self.descriptors = {}
+        self._blocks = []
+        try:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self._blocks.append(block)
+                np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+                self.descriptors[name] = (block.name, array.dtype.str, array.shape)
+        except BaseException:
+            self.close()
+            raise
+
+    def array(self, name):
+        """This process's view of one shared array."""
+        block_name, dtype, shape = self.descriptors[name]
+        block = next(b for b in self._blocks if b.name == block_name)
+        return np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+    @property
+    def nbytes(self):
+        return sum(block.size for block in self._blocks)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_arrays(descriptors):
+    """
+    Map shared arrays (SharedArrays.descriptors) into this process as views,
+    read-only except the "out/..." output buffers.
+    """
+    arrays = {}
+    for name, (block_name, dtype, shape) in descriptors.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        view = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = name.startswith("out/")
+        arrays[name] = view
+    return arrays
+
+
+def share_rates(series_ids, start_date, end_date, source=None):
+    """
+    SharedArrays with the observations of each rate series between start_date and
+    end_date ("rates/<id>/dates" as datetime64[D], "rates/<id>/values" in percent).
+
+    Args:
+      source : Callable (series_id, start, end) -> pd.Series, e.g. a provider's
+               get_rates (default: the local rate store, topped up from FRED).
+    """
+    return SharedArrays(rate_arrays(series_ids, start_date, end_date, source))
+
+
+def rate_arrays(series_ids, start_date, end_date, source=None):
+    """The arrays of share_rates, before they are copied into shared memory."""
+    if source is None:
+        from helper_functions import rate_store
+        source = rate_store.get_series
+    arrays = {}
+    for series_id in series_ids:
+        series = source(series_id, pd.Timestamp(start_date), pd.Timestamp(end_date))
+        arrays[f"rates/{series_id}/dates"] = pd.DatetimeIndex(series.index).to_numpy().astype("datetime64[D]")
+        arrays[f"rates/{series_id}/values"] = series.to_numpy(dtype=float)
+    return arrays
+
+
+def index_arrays(trades, index_store):
+    """
+    The compounding indexes a normalized TRS book reads with use_index (its
+    daily-reset groups without calendar or lockout), brought up to date through
+    index_store: "index/<id>/<denominator>/<look-back>/{first_date,rates,factors}".
+    """
+    from compounding_index import index_denominator, index_series_id
+
+    daily = trades[(trades["reset_frequency"] == "1D") & (trades["calendar"] == "") & (trades["lockout_days"] == 0)]
+    arrays = {}
+    combos = daily[["float_index", "day_count_choice", "year_basis", "look_back_days"]].drop_duplicates()
+    for float_index, day_count_choice, year_basis, look_back_days in combos.itertuples(index=False):
+        prefix = (f"index/{index_series_id(float_index)}/{index_denominator(day_count_choice, year_basis)}"
+                  f"/{int(look_back_days)}/")
+        if prefix + "factors" in arrays:
+            continue
+        index = index_store.get(float_index, day_count_choice, year_basis, look_back_days,
+                                start_date=daily["start_date"].min())
+        arrays[prefix + "first_date"] = np.array([index.first_date])
+        arrays[prefix + "rates"] = np.asarray(index.rates)
+        arrays[prefix + "factors"] = np.asarray(index.factors)
+    return arrays
+
+
+class SharedRatesProvider(MarketDataProvider):
+    """Rates read from shared arrays of share_rates (same slices as RateStore.get_series)."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def get_rates(self, series_id, start_date, end_date):
+        key = f"rates/{series_id}/dates"
+        if key not in self.arrays:
+            raise LookupError(f"Rate series {series_id!r} was not shared with the workers")
+        dates = self.arrays[key]
+        values = self.arrays[f"rates/{series_id}/values"]
+        lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date).date(), "D"), side="left")
+        hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date).date(), "D"), side="right")
+        return pd.Series(np.array(values[lo:hi]),
+                         index=pd.DatetimeIndex(dates[lo:hi].astype("datetime64[ns]")),
+                         name=series_id)
+
+
+class SharedIndexStore:
+    """Read-only IndexStore over the shared arrays of index_arrays (no top-up, no files)."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self._indexes = {}
+
+    def get(self, float_index, day_count_choice="Act", year_basis=360, look_back_days=0, start_date=None):
+        from compounding_index import CompoundingIndex, index_denominator, index_series_id
+
+        key = (index_series_id(float_index), index_denominator(day_count_choice, year_basis), int(look_back_days))
+        if key not in self._indexes:
+            prefix = "index/{}/{}/{}/".format(*key)
+            if prefix + "factors" not in self.arrays:
+                raise LookupError(f"Compounding index {key} was not shared with the workers")
+            self._indexes[key] = CompoundingIndex(*key, self.arrays[prefix + "first_date"][0],
+                                                  self.arrays[prefix + "rates"], self.arrays[prefix + "factors"])
+        return self._indexes[key]
+
+
+def _init_worker(descriptors):
+    _worker_arrays.update(attach_arrays(descriptors))
+
+
+def _pool(workers, shared):
+    """Process pool whose workers map the shared arrays once, at start-up."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(shared.descriptors,))
+
+
+def partition_positions(trades, n_partitions):
+    """
+    Split a TRS book into at most n_partitions lists of row positions of similar
+    size without splitting a rate group (so each group is still fetched and
+    compounded once).
+    """
+    from portfolio import RATE_GROUP_KEYS, normalize_trades
+
+    keyed = normalize_trades(trades)
+    groups = sorted(keyed.groupby(RATE_GROUP_KEYS, sort=False, dropna=False).indices.values(),
+                    key=len, reverse=True)
+    buckets = [[] for _ in range(max(1, min(n_partitions, len(groups))))]
+    sizes = [0] * len(buckets)
+    for positions in groups:
+        # Largest groups first, each into the currently smallest bucket
+        i = sizes.index(min(sizes))
+        buckets[i].extend(positions)
+        sizes[i] += len(positions)
+    return [np.sort(np.asarray(b)) for b in buckets if b]
+
+
+def _settle_worker(trades, use_index):
+    """Settle one partition with the shared rates; returns (settlements, timing snapshot or None)."""
+    from helper_functions import fetch_interest_rates
+    from portfolio import settle_portfolio
+
+    tracer.reset()
+    rate_fetcher = functools.partial(fetch_interest_rates, provider=SharedRatesProvider(_worker_arrays))
+    index_store = SharedIndexStore(_worker_arrays) if use_index else None
+    settled = settle_portfolio(trades, rate_fetcher=rate_fetcher, index_store=index_store)
+    return settled, tracer.snapshot() if tracer.enabled else None
+
+
+def settle_parallel(trades, workers=None, source=None, use_index=False, index_store=None):
+    """
+    settle_portfolio across a process pool.
+
+    The rate series the book needs are read once (from source, see share_rates)
+    and shared with the workers; the book is partitioned by rate group and the
+    partitions' results are put back in input order.
+
+    Args:
+      trades      : TRS book, as for settle_portfolio.
+      workers     : Worker processes (default: CPU count).
+      source      : Where the rates come from, as in share_rates.
+      use_index   : Read daily-reset finance legs from compounding indexes
+                    instead. They are brought up to date once, in this process,
+                    and shared with the workers.
+      index_store : compounding_index.IndexStore for use_index (default: one
+                    over the default rate store).
+
+    Returns:
+      pd.DataFrame: Same rows, index and values as settle_portfolio(trades)
+      (with index_store when use_index is set).
+    """
+    from portfolio import normalize_trades
+
+    workers = workers or os.cpu_count() or 1
+    keyed = normalize_trades(trades)
+    if not isinstance(trades, pd.DataFrame):
+        trades = keyed
+    series_ids = sorted({"SOFR" if str(i).upper() == "SOFR" else "EFFR" for i in keyed["float_index"]})
+    # Same look-up window as fetch_interest_rates, over the whole book
+    start = keyed["start_date"].min() - pd.Timedelta(days=180)
+    end = keyed["end_date"].max()
+
+    partitions = partition_positions(trades, workers)
+    with tracer.span("parallel/share_rates"):
+        arrays = rate_arrays(series_ids, start, end, source)
+        if use_index:
+            if index_store is None:
+                from compounding_index import IndexStore
+                index_store = IndexStore()
+            arrays.update(index_arrays(keyed, index_store))
+        shared = SharedArrays(arrays)
+    with shared, _pool(len(partitions), shared) as pool:
+        results = []
+        for settled, snapshot in pool.map(_settle_worker, [trades.iloc[p] for p in partitions],
+                                          [use_index] * len(partitions)):
+            results.append(settled)
+            if snapshot:
+                tracer.merge(snapshot)
+
+    # Back to input order (by position, so duplicate index labels are fine too)
+    order = np.argsort(np.concatenate(partitions), kind="stable")
+    return pd.concat(results).iloc[order]
+
+
+# Arguments of price_fx_forwards that may be arrays (day_basis stays a scalar)
+FX_ARRAY_ARGUMENTS = ["spot_rate", "us_rate", "euribor_rate", "days", "notional",
+                      "notional_currency", "basis_spread"]
+
+
+# Outputs of price_fx_forwards
+FX_RESULTS = ["forward_rate", "premium", "spot_usd", "forward_usd", "spot_eur", "forward_eur"]
+
+
+def _price_fx_worker(start, stop, day_basis):
+    """Price rows start:stop into the shared output buffers (nothing is pickled back)."""
+    from fx_forward import price_fx_forwards
+    args = {name: _worker_arrays[f"fx/{name}"][start:stop] for name in FX_ARRAY_ARGUMENTS}
+    for key, values in price_fx_forwards(day_basis=day_basis, **args).items():
+        _worker_arrays[f"out/{key}"][start:stop] = values
+
+
+def price_fx_forwards_parallel(spot_rate, us_rate, euribor_rate, days, notional=1.0,
+                               notional_currency="USD", basis_spread=0.0, day_basis=360,
+                               workers=None, chunks=None):
+    """
+    price_fx_forwards for a large book of forwards, split into contiguous chunks
+    priced in a process pool. The input columns and the output arrays are shared
+    with the workers (nothing is pickled but the row ranges) and every row is
+    priced exactly as in one vectorized call, so the result equals it element
+    for element.
+
+    Args:
+      (pricing arguments as price_fx_forwards; arrays are broadcast to one length)
+      workers : Worker processes (default: CPU count).
+      chunks  : Number of chunks (default: one per worker).
+
+    Returns:
+      dict of 1-D arrays, keyed as price_fx_forwards.
+    """
+    workers = workers or os.cpu_count() or 1
+    values = dict(spot_rate=spot_rate, us_rate=us_rate, euribor_rate=euribor_rate, days=days,
+                  notional=notional, notional_currency=notional_currency, basis_spread=basis_spread)
+    arrays = np.broadcast_arrays(*(np.atleast_1d(np.asarray(values[name])) for name in FX_ARRAY_ARGUMENTS))
+    arrays = {f"fx/{name}": array.astype(str) if array.dtype == object else array
+              for name, array in zip(FX_ARRAY_ARGUMENTS, arrays)}
+    n = len(arrays["fx/spot_rate"])
+    arrays.update({f"out/{key}": np.empty(n) for key in FX_RESULTS})
+    bounds = np.linspace(0, n, min(chunks or workers, max(n, 1)) + 1).astype(int)
+
+    with SharedArrays(arrays) as shared:
+        with _pool(workers, shared) as pool:
+            list(pool.map(_price_fx_worker, bounds[:-1], bounds[1:], [day_basis] * (len(bounds) - 1)))
+        return {key: np.array(shared.array(f"out/{key}")) for key in FX_RESULTS}
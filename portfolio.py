@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Portfolio-level TRS settlement.
+
+Settles a whole book of TRS trades in one pass: trades that reference the same
+floating index over the same dates share a single rate fetch, and all spreads
+and day-count conventions inside that group are compounded together.
+With a compounding_index.IndexStore, daily-reset trades skip the rate fetch and
+read their compound factors from the precomputed index instead. mark_portfolio
+values open trades against a zero curve (curves.ZeroCurve).
+"""
+# portfolio.py
+
+import numpy as np
+import pandas as pd
+
+from helper_functions import fetch_interest_rates, day_count_fractions
+from instrumentation import tracer
+
+# Trade columns understood by settle_portfolio. They mirror the arguments of
+# calculate_interest_leg / calculate_total_return; the optional ones get the
+# defaults below when missing.
+TRADE_COLUMNS = [
+    "product_type",
+    "notional",
+    "units",
+    "initial_price",
+    "final_price",
+    "start_date",
+    "end_date",
+    "spread",
+    "float_index",
+    "reset_frequency",
+    "day_count_choice",
+    "year_basis",
+    "look_back_days",
+    "calendar",
+    "lockout_days",
+]
+
+TRADE_DEFAULTS = {
+    "units": 0.0,
+    "spread": 0.0,
+    "reset_frequency": "1D",
+    "day_count_choice": "Act",
+    "year_basis": 360,
+    "look_back_days": 0,
+    "calendar": "",          # "" = calendar-day look-back; else "USGS", "FED", "TARGET"
+    "lockout_days": 0,
+}
+
+# Trades sharing these fields share one call to fetch_interest_rates.
+RATE_GROUP_KEYS = ["float_index", "start_date", "end_date", "reset_frequency", "look_back_days",
+                   "calendar", "lockout_days"]
+
+# Within a rate group, trades sharing these fields share one compound factor.
+COMPOUNDING_KEYS = ["spread", "day_count_choice", "year_basis"]
+
+
+def settle_portfolio(trades, rate_fetcher=fetch_interest_rates, index_store=None):
+    """
+    Compute the asset leg, finance leg and net settlement of every trade in a book.
+
+    Args:
+      trades       : pandas DataFrame or pyarrow Table with one row per trade and the
+                     columns listed in TRADE_COLUMNS (units, spread, reset_frequency,
+                     day_count_choice, year_basis, look_back_days, calendar and
+                     lockout_days are optional).
+      rate_fetcher : Callable with the signature of fetch_interest_rates, used once
+                     per distinct (index, dates, reset frequency, look-back) group.
+      index_store  : Optional compounding_index.IndexStore. Groups with a "1D" reset
+                     (and a calendar-day look-back without lockout) then take their
+                     factors from the compounding index (exact path, equal to
+                     compounding the fetched rates up to last-digit rounding).
+
+    Returns:
+      pd.DataFrame: The input trades (same index and order) with three extra columns:
+        - Asset Leg:      Total return of the underlying (as calculate_total_return).
+        - Finance Leg:    Compounded interest (as calculate_interest_leg).
+        - Net Settlement: Asset Leg - Finance Leg.
+    """
+    trades = normalize_trades(trades)
+
+    # 1) Asset leg for the whole book at once.
+    asset_leg = total_returns(
+        trades["product_type"].to_numpy(),
+        trades["notional"].to_numpy(dtype=float),
+        trades["units"].to_numpy(dtype=float),
+        trades["initial_price"].to_numpy(dtype=float),
+        trades["final_price"].to_numpy(dtype=float),
+    )
+
+    # 2) Funding leg notional (Bond TRS finance the dirty price).
+    funding_leg_notional = funding_leg_notionals(trades)
+
+    # 3) One rate fetch + one compounding pass per rate group.
+    compound_factor = compound_factors(trades, rate_fetcher, index_store)
+    finance_leg = funding_leg_notional * (compound_factor - 1)
+
+    result = trades.copy()
+    result["Asset Leg"] = asset_leg
+    result["Finance Leg"] = finance_leg
+    result["Net Settlement"] = asset_leg - finance_leg
+    return result
+
+
+def mark_portfolio(trades, valuation_date, curve, rate_fetcher=fetch_interest_rates, index_store=None):
+    """
+    Mark a book of open TRS trades to market on valuation_date.
+
+    Finance leg: the factor already compounded from start_date to the valuation
+    date (from fixed rates, as settle_portfolio), times the curve's projection
+    for the rest of the period, DF(from) / DF(end_date) + spread * year fraction
+    (the simple forward rate plus spread over the remaining days).
+    Asset leg: the total return at final_price, taken as the trade's current
+    price. Both legs are paid at end_date and discounted to the valuation date.
+
+    Args:
+      trades         : TRS book as for settle_portfolio (final_price = current price).
+      valuation_date : Marking date.
+      curve          : curves.ZeroCurve for discounting and projection.
+      rate_fetcher, index_store : As for settle_portfolio (used for the accrued part).
+
+    Returns:
+      pd.DataFrame: The trades with extra columns:
+        - Accrued Finance:   Finance interest accrued up to the valuation date.
+        - Finance Leg:       Projected finance interest at end_date.
+        - Asset Leg:         Total return at the current price.
+        - Discount Factor:   From end_date to the valuation date (1 for matured trades).
+        - Asset Leg PV, Finance Leg PV, MTM (Asset Leg PV - Finance Leg PV).
+    """
+    trades = normalize_trades(trades)
+    valuation = pd.Timestamp(valuation_date).normalize()
+    start, end = trades["start_date"], trades["end_date"]
+
+    # Fixed part: accrue up to the valuation date (nothing before start_date)
+    accrual_end = end.clip(upper=valuation)
+    accrual_end = accrual_end.where(accrual_end > start, start)
+    accrued_factor = compound_factors(trades.assign(end_date=accrual_end), rate_fetcher, index_store)
+
+    # Projected part: from max(start, valuation) to end_date on the curve
+    projection_start = accrual_end.to_numpy()
+    remaining_days = (end.to_numpy() - projection_start).astype("timedelta64[D]").astype(np.int64)
+    # Same day count fractions as the accrued part (final_compound_factors)
+    remaining_fraction = np.zeros(len(trades))
+    conventions = trades.groupby(["day_count_choice", "year_basis"], sort=False).indices
+    for (day_count_choice, year_basis), positions in conventions.items():
+        remaining_fraction[positions] = day_count_fractions(remaining_days[positions], day_count=day_count_choice,
+                                                            year_basis=year_basis)
+    open_trade = remaining_days > 0
+    valuation_df = curve.discount_factors(valuation)[0]
+    end_df = np.where(open_trade, curve.discount_factors(end) / valuation_df, 1.0)
+    start_df = curve.discount_factors(projection_start) / valuation_df
+    projected = np.where(open_trade,
+                         start_df / end_df + trades["spread"].to_numpy(dtype=float) * remaining_fraction,
+                         1.0)
+
+    funding_leg_notional = funding_leg_notionals(trades)
+    finance_leg = funding_leg_notional * (accrued_factor * projected - 1)
+    asset_leg = total_returns(
+        trades["product_type"].to_numpy(),
+        trades["notional"].to_numpy(dtype=float),
+        trades["units"].to_numpy(dtype=float),
+        trades["initial_price"].to_numpy(dtype=float),
+        trades["final_price"].to_numpy(dtype=float),
+    )
+
+    result = trades.copy()
+    result["Accrued Finance"] = funding_leg_notional * (accrued_factor - 1)
+    result["Finance Leg"] = finance_leg
+    result["Asset Leg"] = asset_leg
+    result["Discount Factor"] = end_df
+    result["Asset Leg PV"] = end_df * asset_leg
+    result["Finance Leg PV"] = end_df * finance_leg
+    result["MTM"] = result["Asset Leg PV"] - result["Finance Leg PV"]
+    return result
+
+
+def funding_leg_notionals(trades):
+    """Funding leg notional of every trade (Bond TRS finance the dirty price)."""
+    is_bond = trades["product_type"].to_numpy() == "Bond"
+    return np.where(
+        is_bond,
+        trades["notional"].to_numpy(dtype=float) * (trades["initial_price"].to_numpy(dtype=float) / 100.0),
+        trades["notional"].to_numpy(dtype=float),
+    )
+
+
+def compound_factors(trades, rate_fetcher=fetch_interest_rates, index_store=None):
+    """
+    Final compound factor of every trade of a normalized book: one rate fetch and
+    one compounding pass per rate group (or compounding index lookups, see
+    settle_portfolio).
+    """
+    compound_factor = np.ones(len(trades))
+    rate_groups = trades.groupby(RATE_GROUP_KEYS, sort=False, dropna=False).indices
+    for group_key, group_positions in rate_groups.items():
+        float_index, start_date, end_date, reset_frequency, look_back_days, calendar, lockout_days = group_key
+        group = trades.iloc[group_positions]
+        if index_store is not None and reset_frequency == "1D" and not calendar and not lockout_days:
+            compound_factor[group_positions] = index_factors(
+                index_store, group, float_index, start_date, end_date, int(look_back_days))
+            continue
+
+        rates_df = rate_fetcher(
+            start_date, end_date,
+            index=float_index,
+            look_back_days=int(look_back_days),
+            reset_frequency=reset_frequency,
+            **schedule_options(calendar, lockout_days)
+        )
+        rates_df = rates_df.sort_values("Reset Date").reset_index(drop=True)
+
+        combo_codes = group.groupby(COMPOUNDING_KEYS, sort=False).ngroup().to_numpy()
+        combos = group[COMPOUNDING_KEYS].drop_duplicates()
+        with tracer.span("compound/portfolio"):
+            factors = final_compound_factors(
+                rates_df,
+                combos["spread"].to_numpy(dtype=float),
+                combos["day_count_choice"].to_numpy(),
+                combos["year_basis"].to_numpy(dtype=float),
+            )
+        compound_factor[group_positions] = factors[combo_codes]
+    return compound_factor
+
+
+def schedule_options(calendar, lockout_days):
+    """Business-day look-back / lockout arguments of fetch_interest_rates (none when unused)."""
+    options = {}
+    if calendar:
+        options["calendar"] = calendar
+    if lockout_days:
+        options["lockout_days"] = int(lockout_days)
+    return options
+
+
+def index_factors(index_store, group, float_index, start_date, end_date, look_back_days):
+    """Compound factors of one rate group's trades, read from the compounding indexes."""
+    combo_codes = group.groupby(COMPOUNDING_KEYS, sort=False).ngroup().to_numpy()
+    combos = group[COMPOUNDING_KEYS].drop_duplicates()
+    factors = np.empty(len(combos))
+    with tracer.span("compound/index"):
+        for i, (spread, day_count_choice, year_basis) in enumerate(combos.itertuples(index=False)):
+            index = index_store.get(float_index, day_count_choice, year_basis, look_back_days,
+                                    start_date=start_date)
+            factors[i] = index.period_factor(start_date, end_date, spread)
+    return factors[combo_codes]
+
+
+def total_returns(product_type, notional, units, initial_price, final_price):
+    """
+    Vectorized calculate_total_return over arrays of trades.
+
+    Bond TRS:             (FinalPrice - InitialPrice) * (Notional / 100)
+    Equity/Commodity TRS: Units * (FinalPrice - InitialPrice)
+    Anything else:        0.0
+    """
+    product_type = np.asarray(product_type)
+    price_change = np.asarray(final_price, dtype=float) - np.asarray(initial_price, dtype=float)
+    bond_return = price_change * (np.asarray(notional, dtype=float) / 100.0)
+    unit_return = np.asarray(units, dtype=float) * price_change
+    return np.select(
+        [product_type == "Bond", np.isin(product_type, ["Equity", "Commodity"])],
+        [bond_return, unit_return],
+        default=0.0,
+    )
+
+
+def final_compound_factors(rates_df, spreads, day_count_choices, year_bases):
+    """
+    Final geometric compound factor of one rate table for several
+    (spread, day count, year basis) combinations at once.
+
+    Factors are accumulated left to right along each row, in the same order as
+    compound_accruals, so every result equals that engine's last Cumulative Factor.
+
+    Args:
+      rates_df          : Sorted rate table with "Reset Date" and "Rate" columns.
+      spreads           : Array of spreads (decimal), one per combination.
+      day_count_choices : Array of day count conventions ("Act" or "30").
+      year_bases        : Array of year bases (360 or 365).
+
+    Returns:
+      np.ndarray: One compound factor per combination.
+    """
+    day_numbers = pd.to_datetime(rates_df["Reset Date"]).to_numpy().astype("datetime64[D]")
+    accrual_days = np.diff(day_numbers).astype(np.int64)
+    rates = rates_df["Rate"].to_numpy(dtype=float)[:-1]
+    if len(accrual_days) == 0:
+        return np.ones(len(spreads))
+
+    dc_fraction = np.vstack([
+        day_count_fractions(accrual_days, day_count=dc, year_basis=yb)
+        for dc, yb in zip(day_count_choices, year_bases)
+    ])
+    daily_factor = 1 + (rates[None, :] + np.asarray(spreads, dtype=float)[:, None]) * dc_fraction
+    return np.multiply.accumulate(daily_factor, axis=1)[:, -1]
+
+
+def normalize_trades(trades):
+    """Convert an Arrow table to pandas, fill optional columns and normalize dates."""
+    if not isinstance(trades, pd.DataFrame) and hasattr(trades, "to_pandas"):
+        trades = trades.to_pandas()
+    trades = trades.copy()
+
+    missing = [c for c in TRADE_COLUMNS if c not in trades.columns and c not in TRADE_DEFAULTS]
+    if missing:
+        raise ValueError(f"Trades are missing required columns: {missing}")
+
+    for column, default in TRADE_DEFAULTS.items():
+        if column not in trades.columns:
+            trades[column] = default
+        else:
+            trades[column] = trades[column].fillna(default)
+
+    trades["start_date"] = pd.to_datetime(trades["start_date"])
+    trades["end_date"] = pd.to_datetime(trades["end_date"])
+    trades["day_count_choice"] = trades["day_count_choice"].astype(str)
+    trades["look_back_days"] = trades["look_back_days"].astype(int)
+    trades["calendar"] = trades["calendar"].astype(str)
+    trades["lockout_days"] = trades["lockout_days"].astype(int)
+    return trades
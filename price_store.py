@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent local price cache for equity and commodity TRS.
+
+Each ticker's daily prices (Adj Close, or Close when the source only has
+adjusted closes) are kept on disk as two NumPy column files, dates as
+datetime64[D] and prices as float64, plus a JSON file recording the date range
+already downloaded and naming the current pair of column files, as
+rate_store.RateStore does for rates (including its atomic swap of the pair).
+
+A book's price needs are collected first. Tickers missing part of their window
+are then grouped by that missing window, and each group is downloaded in one
+batched request (MarketDataProvider.get_prices_bulk: a single yf.download for
+Yahoo). After that, the first and last prices of every trade come from
+searchsorted lookups on the memory-mapped columns, one vectorized call per
+ticker.
+"""
+# price_store.py
+
+import json
+import os
+import tempfile
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import tracer
+from providers import RECORDINGS_DIR, _file_name
+from rate_store import DEFAULT_DATA_DIR, OFFLINE
+
+# Price columns stored, in order of preference.
+PRICE_COLUMNS = ("Adj Close", "Close")
+
+# Tickers whose missing windows together span at most this many extra days are
+# downloaded in one request (over the union of their windows).
+MERGE_SLACK_DAYS = 31
+
+
+def price_column(prices):
+    """The preferred price column of a price history as a float Series (None if it has none)."""
+    for column in PRICE_COLUMNS:
+        if column in prices.columns:
+            values = prices[column]
+            if isinstance(values, pd.DataFrame):
+                # (Price, Ticker) columns of a single-ticker download
+                values = values.iloc[:, 0]
+            return values.astype(float)
+    return None
+
+
+class PriceStore:
+    """
+    On-disk daily price store, topped up in batches.
+
+    Windows follow yf.download: start inclusive, end exclusive.
+
+    Args:
+      root     : Directory holding the price files (default: <data dir>/prices, or
+                 a temporary directory when replaying recordings, so replayed
+                 prices never mix with downloaded ones).
+      provider : providers.MarketDataProvider for top-ups, called through
+                 get_prices_bulk (default: providers.default_provider()).
+      offline  : If True, only serve what is already stored (or seeded).
+    """
+
+    def __init__(self, root=None, provider=None, offline=OFFLINE):
+        if root is None:
+            root = (tempfile.mkdtemp(prefix="replayed-prices-") if RECORDINGS_DIR
+                    else os.path.join(DEFAULT_DATA_DIR, "prices"))
+        self.root = root
+        self.provider = provider
+        self.offline = offline
+        self._columns = {}          # ticker -> (meta.json version, dates, prices)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def get_prices(self, ticker, start_date, end_date):
+        """Stored prices of ticker in [start_date, end_date) as a pd.Series, topped up first."""
+        if not self.offline:
+            self.ensure([(ticker, start_date, end_date)])
+        dates, prices = self._load(ticker)
+        if dates is None:
+            return pd.Series(dtype=float, name=ticker)
+        lo, hi = np.searchsorted(dates, [_day(start_date), _day(end_date)], side="left")
+        return pd.Series(np.array(prices[lo:hi]),
+                         index=pd.DatetimeIndex(np.array(dates[lo:hi]).astype("datetime64[ns]")),
+                         name=ticker)
+
+    def first_last_prices(self, tickers, start_dates, end_dates):
+        """
+        First and last stored price of each window [start, end) (vectorized).
+
+        All missing windows are topped up in one batch first. Windows without any
+        price give NaN.
+
+        Args:
+          tickers     : Ticker of each window.
+          start_dates : Window starts (inclusive).
+          end_dates   : Window ends (exclusive).
+
+        Returns:
+          (first, last): two float arrays, one value per window.
+        """
+        tickers = np.asarray(tickers, dtype=object)
+        starts = pd.to_datetime(np.atleast_1d(start_dates)).to_numpy().astype("datetime64[D]")
+        ends = pd.to_datetime(np.atleast_1d(end_dates)).to_numpy().astype("datetime64[D]")
+        if not self.offline:
+            self.ensure(zip(tickers, starts, ends))
+
+        first = np.full(len(tickers), np.nan)
+        last = np.full(len(tickers), np.nan)
+        unique_tickers, codes = np.unique(tickers.astype(str), return_inverse=True)
+        with tracer.span("prices/lookup"):
+            for code, ticker in enumerate(unique_tickers):
+                dates, prices = self._load(ticker)
+                if dates is None or len(dates) == 0:
+                    continue
+                rows = np.flatnonzero(codes == code)
+                lo = np.searchsorted(dates, starts[rows], side="left")
+                hi = np.searchsorted(dates, ends[rows], side="left")
+                found = hi > lo
+                first[rows[found]] = prices[lo[found]]
+                last[rows[found]] = prices[hi[found] - 1]
+        return first, last
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def ensure(self, windows):
+        """
+        Download what the store is missing for a set of (ticker, start, end) windows.
+
+        Each ticker needs at most the days before its covered range and the days
+        after it (the recent end at most once per calendar day). Tickers are
+        grouped by that missing range (ranges within MERGE_SLACK_DAYS of each
+        other share a group) and each group is fetched in one get_prices_bulk
+        call over its range. Tickers that returned prices, and those of a download
+        without any rows (nothing traded in the window), are recorded as covered;
+        tickers whose download failed are tried again on the next call.
+
+        Returns:
+          int: Number of batched downloads issued.
+        """
+        wanted = {}
+        for ticker, start, end in windows:
+            start, end = pd.Timestamp(start), pd.Timestamp(end)
+            if ticker in wanted:
+                start, end = min(start, wanted[ticker][0]), max(end, wanted[ticker][1])
+            wanted[ticker] = (start, end)
+        if self.offline or not wanted:
+            return 0
+
+        today = pd.Timestamp(date.today())
+        with self._lock:
+            missing = {}
+            for ticker, (start, end) in wanted.items():
+                gap = self._missing(self._read_meta(ticker), start, end, today)
+                if gap is not None:
+                    missing[ticker] = gap
+            if not missing:
+                return 0
+
+            provider = self.provider
+            if provider is None:
+                from providers import default_provider
+                provider = self.provider = default_provider()
+            groups = self._group_gaps(missing)
+            for (window_start, window_end), tickers in groups:
+                tracer.count("requests/prices_bulk")
+                with tracer.span("fetch/prices_bulk"):
+                    downloaded = provider.get_prices_bulk(tickers, window_start.strftime("%Y-%m-%d"),
+                                                          window_end.strftime("%Y-%m-%d"))
+                for ticker in tickers:
+                    frame = downloaded.get(ticker)
+                    if frame is None:
+                        # Failed for this ticker: leave its gap to the next call
+                        continue
+                    prices = price_column(frame) if len(frame) else None
+                    prices = prices.dropna() if prices is not None else None
+                    if len(frame) and (prices is None or prices.empty):
+                        # Rows for other tickers but none for this one: failed as well
+                        continue
+                    meta = self._read_meta(ticker)
+                    covered_from = pd.Timestamp(meta.get("covered_from", window_start))
+                    covered_to = pd.Timestamp(meta.get("covered_to", window_start))
+                    coverage = {
+                        "covered_from": min(covered_from, window_start).strftime("%Y-%m-%d"),
+                        # Today's close may still change: it stays uncovered until tomorrow
+                        "covered_to": max(covered_to, min(window_end, today)).strftime("%Y-%m-%d"),
+                        "checked": today.strftime("%Y-%m-%d"),
+                    }
+                    if prices is None:
+                        # Nothing traded in the window (e.g. a weekend): only the range grows
+                        self._write_meta(ticker, dict(meta, **coverage))
+                    else:
+                        self._merge_and_write(ticker, prices, coverage)
+        return len(groups)
+
+    @staticmethod
+    def _group_gaps(missing):
+        """
+        [((start, end), tickers)] download groups for {ticker: (start, end)} gaps:
+        sorted by start, a ticker joins the previous group when the group's range
+        grows its own range (or any member's) by at most MERGE_SLACK_DAYS.
+        """
+        slack = pd.Timedelta(days=MERGE_SLACK_DAYS)
+        groups = []         # [start, end, shortest member range, tickers]
+        for ticker, (start, end) in sorted(missing.items(), key=lambda item: item[1]):
+            if groups:
+                group = groups[-1]
+                union_start, union_end = min(group[0], start), max(group[1], end)
+                shortest = min(group[2], end - start)
+                if union_end - union_start - shortest <= slack:
+                    group[:3] = union_start, union_end, shortest
+                    group[3].append(ticker)
+                    continue
+            groups.append([start, end, end - start, [ticker]])
+        return [((start, end), tickers) for start, end, _, tickers in groups]
+
+    @staticmethod
+    def _missing(meta, start, end, today):
+        """[start, end) range to download for one ticker, or None when covered."""
+        if not meta:
+            return start, end
+        covered_from = pd.Timestamp(meta["covered_from"])
+        covered_to = pd.Timestamp(meta["covered_to"])
+        checked = pd.Timestamp(meta.get("checked", covered_to))
+        gaps = []
+        if start < covered_from:
+            gaps.append((start, covered_from))
+        if end > covered_to and not (covered_to >= today and checked >= today):
+            gaps.append((covered_to, end))
+        if not gaps:
+            return None
+        return min(g[0] for g in gaps), max(g[1] for g in gaps)
+
+    def seed(self, ticker, prices, covered_from=None, covered_to=None):
+        """
+        Store a price Series (date index) or price history DataFrame as-is, e.g.
+        for offline use; the covered range defaults to its first and last date.
+        """
+        if isinstance(prices, pd.DataFrame):
+            prices = price_column(prices)
+        prices = prices.dropna()
+        with self._lock:
+            index = pd.to_datetime(prices.index)
+            self._merge_and_write(ticker, prices, {
+                "covered_from": pd.Timestamp(covered_from or index.min()).strftime("%Y-%m-%d"),
+                "covered_to": pd.Timestamp(covered_to or index.max() + pd.Timedelta(days=1)).strftime("%Y-%m-%d"),
+                "checked": date.today().strftime("%Y-%m-%d"),
+            })
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+    def _path(self, ticker, suffix):
+        return os.path.join(self.root, f"{_file_name(ticker)}.{suffix}")
+
+    def _load(self, ticker):
+        """
+        Memory-map the column files named by meta.json, re-mapping only when a
+        write swapped in a new pair.
+        """
+        meta_path = self._path(ticker, "meta.json")
+        for _ in range(3):
+            try:
+                stat = os.stat(meta_path)
+            except FileNotFoundError:
+                return None, None
+            version = (stat.st_mtime_ns, stat.st_ino)
+            cached = self._columns.get(ticker)
+            if cached is not None and cached[0] == version:
+                return cached[1], cached[2]
+            meta = self._read_meta(ticker)
+            prefix = self._columns_prefix(ticker, meta)
+            if "columns" not in meta and not os.path.exists(prefix + "dates.npy"):
+                return None, None
+            try:
+                dates = np.load(prefix + "dates.npy", mmap_mode="r")
+                prices = np.load(prefix + "prices.npy", mmap_mode="r")
+            except FileNotFoundError:
+                # A concurrent write removed this pair after we read meta.json: read it again
+                continue
+            self._columns[ticker] = (version, dates, prices)
+            return dates, prices
+        raise LookupError(f"Price files of {ticker!r} in {self.root} keep changing or are missing")
+
+    def _columns_prefix(self, ticker, meta):
+        """Path prefix of the current column pair (files written before meta.json named them: <ticker>.*)."""
+        return os.path.join(self.root, meta.get("columns", _file_name(ticker)) + ".")
+
+    def _merge_and_write(self, ticker, prices, meta):
+        """Merge prices into the stored columns and swap in the new pair with meta."""
+        dates, stored = self._load(ticker)
+        previous = self._read_meta(ticker)
+        parts = [pd.Series(prices.to_numpy(dtype=float), index=pd.to_datetime(prices.index).normalize())]
+        if dates is not None:
+            parts.insert(0, pd.Series(np.array(stored), index=pd.DatetimeIndex(np.array(dates))))
+        merged = pd.concat(parts)
+        # Later parts win, so re-downloaded (adjusted) prices replace stored ones
+        merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+
+        # A new pair under a name unique to this write (and this process)
+        os.makedirs(self.root, exist_ok=True)
+        fd, dates_path = tempfile.mkstemp(prefix=f"{_file_name(ticker)}.", suffix=".dates.npy", dir=self.root)
+        prefix = dates_path[:-len("dates.npy")]
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, merged.index.to_numpy().astype("datetime64[D]"))
+        with open(prefix + "prices.npy", "xb") as f:
+            np.save(f, merged.to_numpy(dtype=float))
+        meta = dict(meta, columns=os.path.basename(prefix[:-1]))
+
+        # Release this store's maps before the old pair goes (mapped files cannot be removed on Windows)
+        self._columns.pop(ticker, None)
+        self._write_meta(ticker, meta)
+        if dates is not None:
+            old_prefix = self._columns_prefix(ticker, previous)
+            for suffix in ("dates.npy", "prices.npy"):
+                try:
+                    os.remove(old_prefix + suffix)
+                except OSError:
+                    # Still mapped by another reader on Windows; the pair is only orphaned
+                    pass
+
+    def _read_meta(self, ticker):
+        path = self._path(ticker, "meta.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, ticker, meta):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{_file_name(ticker)}.meta.", suffix=".tmp", dir=self.root)
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(ticker, "meta.json"))
+
+
+def _day(value):
+    return np.datetime64(pd.Timestamp(value).date(), "D")
+
+
+def fill_trade_prices(trades, store=None, ticker_column="ticker"):
+    """
+    Fill missing initial_price / final_price of a TRS book from the price store:
+    the first price on or after start_date and the last on or before end_date of
+    each trade's ticker. All tickers are topped up in one batch and looked up
+    vectorized; trades without a ticker, or with both prices given, are left as is.
+
+    Args:
+      trades        : TRS book (portfolio.TRADE_COLUMNS plus a ticker column).
+      store         : PriceStore (default: a PriceStore in the default data directory).
+
+    Returns:
+      pd.DataFrame: Copy of the trades with the prices filled in.
+    """
+    trades = trades.copy()
+    for column in ("initial_price", "final_price"):
+        if column not in trades.columns:
+            trades[column] = np.nan
+    if ticker_column not in trades.columns:
+        return trades
+
+    tickers = trades[ticker_column]
+    needs = (tickers.notna() & (tickers.astype(str) != "")
+             & (trades["initial_price"].isna() | trades["final_price"].isna())).to_numpy()
+    if not needs.any():
+        return trades
+
+    store = store if store is not None else PriceStore()
+    rows = trades[needs]
+    # end_date is a valuation date: include its close (yf.download ends are exclusive)
+    first, last = store.first_last_prices(rows[ticker_column].astype(str).to_numpy(),
+                                          pd.to_datetime(rows["start_date"]),
+                                          pd.to_datetime(rows["end_date"]) + pd.Timedelta(days=1))
+    positions = np.flatnonzero(needs)
+    for column, values in (("initial_price", first), ("final_price", last)):
+        current = trades[column].to_numpy(dtype=float)
+        current[positions] = np.where(np.isnan(current[positions]), values, current[positions])
+        trades[column] = current
+    return trades
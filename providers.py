@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Pluggable market data providers.
+
+Every source the app reads goes through the MarketDataProvider interface:
+  - get_rates:        daily rate series (percent), e.g. SOFR / EFFR from FRED
+  - get_prices:       price history, e.g. Yahoo Finance
+  - get_prices_bulk:  price histories of several tickers (one batched download
+                      where the source supports it)
+  - get_treasury_xml: raw daily Treasury par yield curve feed for one year
+                      (get_yield_curves parses it into a YieldCurveHistory)
+  - get_euribor:      ECB series (TIME_PERIOD / OBS_VALUE)
+  - get_fx_spot:      latest close of an FX pair on or before a date
+
+LiveProvider combines the FRED, Yahoo, Treasury and ECB implementations.
+LocalFileProvider replays recorded files deterministically (no network), and
+RecordingProvider wraps a live provider and writes everything it returns in
+that same file layout:
+
+  <root>/rates/<series_id>.csv      date,value
+  <root>/prices/<ticker>.csv        Date index + price columns
+  <root>/treasury/<year>.xml        raw feed
+  <root>/euribor/<series_key>.csv   TIME_PERIOD,OBS_VALUE
+"""
+# providers.py
+
+import os
+import threading
+
+import pandas as pd
+
+# Point this at a directory of recordings to run the whole app offline.
+RECORDINGS_DIR = os.environ.get("DERIVATIVES_CALC_RECORDINGS")
+
+# Seconds a live source may take to connect and between bytes of a response.
+# Below market_data.SOURCE_TIMEOUT, so a hung download frees its fetch thread.
+REQUEST_TIMEOUT = 15
+
+
+class MarketDataProvider:
+    """Interface for market data sources; implementations override what they serve."""
+
+    def get_rates(self, series_id, start_date, end_date):
+        raise NotImplementedError(f"{type(self).__name__} does not provide rates")
+
+    def get_prices(self, ticker, start_date, end_date):
+        raise NotImplementedError(f"{type(self).__name__} does not provide prices")
+
+    def get_prices_bulk(self, tickers, start_date, end_date):
+        """
+        dict ticker -> price history (None where the download failed; no rows when
+        nothing traded); sources with a batch API override this loop.
+        """
+        return {ticker: self.get_prices(ticker, start_date, end_date) for ticker in tickers}
+
+    def get_treasury_xml(self, year):
+        raise NotImplementedError(f"{type(self).__name__} does not provide Treasury curves")
+
+    def get_euribor(self, series_key, start_period):
+        raise NotImplementedError(f"{type(self).__name__} does not provide ECB series")
+
+    def get_yield_curves(self, years):
+        """YieldCurveHistory for the given years, parsed from get_treasury_xml."""
+        from yield_curve import YieldCurveHistory, parse_treasury_xml
+        return YieldCurveHistory.concat([parse_treasury_xml(self.get_treasury_xml(y)) for y in years])
+
+    def get_fx_spot(self, ticker="EURUSD=X", as_of=None):
+        """Last close of ticker in the five days up to as_of (default today), or None."""
+        as_of = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.today()).normalize()
+        prices = self.get_prices(ticker, (as_of - pd.Timedelta(days=5)).strftime("%Y-%m-%d"),
+                                 as_of.strftime("%Y-%m-%d"))
+        if prices is None or prices.empty:
+            return None
+        column = "Adj Close" if "Adj Close" in prices.columns else "Close"
+        if column not in prices.columns:
+            return None
+        return float(pd.Series(prices[column].to_numpy().ravel()).iloc[-1])
+
+
+# ----------------------------------------------------------------------
+# Live sources
+# ----------------------------------------------------------------------
+class FredProvider(MarketDataProvider):
+    """
+    FRED daily series. The Fred client is created lazily (with a request timeout)
+    unless one is injected.
+    """
+
+    def __init__(self, client=None, timeout=REQUEST_TIMEOUT):
+        self.client = client
+        self.timeout = timeout
+
+    def get_rates(self, series_id, start_date, end_date):
+        from helper_functions import fetch_fred_series, get_fred_client
+        client = self.client if self.client is not None else get_fred_client(timeout=self.timeout)
+        return fetch_fred_series(series_id, start_date, end_date, client=client)
+
+
+class YahooProvider(MarketDataProvider):
+    """
+    Yahoo Finance prices via yfinance.download (or an injected downloader).
+    yf.download collects results in module-level state, so calls are serialized.
+    """
+
+    _download_lock = threading.Lock()
+
+    def __init__(self, downloader=None, timeout=REQUEST_TIMEOUT):
+        self.downloader = downloader
+        self.timeout = timeout
+
+    def get_prices(self, ticker, start_date, end_date):
+        from helper_functions import fetch_yfinance_prices
+        with self._download_lock:
+            return fetch_yfinance_prices(ticker, start_date, end_date, downloader=self.downloader,
+                                         timeout=self.timeout)
+
+    def get_prices_bulk(self, tickers, start_date, end_date):
+        """One yf.download for all tickers, split into one DataFrame per ticker."""
+        from helper_functions import fetch_yfinance_prices
+        tickers = list(tickers)
+        with self._download_lock:
+            prices = fetch_yfinance_prices(tickers, start_date, end_date, downloader=self.downloader,
+                                           timeout=self.timeout)
+        return split_ticker_prices(prices, tickers)
+
+
+class TreasuryProvider(MarketDataProvider):
+    """U.S. Treasury daily par yield curve XML feed."""
+
+    URL = ("https://home.treasury.gov/resource-center/data-chart-center/interest-rates/pages/"
+           "xmlview?data=daily_treasury_yield_curve&field_tdr_date_value={year}")
+
+    def __init__(self, session=None, timeout=REQUEST_TIMEOUT):
+        self.session = session
+        self.timeout = timeout
+        self._session_lock = threading.Lock()
+
+    def get_treasury_xml(self, year):
+        with self._session_lock:
+            if self.session is None:
+                # One keep-alive session reused by every request (and thread)
+                import requests
+                self.session = requests.Session()
+        response = self.session.get(self.URL.format(year=year), timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+
+class EcbProvider(MarketDataProvider):
+    """
+    ECB Data Portal series (data only), read from the same CSV endpoint as
+    ecbdata.get_series but with a request timeout (ecbdata sets none).
+    """
+
+    URL = "https://data-api.ecb.europa.eu/service/data/{dataflow}/{key}"
+
+    def __init__(self, session=None, timeout=REQUEST_TIMEOUT):
+        self.session = session
+        self.timeout = timeout
+        self._session_lock = threading.Lock()
+
+    def get_euribor(self, series_key, start_period):
+        import io
+        with self._session_lock:
+            if self.session is None:
+                import requests
+                self.session = requests.Session()
+        dataflow, key = series_key.split(".", 1)
+        response = self.session.get(self.URL.format(dataflow=dataflow, key=key),
+                                    params={"format": "csvdata", "startPeriod": start_period, "detail": "dataonly"},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        return pd.read_csv(io.StringIO(response.content.decode()))
+
+
+class LiveProvider(MarketDataProvider):
+    """Routes each kind of data to its live source."""
+
+    def __init__(self, rates=None, prices=None, treasury=None, ecb=None):
+        self.rates = rates or FredProvider()
+        self.prices = prices or YahooProvider()
+        self.treasury = treasury or TreasuryProvider()
+        self.ecb = ecb or EcbProvider()
+
+    def get_rates(self, series_id, start_date, end_date):
+        return self.rates.get_rates(series_id, start_date, end_date)
+
+    def get_prices(self, ticker, start_date, end_date):
+        return self.prices.get_prices(ticker, start_date, end_date)
+
+    def get_prices_bulk(self, tickers, start_date, end_date):
+        return self.prices.get_prices_bulk(tickers, start_date, end_date)
+
+    def get_treasury_xml(self, year):
+        return self.treasury.get_treasury_xml(year)
+
+    def get_euribor(self, series_key, start_period):
+        return self.ecb.get_euribor(series_key, start_period)
+
+
+# ----------------------------------------------------------------------
+# Recorded files
+# ----------------------------------------------------------------------
+def _file_name(key):
+    """File-system safe name for a ticker / series key (e.g. 'EURUSD=X')."""
+    return "".join(c if c.isalnum() or c in "-_.=" else "_" for c in str(key))
+
+
+class LocalFileProvider(MarketDataProvider):
+    """
+    Deterministic provider backed by recorded files (see module docstring).
+    Requests outside what was recorded raise LookupError, never touch the network.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, kind, key, suffix):
+        return os.path.join(self.root, kind, f"{_file_name(key)}.{suffix}")
+
+    def _read(self, kind, key, suffix, **read_csv_kwargs):
+        path = self.path(kind, key, suffix)
+        if not os.path.exists(path):
+            raise LookupError(f"No recording for {kind}/{key} in {self.root}")
+        # round_trip parsing gives back exactly the floats that were recorded
+        return pd.read_csv(path, float_precision="round_trip", **read_csv_kwargs)
+
+    def get_rates(self, series_id, start_date, end_date):
+        df = self._read("rates", series_id, "csv", parse_dates=["date"])
+        series = pd.Series(df["value"].to_numpy(dtype=float), index=pd.DatetimeIndex(df["date"]), name=series_id)
+        return series.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+
+    def get_prices(self, ticker, start_date, end_date):
+        df = self._read("prices", ticker, "csv", index_col=0, parse_dates=True)
+        # Same window as yf.download: start inclusive, end exclusive
+        return df[(df.index >= pd.Timestamp(start_date)) & (df.index < pd.Timestamp(end_date))]
+
+    def get_treasury_xml(self, year):
+        path = self.path("treasury", year, "xml")
+        if not os.path.exists(path):
+            raise LookupError(f"No recording for treasury/{year} in {self.root}")
+        with open(path, "rb") as f:
+            return f.read()
+
+    def get_euribor(self, series_key, start_period):
+        df = self._read("euribor", series_key, "csv")
+        return df[pd.to_datetime(df["TIME_PERIOD"]) >= pd.Timestamp(start_period)].reset_index(drop=True)
+
+
+class RecordingProvider(MarketDataProvider):
+    """
+    Wraps a provider (normally LiveProvider) and saves every response under root
+    in the LocalFileProvider layout, merged with anything recorded before.
+    """
+
+    def __init__(self, inner, root):
+        self.inner = inner
+        self.local = LocalFileProvider(root)
+
+    def _write_csv(self, kind, key, df, **to_csv_kwargs):
+        path = self.local.path(kind, key, "csv")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_csv(path, **to_csv_kwargs)
+
+    def get_rates(self, series_id, start_date, end_date):
+        series = self.inner.get_rates(series_id, start_date, end_date)
+        recorded = pd.DataFrame({"date": pd.to_datetime(series.index), "value": series.to_numpy()})
+        path = self.local.path("rates", series_id, "csv")
+        if os.path.exists(path):
+            recorded = pd.concat([pd.read_csv(path, parse_dates=["date"], float_precision="round_trip"), recorded])
+        recorded = recorded.drop_duplicates("date", keep="last").sort_values("date")
+        self._write_csv("rates", series_id, recorded, index=False, date_format="%Y-%m-%d")
+        return series
+
+    def get_prices(self, ticker, start_date, end_date):
+        return self._record_prices(ticker, self.inner.get_prices(ticker, start_date, end_date))
+
+    def get_prices_bulk(self, tickers, start_date, end_date):
+        prices = self.inner.get_prices_bulk(tickers, start_date, end_date)
+        return {ticker: self._record_prices(ticker, df) for ticker, df in prices.items()}
+
+    def _record_prices(self, ticker, prices):
+        if prices is None:
+            return None
+        recorded = prices.copy()
+        if isinstance(recorded.columns, pd.MultiIndex):
+            # yfinance returns (Price, Ticker) columns; keep the price level
+            recorded.columns = recorded.columns.get_level_values(0)
+        path = self.local.path("prices", ticker, "csv")
+        if os.path.exists(path):
+            recorded = pd.concat([pd.read_csv(path, index_col=0, parse_dates=True, float_precision="round_trip"), recorded])
+        recorded = recorded[~recorded.index.duplicated(keep="last")].sort_index()
+        recorded.index.name = "Date"
+        self._write_csv("prices", ticker, recorded)
+        return prices
+
+    def get_treasury_xml(self, year):
+        content = self.inner.get_treasury_xml(year)
+        path = self.local.path("treasury", year, "xml")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        return content
+
+    def get_euribor(self, series_key, start_period):
+        df = self.inner.get_euribor(series_key, start_period)
+        recorded = df[["TIME_PERIOD", "OBS_VALUE"]]
+        path = self.local.path("euribor", series_key, "csv")
+        if os.path.exists(path):
+            recorded = pd.concat([pd.read_csv(path, float_precision="round_trip"), recorded])
+        recorded = recorded.drop_duplicates("TIME_PERIOD", keep="last").sort_values("TIME_PERIOD")
+        self._write_csv("euribor", series_key, recorded, index=False)
+        return df
+
+
+def split_ticker_prices(prices, tickers):
+    """
+    dict ticker -> price DataFrame from one multi-ticker yf.download result
+    ((Price, Ticker) column levels); tickers without data map to None. A download
+    without any rows (nothing traded in the window, e.g. a weekend) maps every
+    ticker to an empty DataFrame, so it is not mistaken for a failed one.
+    """
+    if prices is None:
+        return {ticker: None for ticker in tickers}
+    if len(prices.index) == 0:
+        return {ticker: pd.DataFrame(index=prices.index) for ticker in tickers}
+    if prices.empty:
+        return {ticker: None for ticker in tickers}
+    if not isinstance(prices.columns, pd.MultiIndex):
+        # A single ticker can come back with flat price columns
+        return {ticker: prices if i == 0 else None for i, ticker in enumerate(tickers)}
+    level = 1 if set(tickers) & set(prices.columns.get_level_values(1)) else 0
+    available = set(prices.columns.get_level_values(level))
+    split = {}
+    for ticker in tickers:
+        if ticker not in available:
+            split[ticker] = None
+            continue
+        frame = prices.xs(ticker, axis=1, level=level).dropna(how="all")
+        split[ticker] = frame if not frame.empty else None
+    return split
+
+
+def default_provider():
+    """LocalFileProvider over DERIVATIVES_CALC_RECORDINGS when set, else LiveProvider."""
+    if RECORDINGS_DIR:
+        return LocalFileProvider(RECORDINGS_DIR)
+    return LiveProvider()
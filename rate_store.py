@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent local store for daily FRED series (SOFR, EFFR, ...).
+
+Each series is kept on disk as two NumPy column files (dates as datetime64[D]
+and values as float64, in percent like fred.get_series) plus a small JSON
+metadata file. Readers get slices of memory-mapped columns; the network is only
+used to top up observations newer than the last stored date (at most once per
+day) or history older than what has already been requested.
+
+Every write saves a new pair of column files under unique names and then swaps
+meta.json, which names the current pair, in one os.replace: readers (in this or
+another process) map either the old pair or the new one, never a mix, and the
+files they have mapped are never replaced underneath them.
+"""
+# rate_store.py
+
+import json
+import os
+import tempfile
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Root directory for every on-disk market data cache of this app.
+DEFAULT_DATA_DIR = os.environ.get(
+    "DERIVATIVES_CALC_DATA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache")
+)
+
+# Set DERIVATIVES_CALC_OFFLINE=1 to never touch the network (tests, batch runs).
+OFFLINE = os.environ.get("DERIVATIVES_CALC_OFFLINE", "0") == "1"
+
+
+class RateStore:
+    """
+    On-disk time-series store with incremental top-up.
+
+    Args:
+      root    : Directory holding the series files (default: <data dir>/rates).
+      fetcher : Callable (series_id, start, end) -> pd.Series indexed by date, e.g.
+                a wrapper around fred.get_series. Not needed when offline.
+      offline : If True, only serve what is already stored (or seeded).
+    """
+
+    def __init__(self, root=None, fetcher=None, offline=OFFLINE):
+        self.root = root or os.path.join(DEFAULT_DATA_DIR, "rates")
+        self.fetcher = fetcher
+        self.offline = offline
+        self._columns = {}          # series_id -> (meta.json version, dates, values)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def get_series(self, series_id, start=None, end=None):
+        """
+        Return the stored observations of series_id between start and end
+        (inclusive) as a pd.Series, topping up from the fetcher first if needed.
+        """
+        start = pd.to_datetime(start) if start is not None else None
+        end = pd.to_datetime(end) if end is not None else None
+
+        if not self.offline:
+            self.top_up(series_id, start)
+
+        dates, values = self._load(series_id)
+        if dates is None:
+            raise LookupError(
+                f"No stored data for {series_id!r} in {self.root}; "
+                f"seed it with RateStore.seed_from_csv or run online once."
+            )
+
+        lo = 0 if start is None else np.searchsorted(dates, start.to_datetime64().astype("datetime64[D]"), side="left")
+        hi = len(dates) if end is None else np.searchsorted(dates, end.to_datetime64().astype("datetime64[D]"), side="right")
+        return pd.Series(
+            np.array(values[lo:hi]),
+            index=pd.DatetimeIndex(np.array(dates[lo:hi]).astype("datetime64[ns]")),
+            name=series_id,
+        )
+
+    def last_date(self, series_id):
+        """Date of the last stored observation (or None if nothing is stored)."""
+        dates, _ = self._load(series_id)
+        if dates is None or len(dates) == 0:
+            return None
+        return pd.Timestamp(dates[-1])
+
+    def version(self, series_id):
+        """
+        Token that changes whenever series_id is written (None if nothing is stored),
+        so derived data (e.g. compounding indexes) can tell when to refresh.
+        """
+        meta_path = self._path(series_id, "meta.json")
+        try:
+            stat = os.stat(meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def top_up(self, series_id, start=None):
+        """
+        Fetch only what is missing: observations after the last stored date
+        (once per calendar day), and history before the earliest date already
+        requested when start goes further back.
+        """
+        if self.fetcher is None:
+            return
+        today = pd.Timestamp(date.today())
+
+        with self._lock:
+            meta = self._read_meta(series_id)
+            dates, _ = self._load(series_id)
+            new_parts = []
+
+            if dates is None or len(dates) == 0:
+                first = start if start is not None else today - pd.Timedelta(days=365)
+                new_parts.append(self.fetcher(series_id, first, today))
+                meta = {"covered_from": first.strftime("%Y-%m-%d"),
+                        "checked": today.strftime("%Y-%m-%d")}
+            else:
+                covered_from = pd.Timestamp(meta.get("covered_from", dates[0]))
+                if start is not None and start < covered_from:
+                    new_parts.append(self.fetcher(series_id, start, covered_from - pd.Timedelta(days=1)))
+                    meta["covered_from"] = start.strftime("%Y-%m-%d")
+
+                checked = pd.Timestamp(meta.get("checked", dates[-1]))
+                next_day = pd.Timestamp(dates[-1]) + pd.Timedelta(days=1)
+                if checked < today and next_day <= today:
+                    new_parts.append(self.fetcher(series_id, next_day, today))
+                    meta["checked"] = today.strftime("%Y-%m-%d")
+
+            if new_parts:
+                self._merge_and_write(series_id, new_parts, meta)
+
+    def seed(self, series_id, series):
+        """Store a pd.Series (date index, values in percent) as-is, e.g. for offline use."""
+        with self._lock:
+            first = pd.to_datetime(series.index.min())
+            self._merge_and_write(series_id, [series], {"covered_from": first.strftime("%Y-%m-%d"),
+                                                        "checked": date.today().strftime("%Y-%m-%d")})
+
+    def seed_from_csv(self, series_id, path):
+        """
+        Seed a series from a CSV file in the FRED download layout: first column the
+        observation date, second column the value ('.' for missing observations).
+        """
+        df = pd.read_csv(path, na_values=["."])
+        series = pd.Series(df.iloc[:, 1].astype(float).to_numpy(),
+                           index=pd.to_datetime(df.iloc[:, 0]))
+        self.seed(series_id, series)
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+    def _path(self, series_id, suffix):
+        return os.path.join(self.root, f"{series_id}.{suffix}")
+
+    def _load(self, series_id):
+        """
+        Memory-map the column files named by meta.json, re-mapping only when a
+        write swapped in a new pair.
+        """
+        for _ in range(3):
+            version = self.version(series_id)
+            if version is None:
+                return None, None
+            cached = self._columns.get(series_id)
+            if cached is not None and cached[0] == version:
+                return cached[1], cached[2]
+            meta = self._read_meta(series_id)
+            prefix = self._columns_prefix(series_id, meta)
+            if "columns" not in meta and not os.path.exists(prefix + "dates.npy"):
+                return None, None
+            try:
+                dates = np.load(prefix + "dates.npy", mmap_mode="r")
+                values = np.load(prefix + "values.npy", mmap_mode="r")
+            except FileNotFoundError:
+                # A concurrent write removed this pair after we read meta.json: read it again
+                continue
+            self._columns[series_id] = (version, dates, values)
+            return dates, values
+        raise LookupError(f"Column files of {series_id!r} in {self.root} keep changing or are missing")
+
+    def _columns_prefix(self, series_id, meta):
+        """Path prefix of the current column pair (files written before meta.json named them: <id>.*)."""
+        return os.path.join(self.root, meta.get("columns", series_id) + ".")
+
+    def _merge_and_write(self, series_id, new_parts, meta):
+        """Merge new observations into the stored columns and swap in the new pair with meta."""
+        dates, values = self._load(series_id)
+        previous = self._read_meta(series_id)
+        parts = [p for p in new_parts if p is not None and len(p)]
+        meta = dict(meta)
+        os.makedirs(self.root, exist_ok=True)
+        if parts:
+            if dates is not None:
+                parts.insert(0, pd.Series(np.array(values), index=pd.DatetimeIndex(np.array(dates))))
+            merged = pd.concat(parts)
+            merged.index = pd.to_datetime(merged.index).normalize()
+            # Later parts win, so re-fetched (revised) observations replace stored ones
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+
+            # A new pair under a name unique to this write (and this process)
+            fd, dates_path = tempfile.mkstemp(prefix=f"{series_id}.", suffix=".dates.npy", dir=self.root)
+            prefix = dates_path[:-len("dates.npy")]
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, merged.index.to_numpy().astype("datetime64[D]"))
+            with open(prefix + "values.npy", "xb") as f:
+                np.save(f, merged.to_numpy(dtype=float))
+            meta["columns"] = os.path.basename(prefix[:-1])
+        elif "columns" in previous:
+            meta["columns"] = previous["columns"]
+        else:
+            meta.pop("columns", None)
+
+        # Release this store's maps before the old pair goes (mapped files cannot be removed on Windows)
+        self._columns.pop(series_id, None)
+        self._write_meta(series_id, meta)
+        if parts and dates is not None:
+            old_prefix = self._columns_prefix(series_id, previous)
+            for suffix in ("dates.npy", "values.npy"):
+                try:
+                    os.remove(old_prefix + suffix)
+                except OSError:
+                    # Still mapped by another reader on Windows; the pair is only orphaned
+                    pass
+
+    def _read_meta(self, series_id):
+        path = self._path(series_id, "meta.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, series_id, meta):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{series_id}.meta.", suffix=".tmp", dir=self.root)
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(series_id, "meta.json"))
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Scenario stress engine for a TRS book.
+
+Every scenario shocks the finance leg's rate path (a parallel shift plus a
+twist that grows linearly with time) and the asset leg's final price
+(relative shock). The whole book is evaluated against a chunk of scenarios at
+once: each rate group's rates are fetched once, before any scenario, and its
+shocked daily factors are a (rows x scenarios) matrix multiplied out along the
+rows. The result is a trades x scenarios P&L array (change of Net Settlement
+against the unshocked book).
+
+Scenarios are processed in chunks of scenario_chunk columns and trades in
+chunks of trade_chunk rows, so the working memory stays bounded however many
+scenarios there are; only the result array (which may be a np.memmap) grows
+with trades x scenarios.
+"""
+# stress.py
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from compounding_index import index_series_id
+from helper_functions import build_rate_table, day_count_fractions
+from instrumentation import tracer
+from portfolio import (COMPOUNDING_KEYS, RATE_GROUP_KEYS, final_compound_factors, funding_leg_notionals,
+                       normalize_trades, schedule_options, total_returns)
+
+# Scenarios (columns) evaluated together; a 10y daily-reset group then needs ~7.5MB per temporary.
+DEFAULT_SCENARIO_CHUNK = 256
+# Trades (rows) per yielded P&L block.
+DEFAULT_TRADE_CHUNK = 4096
+# Time after the anchor date at which a twist reaches its full size.
+DEFAULT_TWIST_HORIZON_YEARS = 1.0
+
+
+@dataclass
+class StressScenarios:
+    """
+    One column per scenario: rate shocks in basis points and a relative price shock.
+
+    The rate shock on a day t years after the anchor date is
+
+        parallel_bp + twist_bp * min(t / twist_horizon_years, 1)
+
+    so a positive twist steepens the path (no change at the anchor, the full
+    twist from the horizon on). price_shock moves every trade's final price by
+    that fraction (-0.1 = prices 10% lower).
+
+    Scalars are broadcast against the arrays.
+    """
+    parallel_bp: np.ndarray
+    twist_bp: np.ndarray
+    price_shock: np.ndarray
+    names: list = None
+
+    def __post_init__(self):
+        arrays = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float))
+                                       for v in (self.parallel_bp, self.twist_bp, self.price_shock)))
+        self.parallel_bp, self.twist_bp, self.price_shock = (np.array(a).ravel() for a in arrays)
+        if self.names is None:
+            self.names = [f"P{p:+g}bp T{t:+g}bp S{s:+.1%}"
+                          for p, t, s in zip(self.parallel_bp, self.twist_bp, self.price_shock)]
+        elif len(self.names) != len(self.parallel_bp):
+            raise ValueError(f"Got {len(self.names)} scenario names for {len(self.parallel_bp)} scenarios")
+
+    def __len__(self):
+        return len(self.parallel_bp)
+
+    @classmethod
+    def grid(cls, parallel_bp=(0.0,), twist_bp=(0.0,), price_shock=(0.0,)):
+        """Every combination of the given parallel shifts, twists and price shocks."""
+        p, t, s = np.meshgrid(np.asarray(parallel_bp, dtype=float), np.asarray(twist_bp, dtype=float),
+                              np.asarray(price_shock, dtype=float), indexing="ij")
+        return cls(p.ravel(), t.ravel(), s.ravel())
+
+    def rate_shocks(self, years, twist_horizon_years=DEFAULT_TWIST_HORIZON_YEARS, columns=slice(None)):
+        """(len(years), scenarios) decimal rate shocks for days `years` after the anchor."""
+        ramp = np.clip(np.asarray(years, dtype=float) / twist_horizon_years, 0.0, 1.0)
+        return (self.parallel_bp[columns][None, :] + ramp[:, None] * self.twist_bp[columns][None, :]) / 1e4
+
+    def to_frame(self):
+        return pd.DataFrame({"Parallel (bp)": self.parallel_bp, "Twist (bp)": self.twist_bp,
+                             "Price Shock": self.price_shock}, index=pd.Index(self.names, name="Scenario"))
+
+
+@dataclass
+class _StressGroup:
+    """One rate group's unshocked inputs: accruing rows and one entry per compounding combo."""
+    positions: np.ndarray       # Trade positions in the book
+    combo_codes: np.ndarray     # Combo of each trade
+    spreads: np.ndarray         # Spread per combo (decimal)
+    fractions: np.ndarray       # (combos, rows) day count fractions
+    rates: np.ndarray           # Rate of each accruing row (decimal)
+    row_dates: np.ndarray       # Reset Date (accrual start) of each row, datetime64[D]
+    base_factors: np.ndarray    # Unshocked compound factor per combo (as settle_portfolio)
+
+
+def _stress_groups(trades, rate_source):
+    """
+    Build every rate group from a single read of each rate series, covering the
+    whole book with the same 180-day margin as fetch_interest_rates.
+    """
+    if rate_source is None:
+        from helper_functions import rate_store
+        rate_source = rate_store.get_series
+
+    margin = pd.Timedelta(days=180)
+    history_start, end = trades["start_date"].min() - margin, trades["end_date"].max()
+    with tracer.span("stress/fetch"):
+        series = {series_id: rate_source(series_id, history_start, end)
+                  for series_id in sorted({index_series_id(i) for i in trades["float_index"]})}
+
+    groups = []
+    rate_groups = trades.groupby(RATE_GROUP_KEYS, sort=False, dropna=False).indices
+    for group_key, positions in rate_groups.items():
+        float_index, start_date, end_date, reset_frequency, look_back_days, calendar, lockout_days = group_key
+        # The slice fetch_interest_rates would have read for this group alone
+        group_start = start_date - margin
+        table = build_rate_table(series[index_series_id(float_index)].loc[group_start:end_date],
+                                 start_date, end_date, int(look_back_days), reset_frequency,
+                                 history_start=group_start, **schedule_options(calendar, lockout_days))
+
+        group = trades.iloc[positions]
+        combo_codes = group.groupby(COMPOUNDING_KEYS, sort=False).ngroup().to_numpy()
+        combos = group[COMPOUNDING_KEYS].drop_duplicates()
+        spreads = combos["spread"].to_numpy(dtype=float)
+        day_count_choices = combos["day_count_choice"].to_numpy()
+        year_bases = combos["year_basis"].to_numpy(dtype=float)
+
+        reset_days = table["Reset Date"].to_numpy().astype("datetime64[D]")
+        accrual_days = np.diff(reset_days).astype(np.int64)
+        # Rows inside a reset period accrue 0 days: their factor is exactly 1, so they are dropped
+        accruing = accrual_days > 0
+        fractions = np.vstack([day_count_fractions(accrual_days[accruing], dc, yb)
+                               for dc, yb in zip(day_count_choices, year_bases)])
+        groups.append(_StressGroup(
+            positions=positions,
+            combo_codes=combo_codes,
+            spreads=spreads,
+            fractions=fractions,
+            rates=table["Rate"].to_numpy(dtype=float)[:-1][accruing],
+            row_dates=reset_days[:-1][accruing],
+            base_factors=final_compound_factors(table, spreads, day_count_choices, year_bases),
+        ))
+    return groups
+
+
+def _shocked_factors(group, shocks):
+    """
+    (combos, scenarios) compound factors of one group under a chunk of rate shocks.
+    The daily factors are multiplied out row by row in the same order as
+    final_compound_factors, so a zero shock gives exactly the base factor.
+    """
+    factors = np.empty((len(group.spreads), shocks.shape[1]))
+    for i, (spread, fraction) in enumerate(zip(group.spreads, group.fractions)):
+        daily_factor = 1 + (group.rates[:, None] + spread + shocks) * fraction[:, None]
+        factors[i] = np.multiply.reduce(daily_factor, axis=0)
+    return factors
+
+
+def iter_stress_pnl(trades, scenarios, rate_source=None, anchor_date=None,
+                    twist_horizon_years=DEFAULT_TWIST_HORIZON_YEARS,
+                    scenario_chunk=DEFAULT_SCENARIO_CHUNK, trade_chunk=DEFAULT_TRADE_CHUNK):
+    """
+    Yield the stress P&L of a book block by block: (trade positions, scenario
+    slice, P&L block of shape (len(positions), scenarios in the slice)).
+    Arguments as stress_pnl.
+    """
+    trades = normalize_trades(trades)
+    anchor = pd.Timestamp(anchor_date) if anchor_date is not None else trades["start_date"].min()
+    anchor = np.datetime64(anchor.date(), "D")
+
+    groups = _stress_groups(trades, rate_source)
+    funding_leg_notional = funding_leg_notionals(trades)
+    # Asset leg change per unit of relative price shock: the total return of the final price itself
+    price_delta = total_returns(
+        trades["product_type"].to_numpy(),
+        trades["notional"].to_numpy(dtype=float),
+        trades["units"].to_numpy(dtype=float),
+        np.zeros(len(trades)),
+        trades["final_price"].to_numpy(dtype=float),
+    )
+
+    for first in range(0, len(scenarios), scenario_chunk):
+        columns = slice(first, min(first + scenario_chunk, len(scenarios)))
+        price_shock = scenarios.price_shock[columns]
+        tracer.count("stress/scenarios", columns.stop - columns.start)
+        for group in groups:
+            with tracer.span("stress/compound"):
+                years = (group.row_dates - anchor).astype(np.int64) / 365.0
+                factor_change = (_shocked_factors(group, scenarios.rate_shocks(years, twist_horizon_years, columns))
+                                 - group.base_factors[:, None])
+            for lo in range(0, len(group.positions), trade_chunk):
+                positions = group.positions[lo:lo + trade_chunk]
+                codes = group.combo_codes[lo:lo + trade_chunk]
+                finance_change = funding_leg_notional[positions, None] * factor_change[codes]
+                yield positions, columns, price_delta[positions, None] * price_shock[None, :] - finance_change
+
+
+def stress_pnl(trades, scenarios, rate_source=None, anchor_date=None,
+               twist_horizon_years=DEFAULT_TWIST_HORIZON_YEARS,
+               scenario_chunk=DEFAULT_SCENARIO_CHUNK, trade_chunk=DEFAULT_TRADE_CHUNK, out=None):
+    """
+    Stress P&L of every trade of a TRS book under every scenario.
+
+    P&L is the change of Net Settlement against settle_portfolio(trades): the
+    asset leg gains total return on the shocked final price and the finance leg
+    is recompounded on the shocked rate path (shocks are applied to each accrual
+    row's rate by the row's Reset Date).
+
+    Args:
+      trades              : TRS book as for settle_portfolio (final_price = unshocked price).
+      scenarios           : StressScenarios.
+      rate_source         : Callable (series_id, start, end) -> pd.Series of percent rates,
+                            called once per series for the whole book (default: the local
+                            rate store, as parallel.share_rates).
+      anchor_date         : Day the twist starts from (default: the earliest start_date).
+      twist_horizon_years : Years after the anchor at which the twist is fully applied.
+      scenario_chunk      : Scenarios evaluated together (bounds the working memory).
+      trade_chunk         : Trades per P&L block.
+      out                 : Optional (trades, scenarios) float array to fill, e.g. a np.memmap
+                            for books too large to keep the result in memory.
+
+    Returns:
+      np.ndarray: P&L of shape (len(trades), len(scenarios)), trades in input order.
+    """
+    shape = (len(trades), len(scenarios))
+    if out is None:
+        out = np.empty(shape)
+    elif out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, expected {shape}")
+    for positions, columns, block in iter_stress_pnl(trades, scenarios, rate_source, anchor_date,
+                                                     twist_horizon_years, scenario_chunk, trade_chunk):
+        out[positions, columns] = block
+    return out
+
+
+def book_stress_pnl(trades, scenarios, **kwargs):
+    """Total P&L of the book per scenario, without keeping the trades x scenarios array."""
+    total = np.zeros(len(scenarios))
+    for _, columns, block in iter_stress_pnl(trades, scenarios, **kwargs):
+        total[columns] += block.sum(axis=0)
+    return total
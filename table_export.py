@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Export of accrual tables and batch results to CSV, Parquet and Arrow IPC.
+
+Parquet and Arrow keep the column types (dates stay dates, day counts stay
+integers) and are compressed; CSV stays available for spreadsheets. Large
+books are written trade by trade through TableStreamWriter, so only one
+accrual table is held in memory at a time. pyarrow is imported only when a
+Parquet or Arrow file is actually written.
+"""
+# table_export.py
+
+import io
+
+import pandas as pd
+
+# Format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+
+DEFAULT_COMPRESSION = "zstd"
+
+# File extensions recognised by format_for_path
+_EXTENSION_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+
+def format_for_path(path):
+    """Export format ("csv", "parquet" or "arrow") implied by a file name."""
+    for extension, fmt in _EXTENSION_FORMATS.items():
+        if str(path).lower().endswith(extension):
+            return fmt
+    raise ValueError(f"Unknown export file type: {path!r} (use one of {sorted(_EXTENSION_FORMATS)})")
+
+
+def to_arrow(table):
+    """
+    pyarrow.Table from a DataFrame or an Interest_leg.AccrualTable. Columns of
+    Python date objects become date32 columns.
+    """
+    import pyarrow as pa
+    if isinstance(table, pa.Table):
+        return table
+    if hasattr(table, "to_arrow"):
+        return table.to_arrow()
+    return pa.Table.from_pandas(table, preserve_index=False)
+
+
+def _to_frame(table):
+    if isinstance(table, pd.DataFrame):
+        return table
+    if hasattr(table, "to_frame"):
+        return table.to_frame()
+    return table.to_pandas()
+
+
+def export_bytes(table, fmt="parquet", compression=DEFAULT_COMPRESSION):
+    """
+    Serialize one table in memory (e.g. for a download button).
+
+    Args:
+      table       : DataFrame, AccrualTable or pyarrow.Table.
+      fmt         : "csv", "parquet" or "arrow".
+      compression : Codec: "zstd" (default), "lz4", "snappy" (Parquet only), or None.
+    """
+    buffer = io.BytesIO()
+    write_table(table, buffer, fmt=fmt, compression=compression)
+    return buffer.getvalue()
+
+
+def write_table(table, path, fmt=None, compression=DEFAULT_COMPRESSION):
+    """
+    Write one table to path (or a binary file object) in one bulk write.
+    The format defaults to the one implied by the file extension.
+    """
+    fmt = fmt or format_for_path(path)
+    if fmt == "csv":
+        data = _to_frame(table).to_csv(index=False).encode("utf-8")
+        if hasattr(path, "write"):
+            path.write(data)
+        else:
+            with open(path, "wb") as f:
+                f.write(data)
+        return
+
+    with TableStreamWriter(path, fmt=fmt, compression=compression) as writer:
+        writer.write(table)
+
+
+class TableStreamWriter:
+    """
+    Append tables with the same columns to one Parquet or Arrow IPC file as they
+    are produced (one row group / record batch per write), e.g. one accrual
+    table per trade of a large book.
+
+    Args:
+      path        : Output path or binary file object.
+      fmt         : "parquet" or "arrow" (default: from the file extension).
+      compression : Codec for Parquet pages / Arrow buffers, as in export_bytes.
+    """
+
+    def __init__(self, path, fmt=None, compression=DEFAULT_COMPRESSION):
+        self.path = path
+        self.fmt = fmt or format_for_path(path)
+        if self.fmt not in ("parquet", "arrow"):
+            raise ValueError(f"Streaming writes support Parquet and Arrow, not {self.fmt!r}")
+        self.compression = compression
+        self.rows = 0
+        self._writer = None
+
+    def write(self, table, **constant_columns):
+        """
+        Append one table. Keyword arguments add constant columns in front of it,
+        e.g. write(accrual_table, **{"Trade ID": 17}).
+        """
+        import pyarrow as pa
+        arrow_table = to_arrow(table)
+        for position, (name, value) in enumerate(constant_columns.items()):
+            arrow_table = arrow_table.add_column(position, name, pa.array([value] * arrow_table.num_rows))
+
+        if self._writer is None:
+            self._writer = self._open(arrow_table.schema)
+        self._writer.write_table(arrow_table)
+        self.rows += arrow_table.num_rows
+        return self
+
+    def _open(self, schema):
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self.path, schema, compression=self.compression or "none")
+        import pyarrow as pa
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(self.path, schema, options=options)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_accrual_book(accrual_tables, path, fmt=None, compression=DEFAULT_COMPRESSION):
+    """
+    Stream the accrual tables of a whole book into one Parquet / Arrow file.
+
+    Args:
+      accrual_tables : Iterable of (trade_id, accrual table) pairs, e.g. a generator
+                       calling calculate_interest_leg(..., output="table") per trade;
+                       tables are written (with a leading "Trade ID" column) as they come.
+
+    Returns:
+      int: Number of rows written.
+    """
+    with TableStreamWriter(path, fmt=fmt, compression=compression) as writer:
+        for trade_id, table in accrual_tables:
+            writer.write(table, **{"Trade ID": trade_id})
+    return writer.rows
+
+
+def read_table(path):
+    """Read a CSV, Parquet or Arrow IPC file written by this module into a DataFrame."""
+    fmt = format_for_path(path)
+    if fmt == "csv":
+        return pd.read_csv(path)
+    if fmt == "parquet":
+        return pd.read_parquet(path)
+    import pyarrow as pa
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
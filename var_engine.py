@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo Value-at-Risk engine.
+
+Normal draws come from a seeded numpy.random.Generator (optionally antithetic
+and/or scrambled Sobol quasi-random points) and are simulated in fixed-size
+chunks. Only the worst tail of the P&L distribution is kept between chunks,
+so a million paths run in bounded memory, and VaR and Expected Shortfall at
+several confidence levels come out of the same pass.
+"""
+# var_engine.py
+
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CONFIDENCE_LEVELS = (0.90, 0.95, 0.99)
+DEFAULT_SEED = 20250318
+DEFAULT_CHUNK_SIZE = 2 ** 16
+# Simulated values (paths x tenors) per fx_book_var chunk: ~8MB per temporary array.
+DEFAULT_BOOK_CHUNK_VALUES = 2 ** 20
+
+
+@dataclass
+class VaRResult:
+    """VaR and Expected Shortfall (positive numbers = losses) per confidence level."""
+    confidence_levels: tuple
+    var: np.ndarray
+    expected_shortfall: np.ndarray
+    n_paths: int
+    mean_pnl: float
+    std_pnl: float
+
+    def to_frame(self):
+        """One row per confidence level with VaR and ES columns."""
+        return pd.DataFrame({"VaR": self.var, "Expected Shortfall": self.expected_shortfall},
+                            index=pd.Index(self.confidence_levels, name="Confidence"))
+
+
+def standard_normal_draws(n_paths, dimension=1, seed=DEFAULT_SEED, antithetic=True, sobol=False,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield standard normal draws of shape (chunk, dimension) until n_paths rows
+    have been produced.
+
+    Args:
+      n_paths    : Total number of paths (rounded up to even when antithetic).
+      dimension  : Number of independent normals per path.
+      seed       : Seed of the numpy Generator / Sobol scrambling (reproducible runs).
+      antithetic : Pair every draw z with -z (halves the random numbers needed and
+                   removes odd-moment noise).
+      sobol      : Use scrambled Sobol points mapped through the normal inverse CDF
+                   instead of pseudo-random normals (needs scipy).
+      chunk_size : Rows per yielded chunk; bounds the simulation's working memory.
+    """
+    if antithetic:
+        n_paths += n_paths % 2
+        chunk_size += chunk_size % 2
+
+    if sobol:
+        from scipy.stats import norm, qmc
+        sampler = qmc.Sobol(d=dimension, scramble=True, seed=seed)
+
+        def draw(n):
+            with warnings.catch_warnings():
+                # Chunks are not always powers of 2; the points are still low-discrepancy
+                warnings.simplefilter("ignore", UserWarning)
+                u = sampler.random(n)
+            return norm.ppf(np.clip(u, 1e-12, 1 - 1e-12))
+    else:
+        rng = np.random.default_rng(seed)
+
+        def draw(n):
+            return rng.standard_normal((n, dimension))
+
+    produced = 0
+    while produced < n_paths:
+        n = min(chunk_size, n_paths - produced)
+        if antithetic:
+            z = draw(n // 2)
+            z = np.concatenate([z, -z])
+        else:
+            z = draw(n)
+        produced += n
+        yield z
+
+
+class TailAccumulator:
+    """
+    Streaming VaR/ES: keeps only the k smallest P&L values seen so far, where k
+    is just large enough to interpolate the lowest requested percentile exactly
+    like np.percentile on the full sample.
+
+    With track_paths=True the path number (position in the simulation) of each
+    retained value is kept alongside: k integers, whatever the scenario size.
+    Replaying the same seeded draws then gives the scenarios behind each
+    Expected Shortfall (ES contributions) without storing any of them.
+    """
+
+    def __init__(self, n_paths, confidence_levels=DEFAULT_CONFIDENCE_LEVELS, track_paths=False):
+        self.n_paths = n_paths
+        self.confidence_levels = tuple(confidence_levels)
+        worst = 1 - min(self.confidence_levels)
+        self.k = min(n_paths, int(np.floor(worst * (n_paths - 1))) + 2)
+        self.tail = np.empty(0)
+        self.tail_paths = np.empty(0, dtype=np.int64) if track_paths else None
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, pnl):
+        """Fold one chunk of P&L values (the next paths of the simulation) into the tail."""
+        pnl = np.asarray(pnl, dtype=float).ravel()
+        first_path = self.count
+        self.count += len(pnl)
+        self.total += pnl.sum()
+        self.total_sq += np.dot(pnl, pnl)
+        combined = np.concatenate([self.tail, pnl])
+        if self.tail_paths is None:
+            if len(combined) > self.k:
+                combined = np.partition(combined, self.k - 1)[:self.k]
+            self.tail = combined
+            return
+
+        paths = np.concatenate([self.tail_paths, np.arange(first_path, self.count)])
+        if len(combined) > self.k:
+            keep = np.argpartition(combined, self.k - 1)[:self.k]
+            combined, paths = combined[keep], paths[keep]
+        self.tail, self.tail_paths = combined, paths
+
+    def _n_tail(self, cl):
+        """Number of paths averaged into the Expected Shortfall at confidence cl."""
+        return max(1, int(np.ceil((1 - cl) * self.count)))
+
+    def tail_paths_by_level(self):
+        """
+        Sorted path numbers of the worst (1 - cl) share of paths, one array per
+        confidence level: the paths averaged into each Expected Shortfall.
+        """
+        order = np.argsort(self.tail, kind="stable")
+        paths = self.tail_paths[order]
+        return [np.sort(paths[:self._n_tail(cl)]) for cl in self.confidence_levels]
+
+    def result(self):
+        """VaRResult for every confidence level."""
+        n = self.count
+        tail = np.sort(self.tail)
+        var, es = [], []
+        for cl in self.confidence_levels:
+            # Same linear interpolation as np.percentile(pnl, (1 - cl) * 100)
+            position = (1 - cl) * (n - 1)
+            lo = int(np.floor(position))
+            hi = min(lo + 1, n - 1)
+            quantile = tail[lo] + (position - lo) * (tail[hi] - tail[lo])
+            var.append(-quantile)
+            # Expected Shortfall: average of the worst (1 - cl) share of outcomes
+            es.append(-tail[:self._n_tail(cl)].mean())
+        mean = self.total / n
+        std = np.sqrt(max(self.total_sq / n - mean ** 2, 0.0) * n / max(n - 1, 1))
+        return VaRResult(self.confidence_levels, np.array(var), np.array(es), n, mean, std)
+
+
+def monte_carlo_var(pnl_function, n_paths=1_000_000, dimension=1,
+                    confidence_levels=DEFAULT_CONFIDENCE_LEVELS, seed=DEFAULT_SEED,
+                    antithetic=True, sobol=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Simulate P&L in chunks and return VaR and ES at every confidence level.
+
+    Args:
+      pnl_function : Callable mapping a (chunk, dimension) array of standard normals
+                     to a (chunk,) array of P&L values.
+      Other args   : See standard_normal_draws / DEFAULT_CONFIDENCE_LEVELS.
+
+    Returns:
+      VaRResult
+    """
+    draws = standard_normal_draws(n_paths, dimension=dimension, seed=seed, antithetic=antithetic,
+                                  sobol=sobol, chunk_size=chunk_size)
+    n_total = n_paths + (n_paths % 2 if antithetic else 0)
+    accumulator = TailAccumulator(n_total, confidence_levels)
+    for z in draws:
+        accumulator.add(pnl_function(z))
+    return accumulator.result()
+
+
+def annualized_volatility(prices, periods_per_year=252):
+    """Annualized volatility of daily log returns of a price series."""
+    prices = pd.Series(np.asarray(prices, dtype=float).ravel())
+    returns = np.log(prices / prices.shift(1)).dropna()
+    return float(returns.std() * np.sqrt(periods_per_year))
+
+
+def fx_forward_var(spot_rate, forward_rate, notional, sigma_annual, horizon_years, **kwargs):
+    """
+    Monte Carlo VaR of a long FX forward: the spot follows a driftless lognormal
+    over the horizon and P&L = notional * (simulated spot - forward rate).
+
+    Extra keyword arguments go to monte_carlo_var (n_paths, seed, sobol, ...).
+    """
+    drift = -0.5 * sigma_annual ** 2 * horizon_years
+    vol = sigma_annual * np.sqrt(horizon_years)
+
+    def pnl(z):
+        simulated_spot = spot_rate * np.exp(drift + vol * z[:, 0])
+        return notional * (simulated_spot - forward_rate)
+
+    return monte_carlo_var(pnl, dimension=1, **kwargs)
+
+
+def fx_book_var(book, spot_rate, sigma_annual, n_paths=1_000_000,
+                confidence_levels=DEFAULT_CONFIDENCE_LEVELS, day_basis=360, antithetic=True,
+                chunk_size=DEFAULT_BOOK_CHUNK_VALUES, **kwargs):
+    """
+    Monte Carlo VaR of a book of EUR/USD forwards on one shared set of spot paths.
+
+    Each path is a single Brownian motion observed at every distinct tenor, so all
+    positions see consistent spots. Notionals are aggregated per tenor and the book
+    P&L of a chunk is one (paths x tenors) @ (tenors,) product:
+
+        P&L = sum_i notional_i * (S(t_i) - forward_i)
+
+    Memory stays bounded whatever the number of paths and tenors: each chunk holds
+    chunk_size simulated spots (chunk_size // tenors paths), and the tail keeps
+    only P&L values and path numbers. The ES contributions come from a second
+    pass over the same seeded draws that evaluates the spots of the tail paths only.
+
+    Args:
+      book         : DataFrame with one row per forward and columns
+                       - notional: Signed notional (positive = long, as in the FX tab).
+                       - days:     Days from today to maturity.
+                       - forward_rate, or us_rate / euribor_rate (percent) and an optional
+                         basis_spread to price it with premium_discount_forward.
+      spot_rate    : Current EUR/USD spot.
+      sigma_annual : Annualized spot volatility.
+      day_basis    : Days per year used for tenors and pricing (360 as in the FX tab).
+      chunk_size   : Simulated spots (paths x tenors) per chunk.
+      Other args   : See standard_normal_draws (seed, sobol via kwargs).
+
+    Returns:
+      (VaRResult, contributions):
+        VaRResult for the whole book.
+        contributions (pd.DataFrame) - Per position (book index): its expected P&L and
+          its Expected Shortfall contribution at each confidence level (minus its mean
+          P&L in the book's tail scenarios). Contributions add up to the book ES.
+    """
+    from fx_forward import premium_discount_forward
+
+    notional = book["notional"].to_numpy(dtype=float)
+    days = book["days"].to_numpy(dtype=float)
+    if "forward_rate" in book.columns:
+        forward_rate = book["forward_rate"].to_numpy(dtype=float)
+    else:
+        basis_spread = book["basis_spread"].to_numpy(dtype=float) if "basis_spread" in book.columns else 0.0
+        forward_rate = premium_discount_forward(spot_rate, book["us_rate"].to_numpy(dtype=float),
+                                                book["euribor_rate"].to_numpy(dtype=float), days,
+                                                basis_spread=basis_spread, day_basis=day_basis)
+
+    # Distinct tenors (years) and the aggregate notional at each of them
+    tenors, tenor_index = np.unique(days / day_basis, return_inverse=True)
+    tenor_notional = np.bincount(tenor_index, weights=notional, minlength=len(tenors))
+    fixed_leg = float(np.dot(notional, forward_rate))
+    step_vol = sigma_annual * np.sqrt(np.diff(np.concatenate(([0.0], tenors))))
+    drift = -0.5 * sigma_annual ** 2 * tenors
+
+    def draws():
+        # Same seed and chunking on both passes, so path numbers refer to the same draws
+        return standard_normal_draws(n_paths, dimension=len(tenors), antithetic=antithetic,
+                                     chunk_size=max(2, chunk_size // len(tenors)), **kwargs)
+
+    def simulated_spots(z):
+        # Brownian motion at each tenor -> simulated spot matrix (paths x tenors)
+        return spot_rate * np.exp(drift + np.cumsum(z * step_vol, axis=1))
+
+    accumulator = TailAccumulator(n_paths + (n_paths % 2 if antithetic else 0), confidence_levels,
+                                  track_paths=True)
+    spot_sum = np.zeros(len(tenors))
+    for z in draws():
+        spots = simulated_spots(z)
+        accumulator.add(spots @ tenor_notional - fixed_leg)
+        spot_sum += spots.sum(axis=0)
+    result = accumulator.result()
+
+    # Second pass: mean spots over each level's tail paths
+    tail_paths = accumulator.tail_paths_by_level()
+    tail_spot_sum = np.zeros((len(tail_paths), len(tenors)))
+    first_path = 0
+    for z in draws():
+        last_path = first_path + len(z)
+        for level, paths in enumerate(tail_paths):
+            lo, hi = np.searchsorted(paths, [first_path, last_path])
+            if hi > lo:
+                tail_spot_sum[level] += simulated_spots(z[paths[lo:hi] - first_path]).sum(axis=0)
+        first_path = last_path
+    tail_spots = tail_spot_sum / np.array([len(paths) for paths in tail_paths])[:, None]
+    expected_spots = spot_sum / accumulator.count
+
+    contributions = pd.DataFrame(index=book.index)
+    contributions["Expected P&L"] = notional * (expected_spots[tenor_index] - forward_rate)
+    for level, spots_in_tail in zip(result.confidence_levels, tail_spots):
+        contributions[f"ES Contribution {level:.0%}"] = -notional * (spots_in_tail[tenor_index] - forward_rate)
+    return result, contributions
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+U.S. Treasury par yield curve history.
+
+The daily Treasury XML feed is streamed once with ElementTree.iterparse into a
+YieldCurveHistory: a sorted datetime64[D] date column and a date-by-tenor
+float64 array (NaN where a tenor was not published). Completed years are
+saved to disk so they are never downloaded again; only the current year is
+re-read from the feed.
+"""
+# yield_curve.py
+
+import io
+import os
+import xml.etree.ElementTree as ET
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from rate_store import DEFAULT_DATA_DIR
+
+NS_ATOM = '{http://www.w3.org/2005/Atom}'
+NS_M = '{http://schemas.microsoft.com/ado/2007/08/dataservices/metadata}'
+NS_D = '{http://schemas.microsoft.com/ado/2007/08/dataservices}'
+
+# Treasury field -> (maturity in years, label), in curve order.
+TREASURY_TENORS = {
+    "BC_1MONTH":  (1/12,  "1M"),
+    "BC_2MONTH":  (2/12,  "2M"),
+    "BC_3MONTH":  (3/12,  "3M"),
+    "BC_4MONTH":  (4/12,  "4M"),
+    "BC_6MONTH":  (6/12,  "6M"),
+    "BC_1YEAR":   (1,     "1Y"),
+    "BC_2YEAR":   (2,     "2Y"),
+    "BC_3YEAR":   (3,     "3Y"),
+    "BC_5YEAR":   (5,     "5Y"),
+    "BC_7YEAR":   (7,     "7Y"),
+    "BC_10YEAR":  (10,    "10Y"),
+    "BC_20YEAR":  (20,    "20Y"),
+    "BC_30YEAR":  (30,    "30Y"),
+}
+TENOR_FIELDS = list(TREASURY_TENORS)
+TENOR_YEARS = np.array([years for years, _ in TREASURY_TENORS.values()])
+
+
+class YieldCurveHistory:
+    """
+    Daily par yield curves (percent) for the Treasury tenors.
+
+    Args:
+      dates  : Sorted datetime64[D] array, one entry per curve date.
+      yields : Float array of shape (len(dates), len(TENOR_FIELDS)).
+    """
+
+    def __init__(self, dates, yields):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.yields = np.asarray(yields, dtype=float).reshape(len(self.dates), len(TENOR_FIELDS))
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def empty(self):
+        return len(self.dates) == 0
+
+    def latest(self):
+        """(curve date, pd.Series of yields by Treasury field) for the last curve."""
+        if self.empty:
+            raise LookupError("Yield curve history is empty.")
+        return pd.Timestamp(self.dates[-1]), pd.Series(self.yields[-1], index=TENOR_FIELDS)
+
+    def as_of(self, as_of_date):
+        """(curve date, yields) of the last curve published on or before as_of_date."""
+        pos = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(as_of_date).date(), "D"), side="right") - 1
+        if pos < 0:
+            raise LookupError(f"No Treasury curve on or before {as_of_date}.")
+        return pd.Timestamp(self.dates[pos]), pd.Series(self.yields[pos], index=TENOR_FIELDS)
+
+    def tenor(self, field):
+        """Full history of one tenor (e.g. "BC_3MONTH") as a pd.Series."""
+        return pd.Series(self.yields[:, TENOR_FIELDS.index(field)],
+                         index=pd.DatetimeIndex(self.dates.astype("datetime64[ns]")), name=field)
+
+    def to_frame(self):
+        """Date-by-tenor DataFrame (NEW_DATE index, BC_* columns)."""
+        return pd.DataFrame(self.yields, columns=TENOR_FIELDS,
+                            index=pd.DatetimeIndex(self.dates.astype("datetime64[ns]"), name="NEW_DATE"))
+
+    @classmethod
+    def concat(cls, histories):
+        """Combine histories (e.g. one per year), sorted by date; later duplicates win."""
+        histories = [h for h in histories if not h.empty]
+        if not histories:
+            return cls(np.array([], dtype="datetime64[D]"), np.empty((0, len(TENOR_FIELDS))))
+        dates = np.concatenate([h.dates for h in histories])
+        yields = np.vstack([h.yields for h in histories])
+        # Keep the last occurrence of each date after a stable sort
+        order = np.argsort(dates, kind="stable")
+        dates, yields = dates[order], yields[order]
+        keep = np.append(dates[1:] != dates[:-1], True)
+        return cls(dates[keep], yields[keep])
+
+
+def parse_treasury_xml(xml_bytes):
+    """
+    Stream a daily_treasury_yield_curve XML feed into a YieldCurveHistory in a
+    single pass (iterparse), clearing each entry once it has been read.
+    """
+    column = {f"{NS_D}{field}": i for i, field in enumerate(TENOR_FIELDS)}
+    date_tag = f"{NS_D}NEW_DATE"
+    props_tag = f"{NS_M}properties"
+    entry_tag = f"{NS_ATOM}entry"
+
+    dates, rows = [], []
+    row = np.full(len(TENOR_FIELDS), np.nan)
+    row_date = None
+    for _, elem in ET.iterparse(io.BytesIO(xml_bytes), events=("end",)):
+        tag = elem.tag
+        if tag in column:
+            if elem.text:
+                row[column[tag]] = float(elem.text)
+        elif tag == date_tag:
+            row_date = elem.text
+        elif tag == props_tag:
+            if row_date:
+                dates.append(row_date[:10])
+                rows.append(row)
+            row = np.full(len(TENOR_FIELDS), np.nan)
+            row_date = None
+        elif tag == entry_tag:
+            elem.clear()
+
+    history = YieldCurveHistory(np.array(dates, dtype="datetime64[D]"),
+                                np.array(rows) if rows else np.empty((0, len(TENOR_FIELDS))))
+    return YieldCurveHistory.concat([history])
+
+
+def load_treasury_history(years, fetch_xml, root=None):
+    """
+    Yield curve history for the given calendar years.
+
+    Completed years (before the current year) are read from <root>/<year>.npz
+    when present and saved there after their first download; the current year
+    is always parsed from fetch_xml(year), which callers typically cache.
+
+    Args:
+      years     : Iterable of calendar years.
+      fetch_xml : Callable year -> raw XML bytes (e.g. market_data.get_treasury_xml).
+      root      : Directory for completed years (default: <data dir>/treasury).
+    """
+    root = root or os.path.join(DEFAULT_DATA_DIR, "treasury")
+    current_year = date.today().year
+    histories = []
+    for year in sorted(set(years)):
+        path = os.path.join(root, f"{year}.npz")
+        if year < current_year and os.path.exists(path):
+            with np.load(path) as saved:
+                histories.append(YieldCurveHistory(saved["dates"], saved["yields"]))
+            continue
+
+        history = parse_treasury_xml(fetch_xml(year))
+        if year < current_year and not history.empty:
+            os.makedirs(root, exist_ok=True)
+            tmp_path = path + ".tmp.npz"
+            np.savez(tmp_path, dates=history.dates, yields=history.yields)
+            os.replace(tmp_path, path)
+        histories.append(history)
+    return YieldCurveHistory.concat(histories)